@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, Tuple
+
+# the benchmarks run headless: no window and no audio device are needed
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame  # noqa: E402
+from classes.alpha_beta_player import AlphaBetaPlayer  # noqa: E402
+from classes.asset_cache import load_config  # noqa: E402
+from classes.game_handler import GameHandler  # noqa: E402
+from classes.game_state import (GameState, legal_moves, iter_moves,  # noqa
+                                apply_move, random_game)
+from classes.super_tic_tac_toe_board import SuperTicTacToeBoard  # noqa: E402
+from classes.tic_tac_toe_board import TicTacToeBoard  # noqa: E402
+
+
+# name -> function returning (operation to time, unit of the operation,
+# number of units done by one call of the operation)
+BENCHMARKS: Dict[str, Callable[[dict], Tuple[Callable[[], object], str, int]]]
+BENCHMARKS = {}
+
+
+def benchmark(function: Callable) -> Callable:
+    """
+    Registers a benchmark (decorator)
+
+    :param function: receives the configuration and returns the operation
+        to time, its unit and the number of units done by each call
+    :return: the same function
+    """
+
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def _random_position(seed: int, plies: int) -> GameState:
+    """
+    Returns the position after some random moves (fixed by the seed)
+
+    :param seed: seed of the random moves
+    :param plies: maximum number of moves played
+    :return: a running position
+    """
+
+    rng = random.Random(seed)
+    state = GameState()
+    for _ in range(plies):
+        moves = list(iter_moves(legal_moves(state)))
+        if not moves:
+            break
+        state_copy = state.copy()
+        apply_move(state_copy, rng.choice(moves))
+        if state_copy.winner():
+            break
+        state = state_copy
+    return state
+
+
+def _game_moves(state: GameState, seed: int) -> list:
+    """
+    Returns the moves played by random_game from the given state and seed
+
+    :param state: initial position (modified)
+    :param seed: seed of the random generator
+    :return: list of moves
+    """
+
+    rng = random.Random(seed)
+    moves = []
+    while not state.winner():
+        moves.append(rng.choice(list(iter_moves(legal_moves(state)))))
+        apply_move(state, moves[-1])
+    return moves
+
+
+@benchmark
+def board_construction(config: dict):
+    topleft, width = config['board_topleft'], config['board_width']
+    return (lambda: SuperTicTacToeBoard(topleft, width, config=config),
+            'boards', 1)
+
+
+@benchmark
+def basic_board_winner(config: dict):
+    # the winner is kept up to date by every mark: time a whole local game
+    board = TicTacToeBoard((0, 0), 300, config=config)
+    marks = ((0, 1), (4, 2), (8, 1), (2, 2), (6, 1), (3, 2), (7, 1))
+
+    def local_game():
+        board.reset()
+        for cell, player in marks:
+            board.update(state=player, cell=cell)
+            board.winner()
+
+    return local_game, 'moves', len(marks)
+
+
+@benchmark
+def mouse_pos_lookup(config: dict):
+    game = GameHandler(config_path=config['_path'])
+    rng = random.Random(0)
+    x, y = config['board_topleft']
+    points = [(x + rng.randrange(config['board_width']),
+               y + rng.randrange(config['board_width'])) for _ in range(1000)]
+
+    def lookup():
+        for point in points:
+            game.mouse_pos = point
+            game._get_board_and_cell_from_mouse_pos()
+
+    return lookup, 'lookups', len(points)
+
+
+@benchmark
+def draw_full_frame(config: dict):
+    game = GameHandler(config_path=config['_path'])
+    game.board.set_state(_random_position(seed=1, plies=40))
+
+    def frame():
+        game._full_redraw = True
+        game.draw(game.screen)
+
+    return frame, 'frames', 1
+
+
+@benchmark
+def draw_idle_frame(config: dict):
+    game = GameHandler(config_path=config['_path'])
+    game.draw(game.screen)
+    return lambda: game.draw(game.screen), 'frames', 1
+
+
+@benchmark
+def random_playouts(config: dict):
+    state = _random_position(seed=2, plies=0)
+    games = 20
+    # number of moves played by the timed games (they are always the same)
+    moves = sum(len(_game_moves(state.copy(), seed)) for seed in range(games))
+
+    def playouts():
+        for seed in range(games):
+            random_game(state.copy(), seed=seed)
+
+    return playouts, 'moves', moves
+
+
+@benchmark
+def search_nodes(config: dict):
+    state = _random_position(seed=3, plies=12)
+    player = AlphaBetaPlayer(time_budget=float('inf'), max_depth=4)
+    player.choose_move(state)
+    nodes = player.nodes  # the search is deterministic
+
+    def search():
+        player.table.clear()
+        player.choose_move(state)
+
+    return search, 'nodes', nodes
+
+
+def run(config: dict, names: list, repeat: int, min_time: float) -> dict:
+    """
+    Runs the given benchmarks. Every benchmark is timed repeat times (each
+    time, the operation is called as many times as needed to last min_time)
+    and the fastest time is kept.
+
+    :param config: configuration of the game
+    :param names: names of the benchmarks to run
+    :param repeat: number of timings of every benchmark
+    :param min_time: minimum seconds of every timing
+    :return: {name: {'units_per_second', 'seconds_per_call', 'unit'}}
+    """
+
+    results = {}
+    for name in names:
+        operation, unit, units = BENCHMARKS[name](config)
+        timer = timeit.Timer(operation)
+        number, _ = timer.autorange()
+        number = max(1, int(number * min_time / 0.2))
+        seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = {
+            'units_per_second': units / seconds,
+            'seconds_per_call': seconds,
+            'unit': unit
+        }
+        print(f"{name:<20} {units / seconds:>14,.0f} {unit}/s "
+              f"({seconds * 1e3:.3f} ms per call)")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compares the results with a baseline
+
+    :param results: results of run
+    :param baseline: results of a previous run
+    :param tolerance: accepted slowdown, as a fraction of the baseline speed
+    :return: names of the benchmarks slower than the baseline
+    """
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['units_per_second'] / baseline[name]['units_per_second']
+        status = 'ok'
+        if ratio < 1 - tolerance:
+            status = 'REGRESSION'
+            regressions.append(name)
+        print(f"{name:<20} {ratio:>6.2f}x baseline  {status}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Times the hot paths of the game (headless) and compares "
+                    "them with a stored baseline. Exits with status 1 if any "
+                    "benchmark is slower than the baseline."
+    )
+    parser.add_argument('names', nargs='*',
+                        help=f"benchmarks to run (default: all): "
+                             f"{', '.join(BENCHMARKS)}")
+    parser.add_argument('-o', '--output', default=None,
+                        help="JSON file where the results are written")
+    parser.add_argument('-b', '--baseline', default="baseline.json",
+                        help="JSON file with the results to compare with")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store the results as the new baseline")
+    parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                        help="accepted slowdown (fraction of the baseline)")
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help="minimum seconds of every timing")
+    parser.add_argument('--config', default="../config/config.json")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    # the game is run without players, sounds nor files written to disk
+    config = dict(load_config(args.config))
+    config.update(player1_type='human', player2_type='human',
+                  is_sound_on=False, game_record_file=None,
+                  game_store_file=None, position_cache_file=None,
+                  opening_book_file=None)
+    with tempfile.NamedTemporaryFile('w', suffix='.json',
+                                     delete=False) as config_file:
+        json.dump(config, config_file)
+    config['_path'] = config_file.name
+    # the images are converted to the format of the display when loaded
+    pygame.init()
+    pygame.display.set_mode((config['screen_width'], config['screen_height']))
+
+    try:
+        results = run(config, args.names or list(BENCHMARKS), args.repeat,
+                      args.min_time)
+    finally:
+        os.remove(config_file.name)
+        pygame.quit()
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'benchmarks': results
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)['benchmarks']
+        print(f"\ncomparison with {args.baseline}:")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Callable, Optional
+from classes.game_state import GameState
+from classes.opening_book import OpeningBook
+
+
+class AIWorker:
+    """
+    AIWorker runs the search of a computer player in a background thread, so
+        that the main loop of the game keeps drawing frames while the player
+        thinks. The main loop polls the worker once per frame. If an opening
+        book is given, it is consulted before searching: book positions are
+        answered instantly, whatever the kind of player.
+
+    AIWorker Attributes
+        player      - computer player, any object with choose_move(state) ->
+                      move and stop() methods
+        book        - OpeningBook consulted before searching (or None)
+        busy        - whether the player is thinking
+        think_time  - seconds taken by the last move returned (0 if it was
+                      found in the book)
+        book_hits   - number of moves found in the book
+        on_ready    - function called (from the background thread) when a
+                      move is ready, e.g. to wake up an event-driven loop
+
+    AIWorker Methods
+        poll     - starts the search of a position or returns its result
+        cancel   - aborts the running search and discards its result
+        close    - cancels the search and releases the player's resources
+    """
+
+    def __init__(self, player, book: Optional[OpeningBook] = None,
+                 on_ready: Optional[Callable[[], None]] = None) -> None:
+        """
+        Inits an AIWorker instance (no search is started)
+
+        :param player: computer player whose moves are computed by the worker
+        :param book: opening book consulted before searching
+        :param on_ready: function called when a searched move is ready (not
+            for cancelled searches nor book moves, which poll returns at once)
+        """
+
+        self.player = player
+        self.book = book
+        self.on_ready = on_ready
+        self.busy = False
+        self.think_time = 0.0
+        self.book_hits = 0
+        self._result: Optional[int] = None
+        self._error: Optional[Exception] = None  # raised by the search
+        self._generation = 0  # incremented when a search is cancelled
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None  # last search
+
+    def _search(self, state: GameState, generation: int) -> None:
+        """
+        Body of the background thread: computes the move of the player
+
+        :param state: position where the player takes turn (a copy)
+        :param generation: value of _generation when the search was started
+        :return: None
+        """
+
+        start = time.perf_counter()
+        move, error = None, None
+        try:
+            move = self.player.choose_move(state)
+        except Exception as e:  # re-raised by poll, in the main thread
+            error = e
+        finally:
+            with self._lock:
+                if generation == self._generation:  # not cancelled
+                    self._result, self._error = move, error
+                    self.think_time = time.perf_counter() - start
+                    self.busy = False
+                    if self.on_ready is not None:
+                        self.on_ready()
+
+    def poll(self, state: GameState) -> Optional[int]:
+        """
+        If the move of the player is ready, returns it. If the player is not
+        thinking, starts searching the given position in the background.
+
+        :param state: position where the player takes turn
+        :return: move to play (local_board * 9 + cell), None if not ready yet
+        :raise: the exception raised by the search of the player, if any
+        """
+
+        with self._lock:
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            if self._result is not None:
+                move, self._result = self._result, None
+                return move
+            if not self.busy:
+                if self.book is not None:
+                    entry = self.book.lookup(state)
+                    if entry is not None and state.is_legal(*divmod(entry[0],
+                                                                    9)):
+                        self.think_time = 0.0
+                        self.book_hits += 1
+                        return entry[0]
+                self.busy = True
+                self._thread = threading.Thread(
+                    target=self._search, args=(state.copy(), self._generation),
+                    daemon=True
+                )
+                self._thread.start()
+        return None
+
+    def cancel(self) -> None:
+        """
+        Aborts the running search (if any) and waits for its thread to end,
+        so that the next search never shares the player with it. Its result
+        will be discarded.
+
+        :return: None
+        """
+
+        with self._lock:
+            if self.busy:
+                self.player.stop()
+            self._generation += 1
+            self._result = self._error = None
+            self.busy = False
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()  # outside the lock, which the thread takes to end
+
+    def close(self) -> None:
+        """
+        Cancels the running search and releases the resources of the player
+        (e.g. the pool of processes of an MCTSPlayer)
+
+        :return: None
+        """
+
+        self.cancel()
+        if hasattr(self.player, 'close'):
+            self.player.close()
@@ -0,0 +1,347 @@
+import time
+from typing import List, Optional
+from classes.endgame_solver import EndgameSolver, WIN, LOSS, empty_cells
+from classes.evaluation import default_evaluator
+from classes.game_state import (GameState, legal_moves, iter_moves,
+                                apply_move, undo_move)
+from classes.position_cache import PositionCache
+from classes.transposition_table import TranspositionTable
+from classes.zobrist import (zobrist_hash, update_hash, canonical_hash,
+                             transform_move, INVERSE)
+
+
+# Scores are given from the point of view of the player taking turn
+WIN_SCORE = 100000
+# Scores beyond MATE_SCORE are forced wins or losses: WIN_SCORE minus the
+# number of plies to the end of the game
+MATE_SCORE = WIN_SCORE - 100
+
+
+def _to_table_score(score: int, ply: int) -> int:
+    """
+    Converts a score of the search into the score stored in the
+    transposition table: a forced win or loss is stored relative to the
+    position (plies from it to the end of the game) instead of the root
+
+    :param score: score returned by the search at the given ply
+    :param ply: distance of the position to the root of the search
+    :return: score to store
+    """
+
+    if score > MATE_SCORE:
+        return score + ply
+    if score < -MATE_SCORE:
+        return score - ply
+    return score
+
+
+def _from_table_score(score: int, ply: int) -> int:
+    """
+    Converts a score stored in the transposition table into a score of the
+    search at the given ply (undoes _to_table_score)
+
+    :param score: stored score
+    :param ply: distance of the position to the root of the search
+    :return: score relative to the root
+    """
+
+    if score > MATE_SCORE:
+        return score - ply
+    if score < -MATE_SCORE:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time budget is exhausted"""
+
+
+class AlphaBetaPlayer:
+    """
+    AlphaBetaPlayer implements a computer player that chooses its moves with
+        a negamax alpha-beta search. The search is run with iterative
+        deepening until the time budget of the move is exhausted. Moves are
+        ordered using the transposition table move, killer moves and the
+        history heuristic. If a PositionCache is given, the results of the
+        root positions are stored in it and positions that have already been
+        searched deep enough (in any game, by any player sharing the cache)
+        are not searched again. Once few cells are left to play, the
+        position is first given to an EndgameSolver, which plays perfectly
+        if it proves the value of the position within half the time budget
+        and endgame_max_nodes positions.
+
+    AlphaBetaPlayer Attributes
+        time_budget  - seconds available to choose a move
+        max_depth    - maximum depth of the iterative deepening
+        table        - TranspositionTable shared by the searches of the player
+        cache        - PositionCache shared with other players (or None)
+        cache_depth  - minimum depth of a cached result to be reused
+        endgame_threshold - the solver is used when at most this number of
+                       cells are empty (0: never)
+        endgame_max_nodes - maximum positions visited by the solver per move
+        nodes        - number of positions searched to choose the last move
+        depth        - depth of the last completed iteration
+        score        - score of the chosen move (for the player taking turn)
+
+    AlphaBetaPlayer Methods
+        choose_move  - returns the move to play (local_board * 9 + cell)
+        stop         - aborts the running search as soon as possible
+        evaluate     - static score of a position
+    """
+
+    # Number of nodes searched between two checks of the clock
+    check_every = 1024
+
+    def __init__(self,
+                 time_budget: float = 1.0,
+                 max_depth: int = 64,
+                 table_size: int = 1 << 18,
+                 cache: Optional[PositionCache] = None,
+                 cache_depth: Optional[int] = None,
+                 endgame_threshold: int = 0,
+                 endgame_max_nodes: int = 1 << 19) -> None:
+        """
+        Inits an AlphaBetaPlayer instance
+
+        :param time_budget: seconds available to choose a move
+        :param max_depth: maximum depth of the iterative deepening
+        :param table_size: maximum number of entries of the transposition table
+        :param cache: cache of evaluated positions, shared with other players
+        :param cache_depth: cached results searched at least this deep are
+            played without searching (default: max_depth)
+        :param endgame_threshold: maximum number of empty cells of the
+            positions given to the endgame solver (0: the solver is not used)
+        :param endgame_max_nodes: maximum number of positions visited by the
+            solver per move
+        """
+
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table = TranspositionTable(size=table_size)
+        self.cache = cache
+        self.cache_depth = max_depth if cache_depth is None else cache_depth
+        self.endgame_threshold = endgame_threshold
+        self.endgame_max_nodes = endgame_max_nodes
+        self.solver = EndgameSolver() if endgame_threshold > 0 else None
+        self.nodes = 0
+        self.depth = 0
+        self.score = 0
+        self._stop = False
+        self._deadline = 0.0
+        self._killers: List[List[int]] = []
+        self._history = [0] * 81
+        self._root_move = -1
+
+    def stop(self) -> None:
+        """
+        Aborts the running search. choose_move returns the best move found so
+        far (or any legal move if no iteration has been completed).
+
+        :return: None
+        """
+
+        self._stop = True
+        if self.solver is not None:
+            self.solver.stop()
+
+    def choose_move(self, state: GameState) -> int:
+        """
+        Searches the given position and returns the best move found within the
+        time budget
+
+        :param state: position where the player takes turn (not modified)
+        :return: move to play, local_board * 9 + cell
+        :raise: ValueError if the game is over
+        """
+
+        moves = list(iter_moves(legal_moves(state)))
+        if not moves:
+            raise ValueError("there are no legal moves in this position")
+
+        state = state.copy()
+        self._stop = False
+        self._deadline = time.perf_counter() + self.time_budget
+        self._killers = [[-1, -1] for _ in range(self.max_depth + 1)]
+        self._history = [0] * 81
+        self.table.new_search()
+        self.nodes = 0
+        self.depth = 0
+
+        best_move = moves[0]
+        if len(moves) == 1:
+            return best_move
+        if self.cache is not None:
+            key, symmetry = canonical_hash(state)
+            entry = self.cache.get(key)
+            if entry is not None and (entry[1] >= self.cache_depth
+                                      or abs(entry[2]) > MATE_SCORE):
+                self.depth, self.score = entry[1], entry[2]
+                return transform_move(entry[0], INVERSE[symmetry])
+        if (self.solver is not None
+                and empty_cells(state) <= self.endgame_threshold):
+            result = self.solver.solve(state, self.time_budget / 2,
+                                       self.endgame_max_nodes)
+            if result is not None:
+                self.depth = self.solver.depth
+                self.score = {WIN: WIN_SCORE, LOSS: -WIN_SCORE}.get(result[0],
+                                                                     0)
+                return result[1]
+            if self._stop:
+                return best_move
+        h = zobrist_hash(state)
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score = self._negamax(state, h, depth, -WIN_SCORE - 1,
+                                      WIN_SCORE + 1, 0)
+            except SearchTimeout:
+                break
+            best_move = self._root_move
+            self.depth, self.score = depth, score
+            if abs(score) > MATE_SCORE:
+                break  # a forced win or loss has been found
+            if time.perf_counter() >= self._deadline:
+                break
+        if self.cache is not None and self.depth:
+            self.cache.put(key, transform_move(best_move, symmetry),
+                           self.depth, self.score)
+        return best_move
+
+    def _check_time(self) -> None:
+        """
+        Raises SearchTimeout if the search has to be aborted
+
+        :return: None
+        :raise: SearchTimeout if the time is over or the search was stopped
+        """
+
+        if self._stop or time.perf_counter() >= self._deadline:
+            raise SearchTimeout
+
+    def _negamax(self, state: GameState, h: int, depth: int, alpha: int,
+                 beta: int, ply: int) -> int:
+        """
+        Negamax alpha-beta search with a transposition table
+
+        :param state: position to search (restored before returning)
+        :param h: Zobrist hash of the position
+        :param depth: remaining depth
+        :param alpha: lower bound of the search window
+        :param beta: upper bound of the search window
+        :param ply: distance to the root of the search
+        :return: score of the position for the player taking turn
+        """
+
+        self.nodes += 1
+        if self.nodes % self.check_every == 0:
+            self._check_time()
+
+        winner = state.winner()
+        if winner == -1:
+            return 0
+        if winner:  # the player who moved last has won
+            return ply - WIN_SCORE
+        if depth == 0:
+            return self.evaluate(state)
+
+        alpha_orig = alpha
+        tt_move = -1
+        entry = self.table.probe(h)
+        if entry is not None:
+            e_depth, flag, e_score, tt_move, _ = entry
+            if e_depth >= depth and ply > 0:
+                e_score = _from_table_score(e_score, ply)
+                if flag == TranspositionTable.EXACT:
+                    return e_score
+                if flag == TranspositionTable.LOWER:
+                    alpha = max(alpha, e_score)
+                else:
+                    beta = min(beta, e_score)
+                if alpha >= beta:
+                    return e_score
+
+        moves = self._order_moves(legal_moves(state), tt_move, ply)
+        best_score, best_move = -WIN_SCORE - 1, -1
+        for move in moves:
+            token = apply_move(state, move)
+            score = -self._negamax(state, update_hash(h, token, state),
+                                   depth - 1, -beta, -alpha, ply + 1)
+            undo_move(state, token)
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:  # cut-off: remember the refutation move
+                killers = self._killers[ply]
+                if killers[0] != move:
+                    killers[0], killers[1] = move, killers[0]
+                self._history[move] += depth * depth
+                break
+
+        if best_score <= alpha_orig:
+            flag = TranspositionTable.UPPER
+        elif best_score >= beta:
+            flag = TranspositionTable.LOWER
+        else:
+            flag = TranspositionTable.EXACT
+        self.table.store(h, depth, flag, _to_table_score(best_score, ply),
+                         best_move)
+        if ply == 0:
+            self._root_move = best_move
+        return best_score
+
+    def _order_moves(self, moves: int, tt_move: int, ply: int) -> List[int]:
+        """
+        Orders the legal moves to search first the most promising ones: the
+        transposition table move, then the killer moves of this ply and then
+        the rest sorted by the history heuristic
+
+        :param moves: mask of legal moves
+        :param tt_move: best move stored in the transposition table (or -1)
+        :param ply: distance to the root of the search
+        :return: list of moves in the order they have to be searched
+        """
+
+        history = self._history
+        ordered = sorted(iter_moves(moves), key=history.__getitem__,
+                         reverse=True)
+        first = [m for m in self._killers[ply] if m >= 0 and moves >> m & 1]
+        if tt_move >= 0 and moves >> tt_move & 1:
+            first = [tt_move] + [m for m in first if m != tt_move]
+        if first:
+            ordered = first + [m for m in ordered if m not in first]
+        return ordered
+
+    @staticmethod
+    def evaluate(state: GameState) -> int:
+        """
+        Static score of a (running) position for the player taking turn. It
+        rewards won local boards (the centre one counts more), local boards
+        that are one move away from completing a line of the global board,
+        and cells that are one move away from winning a local board. The
+        score is a few lookups in the tables of the default Evaluator.
+
+        :param state: position to evaluate
+        :return: score for state.player (positive is good for that player)
+        """
+
+        return default_evaluator.evaluate(state)
+
+
+if __name__ == "__main__":
+    # 1) create a position and let the computer player choose a move
+    state = GameState(player=1)
+    state.play(4, 4)
+    state.play(4, 0)
+    player = AlphaBetaPlayer(time_budget=1.0)
+    move = player.choose_move(state)
+    print(f"best move: local board {move // 9}, cell {move % 9} "
+          f"(depth {player.depth}, score {player.score}, {player.nodes} nodes,"
+          f" tt hit rate {player.table.hit_rate():.2f})")
+
+    # 2) let two computer players play a whole game
+    state = GameState(player=1)
+    players = {1: AlphaBetaPlayer(time_budget=0.1),
+               2: AlphaBetaPlayer(time_budget=0.1)}
+    while not state.winner():
+        state.play(*divmod(players[state.player].choose_move(state), 9))
+    print("result:", state.winner())
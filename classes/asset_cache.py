@@ -0,0 +1,126 @@
+import json
+import pygame
+from typing import Dict, Optional, Sequence, Tuple
+
+
+# Process-wide caches: parsed configuration files, scaled images, plain
+# colored surfaces and the surfaces of the cells of every width
+_configs: Dict[str, dict] = {}
+_images: Dict[Tuple[str, Tuple[int, int]], pygame.Surface] = {}
+_solids: Dict[Tuple[Tuple[int, ...], Tuple[int, int]], pygame.Surface] = {}
+# (id of the config, width) -> (config, surfaces): the config is kept so that
+# its id is not reused while the entry exists
+_cells: Dict[Tuple[int, int], Tuple[dict, Tuple[pygame.Surface, ...]]] = {}
+
+
+def load_config(config_path: str) -> dict:
+    """
+    Returns the content of the given configuration file. The file is only
+    read and parsed the first time (until the cache is invalidated).
+    The returned dictionary is shared: it must not be modified.
+
+    :param config_path: path from where to read the configuration file
+    :return: the configuration parameters
+    """
+
+    config = _configs.get(config_path)
+    if config is None:
+        with open(config_path, 'r') as config_file:
+            config = json.load(config_file)
+        _configs[config_path] = config
+    return config
+
+
+def load_image(image_path: str, size: Tuple[int, int]) -> pygame.Surface:
+    """
+    Returns the given image scaled to the given size. The image is decoded
+    and scaled only once per (path, size) (until the cache is invalidated).
+    The returned surface is shared: it must not be drawn on.
+
+    :param image_path: path of the image file
+    :param size: (width, height) of the scaled image
+    :return: pygame Surface containing the scaled image
+    """
+
+    key = (image_path, (int(size[0]), int(size[1])))
+    image = _images.get(key)
+    if image is None:
+        original = _images.get((image_path, (0, 0)))
+        if original is None:  # decode the file once for every size
+            original = pygame.image.load(image_path).convert()
+            _images[(image_path, (0, 0))] = original
+        image = pygame.transform.scale(original, key[1])
+        _images[key] = image
+    return image
+
+
+def solid_surface(color: Sequence[int],
+                  size: Tuple[int, int]) -> pygame.Surface:
+    """
+    Returns a surface of the given size filled with the given color. It is
+    rendered only once per (color, size) (until the cache is invalidated).
+    The returned surface is shared: it must not be drawn on.
+
+    :param color: RGB color of the surface
+    :param size: (width, height) of the surface
+    :return: pygame Surface filled with the color
+    """
+
+    key = (tuple(color), (int(size[0]), int(size[1])))
+    surface = _solids.get(key)
+    if surface is None:
+        surface = pygame.Surface(key[1]).convert()
+        surface.fill(key[0])
+        _solids[key] = surface
+    return surface
+
+
+def cell_surfaces(config: dict, width: int) -> Tuple[pygame.Surface, ...]:
+    """
+    Returns the surfaces that display a cell of the given width: its
+    backgrounds and the images of the players. They are rendered only once
+    per (config, width) (until the cache is invalidated) and every cell of
+    the same width gets them with a single lookup.
+    The returned surfaces are shared: they must not be drawn on.
+
+    :param config: configuration parameters (colors and images of the cells)
+    :param width: width of the (square) cell
+    :return: (available background, unavailable background, background
+        under the mouse, player1 image, player2 image)
+    """
+
+    entry = _cells.get((id(config), width))
+    if entry is None or entry[0] is not config:
+        size = (width, width)
+        entry = config, (
+            solid_surface(config['available_cell_bg_color'], size),
+            solid_surface(config['unavailable_cell_bg_color'], size),
+            solid_surface(config['hover_cell_bg_color'], size),
+            load_image(config['player1_img'], size),
+            load_image(config['player2_img'], size)
+        )
+        _cells[(id(config), width)] = entry
+    return entry[1]
+
+
+def invalidate(path: Optional[str] = None) -> None:
+    """
+    Removes the given file (configuration file or image, all its sizes) from
+    the caches, so that it is read again the next time it is requested.
+    If no path is given, the caches are emptied (e.g. when the display mode
+    changes and the images and surfaces have to be converted again).
+
+    :param path: path of the file to remove, None to remove everything
+    :return: None
+    """
+
+    if path is None:
+        _configs.clear()
+        _images.clear()
+        _solids.clear()
+        _cells.clear()
+        return
+    _configs.pop(path, None)
+    _cells.clear()  # they may have been rendered with the file
+    for key in [key for key in _images if key[0] == path]:
+        del _images[key]
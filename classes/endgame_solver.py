@@ -0,0 +1,239 @@
+import math
+import time
+from typing import Dict, Optional, Tuple
+from classes.game_state import (GameState, OPEN_CELLS, BOARD_MASKS, IS_WIN,
+                                legal_moves, iter_moves, apply_move, undo_move)
+from classes.zobrist import zobrist_hash, update_hash
+
+
+# Game-theoretic values, for the player taking turn
+LOSS, DRAW, WIN = -1, 0, 1
+
+
+class SolverTimeout(Exception):
+    """Raised inside the solver when its time or node budget is exhausted"""
+
+
+def empty_cells(state: GameState) -> int:
+    """
+    Counts the empty cells of the local boards that have no winner, i.e. the
+    cells that can still be played (at least in later turns)
+
+    :param state: position to inspect
+    :return: number of empty open cells
+    """
+
+    open_cells = OPEN_CELLS[state.boards[0] | state.boards[1]]
+    return bin(open_cells & ~(state.cells[0] | state.cells[1])).count('1')
+
+
+class EndgameSolver:
+    """
+    EndgameSolver proves the game-theoretic value of a position (win, draw
+        or loss for the player taking turn) with an exhaustive alpha-beta
+        search over the values LOSS < DRAW < WIN. Since the local draw rule
+        empties the drawn local boards, a game may be arbitrarily long: the
+        search is run with iterative deepening and positions cut by the depth
+        limit are unknown (they may be anything from LOSS to WIN). Only the
+        proven values are kept in the solved-position table, which is shared
+        by all the calls to solve.
+
+    EndgameSolver Attributes
+        table_size        - maximum number of solved positions remembered
+        nodes             - number of positions visited by the last call
+        nodes_per_second  - search speed of the last call
+        depth             - depth limit of the last iteration
+
+    EndgameSolver Methods
+        solve     - proves the value of a position and returns the best move
+        stop      - aborts the running call as soon as possible
+        clear     - forgets every solved position
+    """
+
+    # Number of nodes searched between two checks of the clock
+    check_every = 1024
+
+    def __init__(self, table_size: int = 1 << 20) -> None:
+        """
+        Inits an EndgameSolver instance
+
+        :param table_size: maximum number of solved positions remembered (the
+            table is emptied when it is full)
+        """
+
+        self.table_size = table_size
+        self.nodes = 0
+        self.nodes_per_second = 0.0
+        self.depth = 0
+        # hash -> (value, best move): proven values, valid at any depth
+        self._solved: Dict[int, Tuple[int, int]] = {}
+        # hash -> (depth, lower, upper, best move): bounds of the iteration
+        self._bounds: Dict[int, Tuple[int, int, int, int]] = {}
+        self._deadline = math.inf
+        self._max_nodes = math.inf
+        self._stop = False
+
+    def clear(self) -> None:
+        """
+        Forgets every solved position
+
+        :return: None
+        """
+
+        self._solved.clear()
+
+    def stop(self) -> None:
+        """
+        Aborts the running call of solve, which returns None
+
+        :return: None
+        """
+
+        self._stop = True
+
+    def solve(self,
+              state: GameState,
+              time_budget: float = math.inf,
+              max_nodes: float = math.inf) -> Optional[Tuple[int, int]]:
+        """
+        Proves the value of a running position within the time budget
+
+        :param state: position to solve (not modified)
+        :param time_budget: seconds available to prove the value
+        :param max_nodes: maximum number of positions visited (unlike the time
+            budget, it gives the same result in every run)
+        :return: (value, best move) with value in (LOSS, DRAW, WIN) for the
+            player taking turn, or None if the value was not proven in time
+        :raise: ValueError if the game is over
+        """
+
+        if not legal_moves(state):
+            raise ValueError("there are no legal moves in this position")
+        state = state.copy()
+        start = time.perf_counter()
+        self._deadline = start + time_budget
+        self._max_nodes = max_nodes
+        self._stop = False
+        self.nodes = 0
+        h = zobrist_hash(state)
+        result = None
+        depth = empty_cells(state)  # enough if no local board is drawn
+        try:
+            while result is None:
+                self.depth = depth
+                self._bounds.clear()
+                lower, upper, move = self._search(state, h, depth, LOSS, WIN)
+                if lower == upper:
+                    result = lower, move
+                depth += 9  # a drawn local board gives 9 more cells to play
+        except SolverTimeout:
+            pass
+        finally:
+            self._bounds.clear()
+            elapsed = time.perf_counter() - start
+            self.nodes_per_second = self.nodes / elapsed if elapsed else 0.0
+        return result
+
+    def _search(self, state: GameState, h: int, depth: int, alpha: int,
+                beta: int) -> Tuple[int, int, int]:
+        """
+        Alpha-beta search over game-theoretic values. The result is given as
+        bounds of the value, which hold whatever the window: they are equal
+        when the value is proven. The window only decides when to stop
+        searching the moves of a position.
+
+        :param state: position to search (restored before returning)
+        :param h: Zobrist hash of the position
+        :param depth: remaining depth
+        :param alpha: value already guaranteed to the player taking turn
+        :param beta: value already guaranteed to the opponent
+        :return: (lower bound, upper bound, best move) for the player taking
+            turn
+        """
+
+        self.nodes += 1
+        if self.nodes >= self._max_nodes:
+            raise SolverTimeout
+        if self.nodes % self.check_every == 0:
+            if self._stop or time.perf_counter() >= self._deadline:
+                raise SolverTimeout
+
+        winner = state.winner()
+        if winner == -1:
+            return DRAW, DRAW, -1
+        if winner:  # the player who moved last has won
+            return LOSS, LOSS, -1
+        solved = self._solved.get(h)
+        if solved is not None:
+            return solved[0], solved[0], solved[1]
+        if depth == 0:
+            return LOSS, WIN, -1
+        entry = self._bounds.get(h)
+        if entry is not None and entry[0] >= depth:
+            if entry[1] >= beta or entry[2] <= alpha or entry[1] == entry[2]:
+                return entry[1], entry[2], entry[3]
+
+        # the value of the position is the best value among its moves: the
+        # bounds are the best lower bound and the best upper bound of them
+        lower, upper, best_move = LOSS, LOSS, -1
+        moves = self._order_moves(state)
+        for i, move in enumerate(moves):
+            token = apply_move(state, move)
+            c_lower, c_upper, _ = self._search(
+                state, update_hash(h, token, state), depth - 1,
+                -beta, -max(alpha, lower))
+            undo_move(state, token)
+            upper = max(upper, -c_lower)
+            if best_move == -1 or -c_upper > lower:
+                lower, best_move = -c_upper, move
+            if lower >= beta:  # cut-off: the opponent avoids this position
+                if i + 1 < len(moves):
+                    upper = WIN  # the moves left may be anything
+                break
+
+        if lower == upper:
+            if len(self._solved) >= self.table_size:
+                self._solved.clear()
+            self._solved[h] = (lower, best_move)
+        else:
+            self._bounds[h] = (depth, lower, upper, best_move)
+        return lower, upper, best_move
+
+    @staticmethod
+    def _order_moves(state: GameState) -> list:
+        """
+        Orders the legal moves: first the moves that win a local board, then
+        the rest sorted by the number of player's marks in the local board
+
+        :param state: position where the moves are generated
+        :return: list of moves in the order they have to be searched
+        """
+
+        own = state.cells[state.player - 1]
+        winning, others = [], []
+        for move in iter_moves(legal_moves(state)):
+            local_board = move // 9
+            marks = (own & BOARD_MASKS[local_board]) >> (9 * local_board)
+            if IS_WIN[marks | 1 << (move % 9)]:
+                winning.append(move)
+            else:
+                others.append((-bin(marks).count('1'), move))
+        return winning + [move for _, move in sorted(others)]
+
+
+if __name__ == "__main__":
+    import random
+
+    # 1) play random games until at most 14 cells are empty, then solve them
+    solver = EndgameSolver()
+    for seed in range(10):
+        rng = random.Random(seed)
+        game = GameState()
+        while not game.winner() and empty_cells(game) > 14:
+            apply_move(game, rng.choice(list(iter_moves(legal_moves(game)))))
+        if game.winner():
+            continue
+        result = solver.solve(game, time_budget=2.0)
+        print(f"game {seed}: {empty_cells(game)} empty cells, value "
+              f"{'unknown' if result is None else result[0]}, {solver.nodes} "
+              f"nodes, {solver.nodes_per_second:.0f} nodes/s")
@@ -0,0 +1,241 @@
+import numpy as np
+from typing import Dict, List, Optional, Union
+from classes.batch_game_state import BatchGameState, LINE_CELLS
+from classes.game_state import GameState, FULL_BOARD
+
+
+# Features of a position, from the point of view of the player taking turn
+# (own count minus the opponent's count):
+#   boards          - local boards won
+#   meta_threats    - lines of the global board with two local boards won and
+#                     the third one undecided
+#   centre_board    - the centre local board is won
+#   local_threats   - lines of the undecided local boards with two cells
+#                     marked and the third one empty
+#   centre_cells    - centre cells of the undecided local boards
+#   centre_control  - cells of the centre local board (while it is undecided)
+#   free_move       - the forced local board is decided: the player taking
+#                     turn can play in any local board (1 or 0)
+FEATURES = ('boards', 'meta_threats', 'centre_board', 'local_threats',
+            'centre_cells', 'centre_control', 'free_move')
+# Weights of the static evaluation used by the search players
+DEFAULT_WEIGHTS = {'boards': 10, 'meta_threats': 8, 'centre_board': 5,
+                   'local_threats': 2, 'centre_cells': 1, 'centre_control': 0,
+                   'free_move': 0}
+
+# A 3x3 board is indexed by its ternary pattern: the sum of owner * 3^cell,
+# with owner 1 for player1 and 2 for player2 (3^9 = 19683 patterns). The
+# pattern of a 9-bit mask of each player is TERNARY[mask1] + 2 * TERNARY[mask2]
+PATTERNS = 3 ** 9
+POWERS = 3 ** np.arange(9)
+TERNARY = tuple(sum(3 ** i for i in range(9) if mask >> i & 1)
+                for mask in range(FULL_BOARD + 1))
+
+
+def _pattern_features() -> np.ndarray:
+    """
+    Computes the features of every ternary pattern of a 3x3 board, for
+    player1 minus player2: lines with two marks and an empty third cell,
+    owner of the centre (1, -1 or 0), and number of marks
+
+    :return: (PATTERNS, 3) int8 array
+    """
+
+    owners = np.arange(PATTERNS)[:, None] // POWERS % 3  # (PATTERNS, 9)
+    lines = owners[:, LINE_CELLS]  # (PATTERNS, 8, 3)
+    mine, theirs = (lines == 1).sum(axis=2), (lines == 2).sum(axis=2)
+    threats = ((mine == 2) & (theirs == 0)).sum(axis=1) \
+        - ((theirs == 2) & (mine == 0)).sum(axis=1)
+    centre = (owners[:, 4] == 1).astype(int) - (owners[:, 4] == 2)
+    marks = (owners == 1).sum(axis=1) - (owners == 2).sum(axis=1)
+    return np.stack([threats, centre, marks], axis=1).astype(np.int8)
+
+
+# PATTERN_FEATURES[pattern] = (threats, centre, marks) of a 3x3 board. For a
+# local board, they are local_threats, centre_cells and centre_control (only
+# for the centre board); for the global board, meta_threats, centre_board and
+# boards
+PATTERN_FEATURES = _pattern_features()
+
+
+class Evaluator:
+    """
+    Evaluator scores positions with a weighted sum of FEATURES. The weighted
+        features of every ternary pattern are precomputed in lookup tables,
+        so the score of a position is the lookup of the global board pattern
+        plus one lookup per undecided local board. The batch methods compute
+        the features and scores of a BatchGameState with NumPy, e.g. to fit
+        the weights to the results of games.
+
+    Evaluator Attributes
+        weights  - {feature: weight}. Integer weights give integer scores
+
+    Evaluator Methods
+        evaluate        - score of a position for the player taking turn
+        features        - features of a position
+        features_batch  - (B, len(FEATURES)) features of a batch of positions
+        evaluate_batch  - (B,) scores of a batch of positions
+    """
+
+    def __init__(self,
+                 weights: Optional[Dict[str, Union[int, float]]] = None
+                 ) -> None:
+        """
+        Inits an Evaluator instance and builds its lookup tables
+
+        :param weights: {feature: weight}, missing features weigh 0 (by
+            default, DEFAULT_WEIGHTS)
+        :raise: ValueError if a feature is unknown
+        """
+
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"unknown features: {', '.join(sorted(unknown))}")
+        self.weights = {name: weights.get(name, 0) for name in FEATURES}
+        self._vector = np.array([self.weights[name] for name in FEATURES])
+        w = self.weights
+        features = PATTERN_FEATURES.astype(self._vector.dtype)
+        # score of every pattern of a local board, of the centre local board
+        # and of the global board (lists are faster than arrays to index)
+        local = features[:, 0] * w['local_threats'] \
+            + features[:, 1] * w['centre_cells']
+        centre = local + features[:, 2] * w['centre_control']
+        meta = features[:, 0] * w['meta_threats'] \
+            + features[:, 1] * w['centre_board'] + features[:, 2] * w['boards']
+        local, centre = local.tolist(), centre.tolist()
+        self._local_scores = [centre if board == 4 else local
+                              for board in range(9)]
+        self._meta_scores = meta.tolist()
+        self._free_move = w['free_move']
+
+    def evaluate(self, state: GameState) -> Union[int, float]:
+        """
+        Static score of a (running) position for the player taking turn
+
+        :param state: position to evaluate
+        :return: score for state.player (positive is good for that player)
+        """
+
+        cells1, cells2 = state.cells
+        boards1, boards2 = state.boards
+        decided = boards1 | boards2
+        score = self._meta_scores[TERNARY[boards1] + 2 * TERNARY[boards2]]
+        for board in range(9):
+            if not decided >> board & 1:
+                shift = 9 * board
+                score += self._local_scores[board][
+                    TERNARY[cells1 >> shift & FULL_BOARD]
+                    + 2 * TERNARY[cells2 >> shift & FULL_BOARD]]
+        if state.player == 2:
+            score = -score
+        if state.forced_board == -1:
+            score += self._free_move
+        return score
+
+    @staticmethod
+    def features(state: GameState) -> List[int]:
+        """
+        Computes the features of a position
+
+        :param state: position
+        :return: value of every feature of FEATURES, for the player taking
+            turn
+        """
+
+        cells1, cells2 = state.cells
+        boards1, boards2 = state.boards
+        decided = boards1 | boards2
+        threats, centre, marks = PATTERN_FEATURES[
+            TERNARY[boards1] + 2 * TERNARY[boards2]].tolist()
+        values = [marks, threats, centre, 0, 0, 0, 0]
+        for board in range(9):
+            if not decided >> board & 1:
+                shift = 9 * board
+                threats, centre, marks = PATTERN_FEATURES[
+                    TERNARY[cells1 >> shift & FULL_BOARD]
+                    + 2 * TERNARY[cells2 >> shift & FULL_BOARD]].tolist()
+                values[3] += threats
+                values[4] += centre
+                if board == 4:
+                    values[5] = marks
+        if state.player == 2:
+            values = [-value for value in values]
+        values[6] = int(state.forced_board == -1)
+        return values
+
+    @staticmethod
+    def features_batch(batch: BatchGameState) -> np.ndarray:
+        """
+        Computes the features of every position of a batch
+
+        :param batch: positions (finished games get meaningless values)
+        :return: (B, len(FEATURES)) int16 array, for the player taking turn
+            of every game
+        """
+
+        cells = batch.cells.reshape(-1, 9, 9).astype(np.intp)
+        boards = batch.boards.astype(np.intp)
+        local = PATTERN_FEATURES[cells @ POWERS].astype(np.int16)  # (B,9,3)
+        local *= (batch.boards == 0)[:, :, None]  # only undecided boards
+        meta = PATTERN_FEATURES[boards @ POWERS].astype(np.int16)  # (B,3)
+        features = np.stack([
+            meta[:, 2], meta[:, 0], meta[:, 1],
+            local[:, :, 0].sum(axis=1), local[:, :, 1].sum(axis=1),
+            local[:, 4, 2], np.zeros(len(boards), dtype=np.int16)
+        ], axis=1)
+        features *= np.where(batch.player == 1, 1, -1).astype(
+            np.int16)[:, None]
+        features[:, 6] = batch.forced_board == -1
+        return features
+
+    def evaluate_batch(self, batch: BatchGameState) -> np.ndarray:
+        """
+        Static scores of every position of a batch
+
+        :param batch: positions (finished games get meaningless values)
+        :return: (B,) scores, for the player taking turn of every game
+        """
+
+        return self.features_batch(batch) @ self._vector
+
+
+# evaluator with DEFAULT_WEIGHTS
+default_evaluator = Evaluator()
+
+
+if __name__ == "__main__":
+    import time
+    from classes.batch_game_state import random_playouts
+
+    # 1) the scalar and batch variants agree on random positions
+    rng = np.random.default_rng(0)
+    batch = BatchGameState(2000)
+    for _ in range(rng.integers(10, 40)):
+        batch.step(batch.random_moves(rng))
+    batch = BatchGameState.from_states(
+        [batch.to_state(i) for i in np.flatnonzero(batch.winner == 0)])
+    states = [batch.to_state(i) for i in range(len(batch))]
+    scores = default_evaluator.evaluate_batch(batch)
+    assert scores.tolist() == [default_evaluator.evaluate(s) for s in states]
+    assert default_evaluator.features_batch(batch).tolist() == \
+        [Evaluator.features(s) for s in states]
+    start = time.perf_counter()
+    for state in states:
+        default_evaluator.evaluate(state)
+    elapsed = (time.perf_counter() - start) / len(states)
+    print(f"{len(states)} positions, {elapsed * 1e6:.1f} us per evaluation")
+
+    # 2) fit the weights to the results of random playouts of the positions
+    # (least squares of the score of the player taking turn)
+    features = Evaluator.features_batch(batch).astype(float)
+    player = batch.player.copy()
+    random_playouts(batch, rng)
+    target = np.where(batch.winner == player, 1.0,
+                      np.where(batch.winner == -1, 0.5, 0.0))
+    solution = np.linalg.lstsq(
+        np.column_stack([features, np.ones(len(features))]), target,
+        rcond=None)[0]
+    fitted = Evaluator(dict(zip(FEATURES, solution[:-1])))
+    print("fitted weights:", {name: round(float(weight), 3)
+                              for name, weight in fitted.weights.items()})
@@ -1,10 +1,32 @@
+import os
+import time
 import pygame
-import json
-from typing import Tuple
+from typing import List, Optional, Tuple
+from classes.ai_worker import AIWorker
+from classes.alpha_beta_player import AlphaBetaPlayer
+from classes.asset_cache import load_config, load_image, solid_surface
+from classes.game_record import GameRecordWriter
+from classes.game_replay import GameReplay
+from classes.game_state import GameState
+from classes.game_store import GameStore
+from classes.instrumentation import Instrumentation
+from classes.opening_book import OpeningBook
+from classes.player_factory import create_player
+from classes.position_cache import PositionCache
+from classes.spectator_client import SpectatorClient
 from classes.super_tic_tac_toe_board import SuperTicTacToeBoard
+from classes.sync_protocol import SyncDecoder, SyncError
 from classes.tic_tac_toe_cell import TicTacToeCell
 
 
+# Custom events posted from background threads to wake up the event-driven
+# main loop: the move of a computer player is ready, a position of the replay
+# has been evaluated, messages of the watched match have been received
+AI_MOVE_READY = pygame.event.custom_type()
+ANNOTATION_READY = pygame.event.custom_type()
+SPECTATOR_DATA = pygame.event.custom_type()
+
+
 class GameHandler:
     """
     GameHandler implements the logic of a Super Tic-Tac-Toe game.
@@ -18,24 +40,54 @@ class GameHandler:
         mouse_pos      - (x,y) mouse coordinates to process the player's action
         sound_on       - whether to play sounds
         screen         - pygame surface where the game is displayed
+        ai_workers     - {player: AIWorker} for the players controlled by the
+                         computer (player1_type, player2_type in config)
+        position_cache - PositionCache shared by the computer players, kept
+                         in position_cache_file between runs (if given)
+        opening_book   - OpeningBook consulted by the computer players before
+                         searching (None if opening_book_file doesn't exist)
+        recorder       - GameRecordWriter where the moves of every game are
+                         appended (None if game_record_file is not set)
+        game_store     - GameStore where the finished games are kept for
+                         analytics (None if game_store_file is not set)
+        replay         - GameReplay shown in replay mode (None when playing).
+                         Press R to replay the current game and go back to it,
+                         arrows/page keys to step and Home/End to jump
+        stats          - Instrumentation of the main loop (None unless the
+                         instrumentation config is true). Press F3 to show
+                         its overlay
+        spectator      - SpectatorClient receiving the match watched in
+                         spectator mode (None when playing). The board is
+                         read-only: clicks are ignored
 
     GameHandler Methods
         process_events - process the events of the game (mouse clicks)
         run_logic      - runs the logic of the game based on user's actions
         draw           - displays the game's elements on the given surface
-        run            - runs the main loop to play the game
+        run            - runs the main loop to play the game. If the
+                         event_driven config is true, the loop sleeps until
+                         something happens instead of running at 60 FPS
     """
 
     def __init__(self,
-                 config_path: str = "../config/config.json") -> None:
+                 config_path: str = "../config/config.json",
+                 replay_moves: Optional[List[Tuple[int, int]]] = None,
+                 spectate: Optional[Tuple[str, int]] = None
+                 ) -> None:
         """
         Inits a GameHandler instance
 
         :param config_path: path from where to read the configuration file
+        :param replay_moves: (local_board, cell) moves of a game saved during
+            play. If given, the game starts in replay mode (at ply 0)
+        :param spectate: (host, port) of a SpectatorBroadcaster. If given,
+            the game is read-only and displays the match it broadcasts
+        :raise: OSError if the broadcaster can't be reached
         """
 
-        with open(config_path, 'r') as config_file:
-            config = json.load(config_file)
+        # the config is read once and passed down to the boards and cells
+        config = load_config(config_path)
+        self._config = config
 
         # Initialize pygame and create the screen (surface)
         screen_width = config['screen_width']
@@ -44,19 +96,53 @@ class GameHandler:
         self.screen = pygame.display.set_mode((screen_width, screen_height))
         pygame.display.set_caption(config['title'])
 
-        # Create the (global) Super TicTacToe board
+        # Create the (global) Super TicTacToe board. It displays a GameState,
+        # which applies the rules of the game
+        self._first_player = config['player_starting_the_game']
         self.board = SuperTicTacToeBoard(
-            topleft=config['board_topleft'], width=config['board_width']
+            topleft=config['board_topleft'], width=config['board_width'],
+            state=GameState(player=self._first_player), config=config
         )
 
         self._available_local_board = -1  # all local boards ara available
         self.mouse_pos = None  # mouse_pos is not None when mouse is clicked
-        self._first_player = config['player_starting_the_game']
+        self._hovered_cell = (-1, -1)  # highlighted (local board, cell)
         self.active_player = self._first_player  # player to take turn
         self._screen_bg_color = config['screen_bg_color']
         self.sound_on = config['is_sound_on']  # whether sounds will be played
         self.title = config['title']
 
+        # Every move is appended to the game record file (if any). Spectators
+        # don't play: the moves are neither recorded nor computed
+        self.recorder = None
+        if config['game_record_file'] is not None and spectate is None:
+            self.recorder = GameRecordWriter(config['game_record_file'])
+            self.recorder.begin_game(player=self._first_player)
+        # Finished games are also kept in the game store (inserted in the
+        # background, so the main loop never waits for the database)
+        self.game_store = None
+        if config['game_store_file'] is not None and spectate is None:
+            self.game_store = GameStore(config['game_store_file'])
+
+        # Computer players think in a background thread, so that the main loop
+        # never stalls. Human players are not included (mouse clicks)
+        self.position_cache = PositionCache(config['position_cache_size'])
+        if config['position_cache_file'] is not None:
+            self.position_cache.load(config['position_cache_file'])
+        book_path = config['opening_book_file']
+        self.opening_book = OpeningBook(book_path) \
+            if book_path is not None and os.path.exists(book_path) else None
+        self.ai_workers = {}
+        for player in (1, 2) if spectate is None else ():
+            ai_player = create_player(config[f'player{player}_type'], config,
+                                      cache=self.position_cache)
+            if ai_player is not None:
+                self.ai_workers[player] = AIWorker(
+                    ai_player, book=self.opening_book,
+                    on_ready=lambda: self._post_event(AI_MOVE_READY)
+                )
+        self._event_driven = config['event_driven']
+
         # Defines text elements to display information about the game's state
         # when the game is running, tell which player takes turn (active):
         #   "Player {icon}, it's your turn!"
@@ -77,7 +163,8 @@ class GameHandler:
         self._active_player_icon = TicTacToeCell(
             topleft=(self.board.topleft[0] + self._player_text.get_width(),
                      self._player_text_tl[1]),
-            width=self._player_text.get_height()
+            width=self._player_text.get_height(),
+            config=config
         )
         self._active_player_icon.update(state=self.active_player)
 
@@ -91,6 +178,16 @@ class GameHandler:
         self._winner_text = self._text(", you win!!!")
         self._game_is_a_draw_text = self._text("This game is a draw!!!")
 
+        # area of the screen covered by the game information (any variant)
+        self._info_rect = self._player_text.get_rect(
+            topleft=self._player_text_tl).unionall([
+                self._active_player_icon.rect,
+                self._your_turn_text.get_rect(topleft=self._game_info_tl),
+                self._winner_text.get_rect(topleft=self._game_info_tl),
+                self._game_is_a_draw_text.get_rect(
+                    topleft=self._player_text_tl)
+            ])
+
         small_font = pygame.font.SysFont(name=config['text_font'],
                                          size=config['text_font_size'])
         self._new_game_button = small_font.render(
@@ -102,11 +199,68 @@ class GameHandler:
             x=screen_width - self._new_game_button.get_width() - m, y=m
         )
 
+        # Static layer, rendered once for the size of the window: background
+        # color and new game button. Every variant of the game information is
+        # also rendered once (over the static layer), keyed by _info_signature
+        self._background = solid_surface(self._screen_bg_color,
+                                         (screen_width, screen_height)).copy()
+        self._background.blit(self._new_game_button,
+                              self._new_game_button_rect)
+        self._info_rect = self._info_rect.clip(self._background.get_rect())
+        self._info_surfaces = {
+            key: self._render_game_information(*key)
+            for key in ((0, 1), (0, 2), (1, 1), (2, 2), (-1, 0))
+        }
+
         # Load sounds to be played (only if sound is on)
         self._cell_win_sound = pygame.mixer.Sound(config['cell_win_sound'])
         self._local_win_sound = pygame.mixer.Sound(config['local_win_sound'])
         self._global_win_sound = pygame.mixer.Sound(config['global_win_sound'])
 
+        # Retained-mode rendering: draw the whole screen in the first frame,
+        # then only the elements that change
+        self._full_redraw = True
+        self._drawn_info = None  # _info_signature() when the info was drawn
+
+        # Replay mode: the moves of the current game are saved while playing.
+        # The replay information is displayed below the board
+        self._moves: List[Tuple[int, int]] = []
+        self.replay: Optional[GameReplay] = None
+        self._live_state = self.board.state  # position of the game
+        self._replay_font = pygame.font.SysFont(
+            name=config['text_font'], size=config['text_font_size'] // 2)
+        board_bottom = self.board.topleft[1] + self.board.width
+        self._replay_rect = pygame.Rect(
+            0, board_bottom, screen_width, screen_height - board_bottom)
+        self._drawn_replay = None  # _replay_signature() when it was drawn
+        if replay_moves:
+            self._start_replay(replay_moves, ply=0)
+
+        # Spectator mode: the messages of the broadcaster are received in a
+        # background thread and posted to the main loop, which applies them
+        # to the board (the decoder plays the moves on it)
+        self.spectator = None
+        if spectate is not None:
+            self._decoder = SyncDecoder(board=self.board)
+            self.spectator = SpectatorClient(
+                spectate,
+                on_data=lambda data: self._post_event(SPECTATOR_DATA,
+                                                      data=data)
+            )
+
+        # Opt-in instrumentation of the main loop. Its overlay is displayed
+        # over the top-left corner of the screen, refreshed twice per second
+        self.stats = Instrumentation(config['instrumentation_window']) \
+            if config['instrumentation'] else None
+        self._stats_font = pygame.font.SysFont(name=config['text_font'],
+                                               size=16)
+        widest = "fps 00.0  frame 00.00 ms (p95 00.00, max 000.0)  p95 " \
+                 "process_events 00.00"
+        self._stats_rect = pygame.Rect(
+            0, 0, self._stats_font.size(widest)[0],
+            5 * self._stats_font.get_linesize() + 8)
+        self._drawn_stats = None  # _stats_signature() when it was drawn
+
     def _text(self, text: str) -> pygame.Surface:
         """
         Renders the given string into a pygame surface
@@ -125,12 +279,25 @@ class GameHandler:
         :return: None
         """
 
+        if self.replay is not None:
+            self._stop_replay()
+        for worker in self.ai_workers.values():
+            worker.cancel()  # discard the moves computed for the old game
+        self._moves = []
         topleft, width = self.board.topleft, self.board.width
-        self.board = SuperTicTacToeBoard(topleft=topleft, width=width)
+        self.board = SuperTicTacToeBoard(
+            topleft=topleft, width=width,
+            state=GameState(player=self._first_player), config=self._config
+        )
         self.board.update(state=0)  # make all cells available
+        if self.recorder is not None:  # the old game is ended if unfinished
+            self.recorder.begin_game(player=self._first_player)
         self.active_player = self._first_player  # who starts the game
         self._active_player_icon.update(state=self.active_player)
         self._available_local_board = -1  # all local boards ara available
+        self._hovered_cell = (-1, -1)  # the new board has no highlighted cell
+        self._update_hover(pygame.mouse.get_pos())
+        self._full_redraw = True  # the whole screen has to be drawn again
 
     def _update_availability(self, make_available: bool) -> None:
         """
@@ -162,39 +329,44 @@ class GameHandler:
         """
 
         if self.board.winner() <= 0:  # no global winner
-            self.active_player = 1 if self.active_player == 2 else 2
+            self.active_player = self.board.state.player
             # also updates the icon that is displayed in the game info (text)
             self._active_player_icon.update(state=self.active_player)
 
-    def _update_available_local_board(self, local_board: int) -> None:
+    def _update_available_local_board(self) -> None:
         """
         The position of the last selected cell defines the next available local
         board. If that local_board already has a winner, all the local boards
-        become available.
+        become available. The game state computes it when a move is played.
 
-        :param local_board: (index of) the next available local board
         :return: None
         """
 
-        if self.board[local_board].winner():
-            self._available_local_board = -1  # make all the boards available
-        else:
-            self._available_local_board = local_board
+        # -1 means that all the local boards are available
+        self._available_local_board = self.board.state.forced_board
 
-    def _mark_cell(self, player: int, local_board: int, cell: int) -> None:
+    def _mark_cell(self, local_board: int, cell: int) -> None:
         """
-        Marks the given cell with the given player. Checks the state of the
+        Marks the given cell with the active player. Checks the state of the
         game once the cell is marked (global win, local win, local draw, same)
         and updates it accordingly. Plays sound if sound is on.
 
-        :param player: which player is marking the cell
         :param local_board: board where the cell belongs to
-        :param cell: cell marked by the given player
+        :param cell: cell marked by the active player
         :return: None
         """
 
-        # Mark the cell with the given player
-        self.board.update(state=player, local_board=local_board, cell=cell)
+        # Mark the cell with the active player (the turn is passed)
+        self.board.play(local_board=local_board, cell=cell)
+        self._moves.append((local_board, cell))  # saved for the replay mode
+        if self.recorder is not None:
+            self.recorder.add_move(local_board * 9 + cell)
+            if self.board.winner():
+                self.recorder.end_game(self.board.winner())
+        if self.game_store is not None and self.board.winner():
+            self.game_store.add_game(
+                self._first_player, (b * 9 + c for b, c in self._moves),
+                self.board.winner())
 
         # check the state of the boards once the new cell is marked
         if self.board.winner() > 0:  # the game has a winner
@@ -202,7 +374,7 @@ class GameHandler:
             self._active_player_icon.update(state=self.board.winner())
             if self.sound_on:
                 self._global_win_sound.play()
-        elif self.board[local_board].winner() > 0 and self.sound_on:
+        elif self.board.state.local_winner(local_board) and self.sound_on:
             self._local_win_sound.play()  # local win
         elif self.sound_on:
             self._cell_win_sound.play()  # cell win
@@ -222,116 +394,518 @@ class GameHandler:
         if local_board == -1 or cell == -1:
             # -1 means that no available cell was selected
             return  # there is nothing to process, wait for the next click
+        if not self.board.state.is_legal(local_board=local_board, cell=cell):
+            return  # the cell is already filled or its board has a winner
 
         # If an available cell was selected, run the steps to play the turn
+        self._play_turn(local_board=local_board, cell=cell)
+
+    def _process_ai_turn(self) -> None:
+        """
+        If the active player is controlled by the computer, poll its worker:
+        the search is started in the background the first time, and the turn
+        is played once the move is ready.
+
+        :return: None
+        """
+
+        worker = self.ai_workers.get(self.active_player)
+        if worker is None or self.board.winner():
+            return  # a human takes turn or the game is over
+        move = worker.poll(self.board.state)
+        if move is not None:
+            if self.stats is not None:
+                self.stats.add_sample('ai_think', worker.think_time)
+                self._update_stats_gauges()
+            local_board, cell = divmod(move, 9)
+            self._play_turn(local_board=local_board, cell=cell)
+
+    def _play_turn(self, local_board: int, cell: int) -> None:
+        """
+        The active player marks the given (legal) cell. Updates the board and
+        the game params accordingly to go on with the game.
+
+        :param local_board: local board where the cell belongs to
+        :param cell: cell marked by the active player
+        :return: None
+        """
+
+        if self.stats is not None:
+            self.stats.mark_turn()  # its latency ends when it is displayed
         # 2) Make unavailable the local board that was available this turn
         self._update_availability(make_available=False)
         # 3) Mark the cell in the board
-        self._mark_cell(player=self.active_player,
-                        local_board=local_board,
-                        cell=cell)
+        self._mark_cell(local_board=local_board, cell=cell)
         # 4) Let the inactive player be the active player the next turn
         self._update_active_player()
         # 5) Set which local board are available the next turn
-        self._update_available_local_board(local_board=cell)
+        self._update_available_local_board()
         # 6) Make those boards available
         self._update_availability(make_available=True)
         # 7) The next player is ready to take turn
+        self._update_hover(pygame.mouse.get_pos())
 
     def _get_board_and_cell_from_mouse_pos(self) -> Tuple[int, int]:
         """
         Assuming that self.mouse_pos is not None, check if the mouse position
         collides with any available cell. Returns the cell_id and the
-        local_board_id where the cell belongs to.
+        local_board_id where the cell belongs to. The board resolves the
+        position in constant time (pixel-to-cell lookup tables).
         If no collision is found, return (-1,-1)
 
         :return: two integers from 0 to 8 representing a local board and a cell
             return (-1,-1) if the mouse did not collide with any available cell
         """
 
-        for local_board_id, local_board in enumerate(self.board):
-            for cell_id, cell in enumerate(local_board):
-                if cell.collidepoint(self.mouse_pos):
-                    if cell.available:
-                        return local_board_id, cell_id
-        return -1, -1  # no available cell was clicked
+        local_board, cell = self.board.cell_at(self.mouse_pos)
+        if local_board == -1 or not self.board[local_board][cell].available:
+            return -1, -1  # no available cell was clicked
+        return local_board, cell
 
-    def _display_game_information(self, screen: pygame.Surface) -> None:
+    def _update_hover(self, mouse_pos: Tuple[int, int]) -> None:
+        """
+        Highlights the cell under the mouse if a human player can mark it, and
+        removes the highlight of the previously hovered cell
+
+        :param mouse_pos: (x,y) position of the mouse
+        :return: None
+        """
+
+        local_board, cell = self.board.cell_at(mouse_pos)
+        if (self.active_player in self.ai_workers or self.replay is not None
+                or self.spectator is not None
+                or not self.board.state.is_legal(local_board, cell)):
+            local_board, cell = -1, -1  # nothing to highlight
+        if (local_board, cell) == self._hovered_cell:
+            return
+        if self._hovered_cell[0] != -1:
+            self.board[self._hovered_cell[0]].highlight(
+                self._hovered_cell[1], False)
+        if local_board != -1:
+            self.board[local_board].highlight(cell, True)
+        self._hovered_cell = (local_board, cell)
+
+    def _start_replay(self, moves: List[Tuple[int, int]], ply: int) -> None:
+        """
+        Enters the replay mode: the computer players stop thinking and the
+        positions of the game are evaluated in the background
+
+        :param moves: (local_board, cell) moves of the game to replay
+        :param ply: ply of the position displayed first
+        :return: None
+        """
+
+        for worker in self.ai_workers.values():
+            worker.cancel()
+        self.replay = GameReplay(
+            moves, player=self._first_player,
+            checkpoint_every=self._config['replay_checkpoint_every']
+        )
+        self.replay.annotate(
+            AlphaBetaPlayer(
+                time_budget=self._config['replay_eval_time'],
+                max_depth=self._config['ai_max_depth'],
+                table_size=self._config['ai_transposition_table_size']
+            ),
+            on_annotation=lambda ply: self._post_event(ANNOTATION_READY)
+        )
+        self._live_state = self.board.state.copy()
+        self._show_position(self.replay.seek(ply))
+
+    def _stop_replay(self) -> None:
+        """
+        Leaves the replay mode and goes back to the game position
+
+        :return: None
+        """
+
+        self.replay.stop()
+        self.replay = None
+        self._show_position(self._live_state)
+
+    def _show_position(self, state: GameState) -> None:
+        """
+        Displays the given position on the board, with its availability,
+        active player and winner
+
+        :param state: position to display
+        :return: None
+        """
+
+        self._update_availability(make_available=False)
+        self.board.set_state(state)
+        self._update_active_player()
+        if self.board.winner() > 0:
+            self._active_player_icon.update(state=self.board.winner())
+        self._update_available_local_board()
+        self._update_availability(make_available=True)
+
+    def _apply_spectator_data(self, data: bytes) -> None:
+        """
+        Applies the messages received from the broadcaster and displays the
+        resulting position. If a message was lost, the position is kept
+        until the next snapshot brings the spectator back in sync
+
+        :param data: complete messages of the sync protocol
+        :return: None
+        """
+
+        try:
+            self._decoder.feed(data)
+        except SyncError:
+            pass  # wait for the next snapshot
+        self._show_position(self.board.state)
+
+    def _process_replay_key(self, key: int) -> None:
+        """
+        Reacts to the keys of the replay mode: R enters or leaves it, the
+        arrows and page keys step through the game, Home and End jump to
+        its first and last positions
+
+        :param key: pygame key code of the pressed key
+        :return: None
+        """
+
+        if key == pygame.K_r:
+            if self.replay is not None:
+                self._stop_replay()
+            elif self._moves:
+                self._start_replay(self._moves, ply=len(self._moves))
+            return
+        if self.replay is None:
+            return
+        steps = {pygame.K_LEFT: -1, pygame.K_RIGHT: 1,
+                 pygame.K_PAGEUP: -10, pygame.K_PAGEDOWN: 10,
+                 pygame.K_HOME: -len(self.replay),
+                 pygame.K_END: len(self.replay)}
+        if key in steps:
+            self._show_position(self.replay.seek(self.replay.ply + steps[key]))
+
+    def _replay_signature(self) -> Optional[tuple]:
+        """
+        Returns the values the displayed replay information depends on
+
+        :return: (ply, number of moves, annotation), None if not replaying
+        """
+
+        if self.replay is None:
+            return None
+        return (self.replay.ply, len(self.replay),
+                self.replay.annotations[self.replay.ply])
+
+    def _display_replay_information(self, screen: pygame.Surface) -> None:
         """
-        Displays information about the state of the game. If the game is
-        running, tells which player takes turn. If there is a winner, announce
-        the winner. If the game is a draw, inform the players about it.
+        Displays the ply of the replayed position and its evaluation: the
+        score from player1's point of view and the best move
 
         :param screen: pygame surface where the text is displayed
         :return: None
         """
 
-        if self.board.winner() >= 0:
+        if self.replay is None:
+            return
+        text = f"replay: ply {self.replay.ply}/{len(self.replay)}"
+        annotation = self.replay.annotations[self.replay.ply]
+        if self.board.winner():
+            text += "  (game over)"
+        elif annotation is None:
+            text += "  (evaluating...)"
+        elif annotation[0] is None:
+            text += f"  forced move {divmod(annotation[1], 9)}"
+        else:
+            score = annotation[0] if self.board.state.player == 1 \
+                else -annotation[0]
+            text += f"  eval {score:+d}  best {divmod(annotation[1], 9)}"
+        surface = self._replay_font.render(text, True, self._text_color)
+        screen.blit(surface, surface.get_rect(center=self._replay_rect.center))
+
+    def _render_game_information(self, winner: int,
+                                 player: int) -> pygame.Surface:
+        """
+        Renders a variant of the game information over the static layer. If
+        the game is running, tells which player takes turn. If there is a
+        winner, announce the winner. If the game is a draw, inform the players
+        about it.
+
+        :param winner: winner of the game (-1 draw, 0 running, 1|2 player)
+        :param player: player whose icon is displayed (not used if draw)
+        :return: pygame Surface covering the area of the game information
+        """
+
+        surface = self._background.subsurface(self._info_rect).copy()
+        x, y = self._info_rect.topleft
+        if winner >= 0:
             # if the game is not a draw, display the active or winner player
-            screen.blit(self._player_text, self._player_text_tl)
-            self._active_player_icon.draw(screen)
-            if self.board.winner() > 0:  # active player is the winner
-                screen.blit(self._winner_text, self._game_info_tl)
-            else:  # active player is player taking turn
-                screen.blit(self._your_turn_text, self._game_info_tl)
-        else:  # self.board.winner() == -1
-            # the game is a draw, don't display the active player
-            screen.blit(self._game_is_a_draw_text, self._player_text_tl)
-
-    def process_events(self) -> bool:
+            surface.blit(self._player_text, (self._player_text_tl[0] - x,
+                                             self._player_text_tl[1] - y))
+            icon = self._active_player_icon.rect
+            surface.blit(load_image(self._config[f'player{player}_img'],
+                                    icon.size), icon.move(-x, -y))
+            # the active player is the winner or the player taking turn
+            text = self._winner_text if winner > 0 else self._your_turn_text
+            surface.blit(text, (self._game_info_tl[0] - x,
+                                self._game_info_tl[1] - y))
+        else:  # the game is a draw, don't display the active player
+            surface.blit(self._game_is_a_draw_text,
+                         (self._player_text_tl[0] - x,
+                          self._player_text_tl[1] - y))
+        return surface
+
+    def _display_game_information(self, screen: pygame.Surface) -> None:
+        """
+        Displays information about the state of the game (the pre-rendered
+        variant of _render_game_information)
+
+        :param screen: pygame surface where the text is displayed
+        :return: None
+        """
+
+        screen.blit(self._info_surfaces[self._info_signature()],
+                    self._info_rect)
+
+    def process_events(self,
+                       events: Optional[List[pygame.event.Event]] = None
+                       ) -> bool:
         """
         Deals with the user's input (right mouse click).
-        Possible actions: quit the game, right mouse click
+        Possible actions: quit the game, right mouse click, mouse motion
+        (highlights the cell under the mouse). In spectator mode, applies
+        the messages received from the broadcaster instead of the clicks
 
+        :param events: events to process (by default, the pending events are
+            taken from the queue)
         :return: whether to quit the game
         """
 
-        for event in pygame.event.get():
+        if events is None:
+            events = pygame.event.get()
+        for event in events:
             if event.type == pygame.QUIT:
                 return True
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     return True
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if event.key == pygame.K_F3 and self.stats is not None:
+                    self._toggle_stats_overlay()
+                self._process_replay_key(event.key)
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self._full_redraw = True  # the window content was lost
+            if event.type == pygame.MOUSEMOTION:
+                self._update_hover(event.pos)
+            if event.type == SPECTATOR_DATA:
+                self._apply_spectator_data(event.data)
+            if (event.type == pygame.MOUSEBUTTONDOWN and event.button == 1
+                    and self.spectator is None):  # spectators are read-only
                 # store the position of the mouse click. It will be used in the
                 # run_logic method
                 self.mouse_pos = pygame.mouse.get_pos()
+                if self.stats is not None:
+                    self.stats.mark_click()
         return False
 
     def run_logic(self) -> None:
         """
         Translates the mouse clicks from the users into the proper game change
-        Possible actions: click on a cell, click the new_game button
+        Possible actions: click on a cell, click the new_game button.
+        If a computer player takes turn, play its move once it is ready.
+
+        :return: None
+        """
+
+        if self.mouse_pos is not None:  # react against the player's clicks
+            if self._new_game_button_rect.collidepoint(self.mouse_pos):
+                self._reset_game()  # restart the game (board)
+            elif (self.active_player not in self.ai_workers
+                  and self.replay is None):
+                self._process_turn()  # a cell has been selected by a human
+            # return to default value, wait for the next mouse click
+            self.mouse_pos = None
+        if self.replay is None:  # the game is paused while replaying
+            self._process_ai_turn()
+
+    def _toggle_stats_overlay(self) -> None:
+        """
+        Shows or hides the instrumentation overlay
+
+        :return: None
+        """
+
+        self.stats.visible = not self.stats.visible
+        if self.stats.visible:
+            self._update_stats_gauges()
+            self._drawn_stats = None
+        else:
+            self._full_redraw = True  # draw the game under the overlay
+
+    def _update_stats_gauges(self) -> None:
+        """
+        Sets the hit rates of the caches used by the computer players in the
+        instrumentation gauges
+
+        :return: None
+        """
+
+        self.stats.set_gauge('cache', self.position_cache.hit_rate())
+        for player, worker in self.ai_workers.items():
+            table = getattr(worker.player, 'table', None)
+            if table is not None:  # transposition table of the player
+                self.stats.set_gauge(f'tt{player}', table.hit_rate())
+
+    @staticmethod
+    def _stats_signature() -> int:
+        """
+        Returns the value the displayed overlay depends on: it changes twice
+        per second, so that the statistics are refreshed
+
+        :return: number of half seconds elapsed
+        """
 
+        return int(time.perf_counter() * 2)
+
+    def _display_stats_overlay(self, screen: pygame.Surface) -> None:
+        """
+        Displays the instrumentation statistics over the top-left corner of
+        the screen
+
+        :param screen: pygame surface where the overlay is displayed
         :return: None
         """
 
-        if self.mouse_pos is None:
-            return  # only react against the player's mouse clicks
-        if self._new_game_button_rect.collidepoint(self.mouse_pos):
-            self._reset_game()  # restart the game (board)
-        else:  # a cell has been selected
-            self._process_turn()
-        # return to default value, wait for the next mouse click
-        self.mouse_pos = None
+        screen.fill(self._screen_bg_color, self._stats_rect)
+        y = self._stats_rect.top + 4
+        for line in self.stats.overlay_lines():
+            surface = self._stats_font.render(line, True, self._text_color)
+            screen.blit(surface, (self._stats_rect.left + 4, y))
+            y += self._stats_font.get_linesize()
+        self._drawn_stats = self._stats_signature()
+
+    def _info_signature(self) -> Tuple[int, int]:
+        """
+        Returns the values the displayed game information depends on
+
+        :return: (global winner, player whose icon is displayed, or 0 if the
+            game is a draw)
+        """
+
+        winner = self.board.winner()
+        return winner, 0 if winner == -1 else self._active_player_icon.winner()
 
     def draw(self, screen: pygame.Surface) -> None:
         """
-        Displays the game's elements on the given surface.
+        Displays the game's elements on the given surface. Only the elements
+        that have changed since the last frame are drawn, and only their areas
+        of the screen are updated. If nothing has changed, nothing is done.
+        Every element is pre-rendered, so a frame is a handful of blits.
 
         :param screen: pygame Surface where the game is displayed
         :return: None
         """
 
-        screen.fill(self._screen_bg_color)
-        self.board.draw(screen=screen)
-        self._display_game_information(screen=screen)
-        screen.blit(self._new_game_button, self._new_game_button_rect)
-        pygame.display.update()
+        if self._full_redraw:
+            screen.blit(self._background, (0, 0))
+            self.board.draw(screen=screen)
+            self._display_game_information(screen=screen)
+            self._display_replay_information(screen=screen)
+            if self.stats is not None and self.stats.visible:
+                self._display_stats_overlay(screen=screen)
+            self._drawn_info = self._info_signature()
+            self._drawn_replay = self._replay_signature()
+            self._full_redraw = False
+            pygame.display.update()
+            return
+
+        rects = self.board.draw_dirty(screen=screen)
+        if self._info_signature() != self._drawn_info:
+            self._display_game_information(screen=screen)
+            self._drawn_info = self._info_signature()
+            rects.append(self._info_rect)
+        if self._replay_signature() != self._drawn_replay:
+            screen.fill(self._screen_bg_color, self._replay_rect)
+            self._display_replay_information(screen=screen)
+            self._drawn_replay = self._replay_signature()
+            rects.append(self._replay_rect)
+        if self.stats is not None and self.stats.visible and (
+                self._stats_signature() != self._drawn_stats
+                or self._stats_rect.collidelist(rects) != -1):
+            # the overlay is refreshed or was drawn over by the game
+            self._display_stats_overlay(screen=screen)
+            rects.append(self._stats_rect)
+        if rects:
+            pygame.display.update(rects)
+
+    @staticmethod
+    def _post_event(event_type: int, **attributes) -> None:
+        """
+        Posts a custom event to wake up the main loop. Called from background
+        threads, which may finish after the game is closed
+
+        :param event_type: AI_MOVE_READY, ANNOTATION_READY or SPECTATOR_DATA
+        :param attributes: attributes of the event (e.g. data received)
+        :return: None
+        """
+
+        if pygame.display.get_init():
+            pygame.event.post(pygame.event.Event(event_type, **attributes))
+
+    def _wait_timeout(self) -> Optional[int]:
+        """
+        Returns how long the event-driven loop can sleep waiting for events.
+        Background threads post an event when their results are ready, so
+        the loop only needs a timeout to refresh the instrumentation overlay
+
+        :return: milliseconds (0 to not wait), None to wait for the next event
+        """
+
+        worker = self.ai_workers.get(self.active_player)
+        if (worker is not None and not worker.busy and self.replay is None
+                and not self.board.winner()):
+            return 0  # the computer player has to start thinking
+        if self.stats is not None and self.stats.visible:
+            return 250  # the overlay is refreshed twice per second
+        return None
+
+    def _wait_events(self) -> List[pygame.event.Event]:
+        """
+        Sleeps until an event arrives (or the timeout of _wait_timeout
+        expires) and returns it together with the rest of pending events
+
+        :return: list of events (NOEVENT if the timeout expired)
+        """
+
+        timeout = self._wait_timeout()
+        if timeout == 0:
+            return pygame.event.get()
+        event = pygame.event.wait() if timeout is None \
+            else pygame.event.wait(timeout)
+        return [event] + pygame.event.get()
+
+    def _run_instrumented_frame(self,
+                                events: List[pygame.event.Event]) -> bool:
+        """
+        Runs a frame of the main loop (process_events, run_logic and draw),
+        recording the time spent in every step
+
+        :param events: events to process
+        :return: whether to quit the game
+        """
+
+        start = time.perf_counter()
+        done = self.process_events(events)
+        events_end = time.perf_counter()
+        self.run_logic()
+        logic_end = time.perf_counter()
+        self.draw(screen=self.screen)
+        draw_end = time.perf_counter()
+        self.stats.add_frame(events_end - start, logic_end - events_end,
+                             draw_end - logic_end)
+        self.stats.mark_rendered()
+        return done
 
     def run(self) -> None:
         """
-        Runs the main loop to play the game
+        Runs the main loop to play the game. A frame is run at 60 FPS or, if
+        the loop is event-driven, every time events arrive (the screen is
+        only updated when something has changed)
 
         :return: None
         """
@@ -339,10 +913,33 @@ class GameHandler:
         clock = pygame.time.Clock()
         done = False
         while not done:
-            done = self.process_events()
-            self.run_logic()
-            self.draw(screen=self.screen)
-            clock.tick(60)
+            events = self._wait_events() if self._event_driven \
+                else pygame.event.get()
+            if self.stats is None:
+                done = self.process_events(events)
+                self.run_logic()
+                self.draw(screen=self.screen)
+            else:
+                done = self._run_instrumented_frame(events)
+            if not self._event_driven:
+                clock.tick(60)
+        for worker in self.ai_workers.values():
+            worker.close()
+        if self.spectator is not None:
+            self.spectator.close()
+        if self.replay is not None:
+            self.replay.stop()
+        if self.opening_book is not None:
+            self.opening_book.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.game_store is not None:
+            self.game_store.close()
+        if self._config['position_cache_file'] is not None:
+            self.position_cache.save(self._config['position_cache_file'])
+        if (self.stats is not None
+                and self._config['instrumentation_csv_file'] is not None):
+            self.stats.dump_csv(self._config['instrumentation_csv_file'])
         pygame.quit()
 
 
@@ -0,0 +1,240 @@
+import os
+import struct
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+
+# A record file starts with MAGIC, followed by the games one after another:
+#   header: starting player (1 byte), seed (8 bytes, -1 if unknown)
+#   moves:  one byte per move (local_board * 9 + cell, from 0 to 80)
+#   footer: END_OF_GAME (1 byte), result (1 byte, as in GameState.winner)
+# The number of moves is not stored in the header, so that the moves can be
+# appended while the game is played (a game may last more than 81 moves,
+# since drawn local boards are emptied)
+MAGIC = b'STTR'
+HEADER = struct.Struct('<Bq')
+END_OF_GAME = 0xFF
+
+
+class GameRecord(NamedTuple):
+    """A recorded game, as returned by read_games"""
+    player: int    # player who started the game, 1 or 2
+    seed: int      # seed of the game (-1 if unknown)
+    result: int    # as in GameState.winner (0: the game was not finished)
+    moves: bytes   # one byte per move: local_board * 9 + cell
+
+
+class GameRecordWriter:
+    """
+    GameRecordWriter appends games to a record file. The moves can be
+        written one by one while the game is played (begin_game, add_move,
+        end_game) or a whole game at once (write_game). Writes are buffered:
+        the file is only written when the buffer is full, when a game ends
+        and when the writer is closed. The header of a game begun move by
+        move is written with its first move, so games without moves (e.g.
+        the game is closed right after it starts) are not recorded.
+
+    GameRecordWriter Attributes
+        path      - path of the record file
+        in_game   - whether a game has been begun and not ended yet
+
+    GameRecordWriter Methods
+        begin_game  - begins a new game (its header is written with its
+                      first move)
+        add_move    - writes a move of the current game
+        end_game    - writes the result of the current game
+        write_game  - writes a whole game
+        flush       - writes the buffered data to the file
+        close       - ends the current game (unfinished) and closes the file
+    """
+
+    def __init__(self, path: str, buffer_size: int = 1 << 16) -> None:
+        """
+        Opens a record file for appending (it is created, with its directory,
+        if it doesn't exist)
+
+        :param path: path of the record file
+        :param buffer_size: size in bytes of the write buffer
+        :raise: ValueError if the file exists and is not a record file
+        """
+
+        self.path = path
+        self.in_game = False
+        self._header: Optional[bytes] = None  # of a game without moves yet
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as file:
+                if file.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a game record file")
+        self._file = open(path, 'ab', buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def __enter__(self) -> 'GameRecordWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def begin_game(self, player: int, seed: Optional[int] = None) -> None:
+        """
+        Writes the header of a new game. A game that was not ended is ended
+        as unfinished (result 0).
+
+        :param player: player who starts the game, 1 or 2
+        :param seed: seed of the game (None if unknown)
+        :return: None
+        """
+
+        if self.in_game:
+            self.end_game(0)
+        self._header = HEADER.pack(player, -1 if seed is None else seed)
+        self.in_game = True
+
+    def add_move(self, move: int) -> None:
+        """
+        Writes a move of the current game
+
+        :param move: local_board * 9 + cell
+        :return: None
+        :raise: ValueError if no game has been begun or the move is invalid
+        """
+
+        if not self.in_game:
+            raise ValueError("begin a game before adding moves")
+        if not 0 <= move < 81:
+            raise ValueError(f"invalid move: {move}")
+        if self._header is not None:  # first move of the game
+            self._file.write(self._header)
+            self._header = None
+        self._file.write(bytes((move,)))
+
+    def end_game(self, result: int) -> None:
+        """
+        Writes the result of the current game and flushes the buffer. A game
+        without moves is discarded (nothing was written)
+
+        :param result: as in GameState.winner (0 if the game was not finished)
+        :return: None
+        """
+
+        if not self.in_game:
+            raise ValueError("there is no game to end")
+        self.in_game = False
+        if self._header is not None:
+            self._header = None
+            return
+        self._file.write(struct.pack('<Bb', END_OF_GAME, result))
+        self.flush()
+
+    def write_game(self, player: int, moves: Iterable[int], result: int,
+                   seed: Optional[int] = None) -> None:
+        """
+        Writes a whole game. Unlike end_game, the buffer is not flushed.
+
+        :param player: player who started the game, 1 or 2
+        :param moves: moves of the game (local_board * 9 + cell)
+        :param result: as in GameState.winner (0 if the game was not finished)
+        :param seed: seed of the game (None if unknown)
+        :return: None
+        """
+
+        if self.in_game:
+            self.end_game(0)
+        moves = bytes(moves)
+        if moves and max(moves) >= 81:
+            raise ValueError("invalid move in the game")
+        self._file.write(HEADER.pack(player, -1 if seed is None else seed)
+                         + moves + struct.pack('<Bb', END_OF_GAME, result))
+
+    def flush(self) -> None:
+        """
+        Writes the buffered data to the file
+
+        :return: None
+        """
+
+        self._file.flush()
+
+    def close(self) -> None:
+        """
+        Ends the current game (if any) as unfinished and closes the file
+
+        :return: None
+        """
+
+        if self._file.closed:
+            return
+        if self.in_game:
+            self.end_game(0)
+        self._file.close()
+
+
+def read_games(path: str, chunk_size: int = 1 << 16) -> Iterator[GameRecord]:
+    """
+    Iterates over the games of a record file. The file is read in chunks, so
+    that files with millions of games are never loaded into memory. The last
+    game is ignored if it was being written when the file was read.
+
+    :param path: path of the record file
+    :param chunk_size: number of bytes read at a time
+    :return: generator of GameRecord
+    :raise: ValueError if the file is not a record file
+    """
+
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+        buffer = b''
+        position = 0  # start of the first game of the buffer not read yet
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            buffer = buffer[position:] + chunk
+            position = 0
+            while True:
+                end = buffer.find(END_OF_GAME, position + HEADER.size)
+                if end == -1 or end + 1 >= len(buffer):
+                    break  # the game continues in the next chunk
+                player, seed = HEADER.unpack_from(buffer, position)
+                moves = buffer[position + HEADER.size:end]
+                result = struct.unpack_from('<b', buffer, end + 1)[0]
+                yield GameRecord(player, seed, result, moves)
+                position = end + 2
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+    import time
+    from classes.game_state import (GameState, legal_moves, iter_moves,
+                                    apply_move)
+
+    # 1) record random games, half of them move by move and half at once
+    path = os.path.join(tempfile.mkdtemp(), "games.bin")
+    rng = random.Random(0)
+    games = []
+    with GameRecordWriter(path) as writer:
+        for i in range(20000):
+            state = GameState(player=1 + i % 2)
+            moves = []
+            while not state.winner():
+                move = rng.choice(list(iter_moves(legal_moves(state))))
+                apply_move(state, move)
+                moves.append(move)
+            games.append((1 + i % 2, i, state.winner(), bytes(moves)))
+            if i % 2:
+                writer.write_game(1 + i % 2, moves, state.winner(), seed=i)
+            else:
+                writer.begin_game(1 + i % 2, seed=i)
+                for move in moves:
+                    writer.add_move(move)
+                writer.end_game(state.winner())
+    print(f"{len(games)} games, {os.path.getsize(path)} bytes")
+
+    # 2) stream the file and compare the games
+    start = time.perf_counter()
+    records = list(read_games(path))
+    elapsed = time.perf_counter() - start
+    assert [tuple(record) for record in records] == games
+    print(f"read in {elapsed:.3f}s ({len(records) / elapsed:.0f} games/s)")
@@ -0,0 +1,178 @@
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+from classes.game_state import GameState, apply_move, undo_move
+
+
+class GameReplay:
+    """
+    GameReplay holds the positions of a played game so that any ply can be
+        shown instantly. The moves are played once when the replay is created:
+        a copy of the position is kept every checkpoint_every plies and the
+        undo token of every move is kept, so that seeking never plays more
+        than checkpoint_every / 2 moves (forwards from the previous checkpoint
+        or backwards from the next one), whatever the length of the game.
+        The moves can be annotated with the evaluation of an engine, computed
+        in a background thread.
+
+    GameReplay Attributes
+        moves        - moves of the game, local_board * 9 + cell
+        ply          - number of moves played in the current position
+        state        - current position (do not modify it)
+        annotations  - for every ply, (score for the player taking turn, best
+                       move) given by the engine, None if not computed (yet).
+                       The score is None if the move was forced (not searched)
+
+    GameReplay Methods
+        seek         - moves to the position after the given number of plies
+        forward      - moves one ply forward
+        back         - moves one ply back
+        annotate     - starts evaluating every position in the background
+        stop         - stops the evaluation of the positions
+    """
+
+    def __init__(self,
+                 moves: Sequence[Tuple[int, int]],
+                 player: int = 1,
+                 checkpoint_every: int = 8) -> None:
+        """
+        Inits a GameReplay instance at the initial position (ply 0)
+
+        :param moves: (local_board, cell) moves of the game, in order
+        :param player: player who started the game, 1 or 2
+        :param checkpoint_every: plies between two copies of the position
+        :raise: ValueError if a move is not legal
+        """
+
+        self.moves = [local_board * 9 + cell for local_board, cell in moves]
+        self._checkpoint_every = checkpoint_every
+        self._checkpoints: List[GameState] = []
+        self._tokens: List[Tuple[int, ...]] = []  # undo token of every move
+        state = GameState(player=player)
+        for ply, move in enumerate(self.moves):
+            if ply % checkpoint_every == 0:
+                self._checkpoints.append(state.copy())
+            if not state.is_legal(*divmod(move, 9)):
+                raise ValueError(f"illegal move {divmod(move, 9)} at {ply}")
+            self._tokens.append(apply_move(state, move))
+        if len(self.moves) % checkpoint_every == 0:
+            self._checkpoints.append(state.copy())
+        self._final = state
+
+        self.ply = 0
+        self.state = self._checkpoints[0].copy()
+        self.annotations: List[Optional[Tuple[Optional[int], int]]] = \
+            [None] * (len(self.moves) + 1)
+        self._engine = None
+        self._generation = 0  # incremented when the evaluation is stopped
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def seek(self, ply: int) -> GameState:
+        """
+        Moves to the position after the given number of plies, starting from
+        the closest known position (current one, a checkpoint or the end)
+
+        :param ply: number of moves played, clipped to [0, len(self)]
+        :return: the position (do not modify it)
+        """
+
+        ply = max(0, min(ply, len(self.moves)))
+        k = self._checkpoint_every
+        previous, following = ply // k * k, -(-ply // k) * k
+        # (moves to play or undo, ply of the start, position at the start)
+        starts = [(abs(ply - self.ply), self.ply, self.state),
+                  (ply - previous, previous, self._checkpoints[previous // k]),
+                  (len(self.moves) - ply, len(self.moves), self._final)]
+        if following <= len(self.moves):
+            starts.append((following - ply, following,
+                           self._checkpoints[following // k]))
+        _, start, position = min(starts, key=lambda s: s[0])
+        if position is not self.state:
+            self.state = position.copy()
+            self.ply = start
+        while self.ply < ply:
+            apply_move(self.state, self.moves[self.ply])
+            self.ply += 1
+        while self.ply > ply:
+            self.ply -= 1
+            undo_move(self.state, self._tokens[self.ply])
+        return self.state
+
+    def forward(self) -> GameState:
+        """
+        Moves one ply forward (if the end of the game was not reached)
+
+        :return: the position (do not modify it)
+        """
+
+        return self.seek(self.ply + 1)
+
+    def back(self) -> GameState:
+        """
+        Moves one ply back (if the start of the game was not reached)
+
+        :return: the position (do not modify it)
+        """
+
+        return self.seek(self.ply - 1)
+
+    def annotate(self, engine,
+                 on_annotation: Optional[Callable[[int], None]] = None
+                 ) -> None:
+        """
+        Starts evaluating every position of the game (in order) in a
+        background thread. The results are stored in annotations.
+
+        :param engine: computer player with choose_move(state), stop() and
+            the score and depth attributes of the last search (e.g. an
+            AlphaBetaPlayer)
+        :param on_annotation: function called (from the background thread)
+            with the ply of every annotation stored
+        :return: None
+        """
+
+        self.stop()
+        self._engine = engine
+        thread = threading.Thread(target=self._annotate,
+                                  args=(engine, self._generation,
+                                        on_annotation), daemon=True)
+        thread.start()
+
+    def _annotate(self, engine, generation: int,
+                  on_annotation: Optional[Callable[[int], None]]) -> None:
+        """
+        Body of the background thread: evaluates the positions of the game
+
+        :param engine: computer player that evaluates the positions
+        :param generation: value of _generation when the thread was started
+        :param on_annotation: function called with the ply of every
+            annotation stored (or None)
+        :return: None
+        """
+
+        state = self._checkpoints[0].copy()
+        for ply in range(len(self.moves) + 1):
+            if generation != self._generation:
+                return
+            if not state.winner():
+                move = engine.choose_move(state)
+                if generation != self._generation:
+                    return  # the search was aborted, its result is not valid
+                score = engine.score if engine.depth else None
+                self.annotations[ply] = (score, move)
+                if on_annotation is not None:
+                    on_annotation(ply)
+            if ply < len(self.moves):
+                apply_move(state, self.moves[ply])
+
+    def stop(self) -> None:
+        """
+        Stops the evaluation of the positions (if running)
+
+        :return: None
+        """
+
+        self._generation += 1
+        if self._engine is not None:
+            self._engine.stop()
@@ -0,0 +1,346 @@
+import random
+from typing import Iterator, Optional, Tuple
+
+
+# Each local board is stored in 9 consecutive bits of an 81-bit integer: the
+# bit of a cell is (local_board * 9 + cell). The same 9-bit layout is used to
+# store which local boards have been won in the global (meta) board.
+FULL_BOARD = 0x1FF
+BOARD_MASKS = tuple(FULL_BOARD << (9 * i) for i in range(9))
+# OPEN_CELLS[decided] is the 81-bit mask of the cells that belong to the local
+# boards without a winner, given the 9-bit mask of the decided local boards
+OPEN_CELLS = tuple(
+    sum(BOARD_MASKS[i] for i in range(9) if not decided >> i & 1)
+    for decided in range(FULL_BOARD + 1)
+)
+
+# The 8 winning combinations (rows, columns and diagonals) as 9-bit masks
+WIN_LINES = (
+    0b000000111, 0b000111000, 0b111000000,  # rows
+    0b001001001, 0b010010010, 0b100100100,  # columns
+    0b100010001, 0b001010100                # diagonals
+)
+# LINES_THROUGH_CELL[cell] holds the winning lines that contain the cell, so
+# that only those lines are checked after the cell is marked
+LINES_THROUGH_CELL = tuple(
+    tuple(line for line in WIN_LINES if line >> cell & 1) for cell in range(9)
+)
+# IS_WIN[pattern] is True if the 9-bit pattern contains a winning line
+IS_WIN = tuple(
+    any(pattern & line == line for line in WIN_LINES)
+    for pattern in range(FULL_BOARD + 1)
+)
+
+
+class GameState:
+    """
+    GameState implements the rules of a Super Tic-Tac-Toe game without any
+        dependency on pygame, so that positions can be created, copied and
+        played at a very high rate (simulations, searches, analysis).
+        The GUI classes (SuperTicTacToeBoard, GameHandler) are views over it.
+
+    GameState Attributes
+        cells         - [player1_mask, player2_mask], 81-bit masks of the
+                        cells marked by each player
+        boards        - [player1_mask, player2_mask], 9-bit masks of the local
+                        boards won by each player
+        forced_board  - local board where the next move must be played,
+                        -1 if the active player can choose any local board
+        player        - which player takes turn. one of [1 2]
+
+    Functions legal_moves, iter_moves, apply_move and undo_move provide a
+        fast move generator (moves are encoded as local_board * 9 + cell).
+
+    GameState Methods
+        winner        - winner of the game (same values as in the GUI boards)
+        local_winner  - winner of a given local board
+        owner         - which player (if any) has marked a given cell
+        is_legal      - whether a move can be played in the current turn
+        mark          - marks a cell, applying the local win/draw rules
+        play          - plays a move of the active player and passes the turn
+        copy          - returns an independent copy of the state
+    """
+
+    __slots__ = ('cells', 'boards', 'forced_board', 'player', '_winner')
+
+    def __init__(self, player: int = 1) -> None:
+        """
+        Inits an empty GameState (no cell marked, any local board available)
+
+        :param player: player who starts the game, 1 or 2
+        :raise: ValueError if player not in (1,2)
+        """
+
+        if player not in (1, 2):
+            raise ValueError("wrong value for the starting player")
+        self.cells = [0, 0]
+        self.boards = [0, 0]
+        self.forced_board = -1
+        self.player = player
+        self._winner = 0
+
+    def winner(self) -> int:
+        """
+        Returns the state of the global board
+
+        :return: -1 if the game is a draw, 0 if the game is running,
+            1 if player1 has won, 2 if player2 has won
+        """
+
+        return self._winner
+
+    def local_winner(self, local_board: int) -> int:
+        """
+        Returns the winner of the given local board. A local board can't be
+        a draw: drawn local boards are emptied so they can be played again.
+
+        :param local_board: index of the local board (0 to 8)
+        :return: 0 if nobody has won the local board, 1|2 otherwise
+        """
+
+        bit = 1 << local_board
+        if self.boards[0] & bit:
+            return 1
+        if self.boards[1] & bit:
+            return 2
+        return 0
+
+    def owner(self, local_board: int, cell: int) -> int:
+        """
+        Returns which player has marked the given cell
+
+        :param local_board: index of the local board (0 to 8)
+        :param cell: index of the cell in the local board (0 to 8)
+        :return: 0 if the cell is not filled, 1|2 otherwise
+        """
+
+        bit = 1 << (9 * local_board + cell)
+        if self.cells[0] & bit:
+            return 1
+        if self.cells[1] & bit:
+            return 2
+        return 0
+
+    def is_legal(self, local_board: int, cell: int) -> bool:
+        """
+        Checks whether the active player can mark the given cell: the game is
+        running, the local board is the forced one (if any) and has no winner
+        and the cell is not filled yet.
+
+        :param local_board: index of the local board (0 to 8)
+        :param cell: index of the cell in the local board (0 to 8)
+        :return: True if the move can be played in the current turn
+        """
+
+        if self._winner or not (0 <= local_board < 9 and 0 <= cell < 9):
+            return False
+        if self.forced_board not in (-1, local_board):
+            return False
+        if (self.boards[0] | self.boards[1]) >> local_board & 1:
+            return False
+        return not (self.cells[0] | self.cells[1]) >> (9*local_board+cell) & 1
+
+    def mark(self, player: int, local_board: int, cell: int) -> None:
+        """
+        Marks the given cell with the given player and updates the local and
+        global boards: a local win marks the local board in the global board,
+        and a local draw empties the local board. Turns are not involved.
+
+        :param player: which player is marking the cell, 1 or 2
+        :param local_board: index of the local board (0 to 8)
+        :param cell: index of the cell in the local board (0 to 8)
+        :return: None
+        :raise: ValueError if the player is wrong or the cell is filled
+        """
+
+        if player not in (1, 2):
+            raise ValueError("wrong value for the player marking the cell")
+        shift = 9 * local_board
+        bit = 1 << (shift + cell)
+        if (self.cells[0] | self.cells[1]) & bit:
+            raise ValueError("the cell has already been filled")
+        self._place(player, local_board, cell)
+
+    def _place(self, player: int, local_board: int, cell: int) -> None:
+        """
+        Marks the given (empty) cell without validating the arguments. Applies
+        the local win, local draw and global win rules (see mark method).
+
+        :param player: which player is marking the cell, 1 or 2
+        :param local_board: index of the local board (0 to 8)
+        :param cell: index of the cell in the local board (0 to 8)
+        :return: None
+        """
+
+        shift = 9 * local_board
+        p = player - 1
+        self.cells[p] |= 1 << (shift + cell)
+        if (self.boards[0] | self.boards[1]) >> local_board & 1:
+            return  # the local board is already decided (acts as a big cell)
+        if IS_WIN[self.cells[p] >> shift & FULL_BOARD]:
+            # local win: the local board acts as a (big) cell of the player
+            self.boards[p] |= 1 << local_board
+            if IS_WIN[self.boards[p]]:
+                self._winner = player
+            elif self.boards[0] | self.boards[1] == FULL_BOARD:
+                self._winner = -1  # every local board has a winner
+        elif (self.cells[0] | self.cells[1]) >> shift & FULL_BOARD \
+                == FULL_BOARD:
+            # local draw: empty the local board so it can be played again
+            self.cells[0] &= ~BOARD_MASKS[local_board]
+            self.cells[1] &= ~BOARD_MASKS[local_board]
+
+    def play(self, local_board: int, cell: int) -> None:
+        """
+        The active player marks the given cell. The position of the cell
+        defines the next forced local board (if that board already has a
+        winner, every local board becomes available) and the turn passes to
+        the other player.
+
+        :param local_board: index of the local board (0 to 8)
+        :param cell: index of the cell in the local board (0 to 8)
+        :return: None
+        :raise: ValueError if the move is not legal in the current turn
+        """
+
+        if not self.is_legal(local_board, cell):
+            raise ValueError("illegal move")
+        self._place(self.player, local_board, cell)
+        won = (self.boards[0] | self.boards[1]) >> cell & 1
+        self.forced_board = -1 if won else cell
+        self.player = 3 - self.player
+
+    def copy(self) -> 'GameState':
+        """
+        Returns an independent copy of the state
+
+        :return: a new GameState instance in the same position
+        """
+
+        new = GameState.__new__(GameState)
+        new.cells = self.cells[:]
+        new.boards = self.boards[:]
+        new.forced_board = self.forced_board
+        new.player = self.player
+        new._winner = self._winner
+        return new
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return (self.cells == other.cells and self.boards == other.boards
+                and self.forced_board == other.forced_board
+                and self.player == other.player)
+
+    def __repr__(self) -> str:
+        return (f"GameState(player={self.player}, "
+                f"forced_board={self.forced_board}, winner={self._winner})")
+
+
+def legal_moves(state: GameState) -> int:
+    """
+    Returns the legal moves of the active player as an 81-bit mask. The bit
+    (local_board * 9 + cell) is set if that cell can be marked this turn.
+
+    :param state: position where the moves are generated
+    :return: mask of legal moves, 0 if the game is over
+    """
+
+    if state._winner:
+        return 0
+    if state.forced_board == -1:
+        area = OPEN_CELLS[state.boards[0] | state.boards[1]]
+    else:  # the forced local board never has a winner
+        area = BOARD_MASKS[state.forced_board]
+    return area & ~(state.cells[0] | state.cells[1])
+
+
+def iter_moves(moves: int) -> Iterator[int]:
+    """
+    Iterates over the moves (local_board * 9 + cell) set in a mask of moves
+
+    :param moves: mask of moves, as returned by legal_moves
+    :return: iterator of moves from 0 to 80, in increasing order
+    """
+
+    while moves:
+        low = moves & -moves
+        yield low.bit_length() - 1
+        moves ^= low
+
+
+def apply_move(state: GameState, move: int) -> Tuple[int, ...]:
+    """
+    Plays a move of the active player without validating it (it must be a
+    legal move, see legal_moves). Returns the information needed to undo it.
+
+    :param state: position where the move is played, modified in place
+    :param move: move to play, local_board * 9 + cell
+    :return: token to be passed to undo_move
+    """
+
+    cells, boards = state.cells, state.boards
+    token = (cells[0], cells[1], boards[0], boards[1],
+             state.forced_board, state._winner)
+    local_board, cell = divmod(move, 9)
+    state._place(state.player, local_board, cell)
+    state.forced_board = -1 if (boards[0] | boards[1]) >> cell & 1 else cell
+    state.player = 3 - state.player
+    return token
+
+
+def undo_move(state: GameState, token: Tuple[int, ...]) -> None:
+    """
+    Takes back the last move played with apply_move
+
+    :param state: position where the move was played, modified in place
+    :param token: value returned by apply_move when the move was played
+    :return: None
+    """
+
+    cells, boards = state.cells, state.boards
+    cells[0], cells[1], boards[0], boards[1], \
+        state.forced_board, state._winner = token
+    state.player = 3 - state.player
+
+
+def random_game(state: Optional[GameState] = None,
+                seed: Optional[int] = None) -> GameState:
+    """
+    Plays random moves from the given state (or a new one) until the game ends
+
+    :param state: initial position, it is modified in place
+    :param seed: seed of the random generator
+    :return: the final state of the game
+    """
+
+    rng = random.Random(seed)
+    state = GameState() if state is None else state
+    while not state._winner:
+        apply_move(state, rng.choice(list(iter_moves(legal_moves(state)))))
+    return state
+
+
+if __name__ == "__main__":
+    import time
+
+    # 1) play a short sequence of moves and inspect the state
+    state = GameState(player=1)
+    state.play(4, 4)  # player1 marks the centre; player2 is sent to board 4
+    state.play(4, 0)  # player2 marks the top-left cell; player1 goes to 0
+    print(state, state.owner(4, 4), state.owner(4, 0))
+    # state.play(4, 4)  # ValueError: illegal move (board 0 is forced)
+
+    # 2) generate the legal moves, play one of them and take it back
+    moves = legal_moves(state)
+    print([divmod(move, 9) for move in iter_moves(moves)])  # board 0 cells
+    token = apply_move(state, 3)  # player1 marks the cell 3 of board 0
+    undo_move(state, token)  # back to the previous position
+
+    # 3) measure how fast positions can be created and played
+    start = time.perf_counter()
+    n_games = 200
+    for i in range(n_games):
+        random_game(seed=i)
+    elapsed = time.perf_counter() - start
+    print(f"{n_games} random games in {elapsed:.2f}s")
@@ -0,0 +1,326 @@
+import os
+import queue
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+
+# Number of opening moves stored in their own (indexed) column. Queries by a
+# longer opening use the index for its first OPENING_PLIES moves
+OPENING_PLIES = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id      INTEGER PRIMARY KEY,
+    player  INTEGER NOT NULL,  -- player who started the game, 1 or 2
+    result  INTEGER NOT NULL,  -- as in GameState.winner
+    length  INTEGER NOT NULL,  -- number of moves
+    opening BLOB NOT NULL,     -- first OPENING_PLIES moves
+    seed    INTEGER,           -- seed of the game (NULL if unknown)
+    moves   BLOB NOT NULL      -- one byte per move: local_board * 9 + cell
+);
+CREATE INDEX IF NOT EXISTS games_result ON games (result);
+CREATE INDEX IF NOT EXISTS games_player ON games (player, result);
+CREATE INDEX IF NOT EXISTS games_length ON games (length, result);
+CREATE INDEX IF NOT EXISTS games_opening ON games (opening, player, result);
+"""
+_INSERT = "INSERT INTO games (player, result, length, opening, seed, moves) " \
+          "VALUES (?, ?, ?, ?, ?, ?)"
+_CLOSE = None  # put in the queue to stop the writer thread
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """
+    Opens a connection to a store in WAL mode: readers are never blocked by
+    the writer, and a transaction only waits for the log to be written
+
+    :param path: path of the database file
+    :return: the connection
+    """
+
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class GameStore:
+    """
+    GameStore keeps played games in an SQLite database, for analytics. The
+        games are added from any thread without blocking: they are queued and
+        a writer thread inserts them in batches (one transaction per batch).
+        If an insert fails (e.g. the database stays locked by another
+        process), the store stops writing and add_game, flush and close
+        raise the error.
+        The moves are stored as a blob of one byte per move, and the result,
+        starting player, length and opening of the games are indexed, so that
+        the queries over millions of games only read an index range.
+
+    GameStore Attributes
+        path        - path of the database file
+        batch_size  - maximum number of games inserted per transaction
+        written     - number of games inserted since the store was opened
+
+    GameStore Methods
+        add_game  - queues a game to be inserted
+        flush     - waits until the queued games are inserted
+        close     - inserts the queued games and closes the store
+        count     - number of games matching some filters
+        results   - number of games of every result matching some filters
+        win_rate  - share of the games won by a player
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000) -> None:
+        """
+        Opens a game store (it is created, with its directory, if it doesn't
+        exist) and starts its writer thread
+
+        :param path: path of the database file
+        :param batch_size: maximum number of games inserted per transaction
+        """
+
+        self.path = path
+        self.batch_size = batch_size
+        self.written = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # queries are run with the connection of the thread that opened the
+        # store, inserts with the connection of the writer thread
+        self._reader = _connect(path)
+        self._reader.executescript(_SCHEMA)
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Optional[sqlite3.Error] = None  # of the writer thread
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    def __enter__(self) -> 'GameStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add_game(self, player: int, moves: Iterable[int], result: int,
+                 seed: Optional[int] = None) -> None:
+        """
+        Queues a game to be inserted by the writer thread (it never blocks)
+
+        :param player: player who started the game, 1 or 2
+        :param moves: moves of the game (local_board * 9 + cell)
+        :param result: as in GameState.winner (0 if the game was not finished)
+        :param seed: seed of the game (None if unknown)
+        :return: None
+        :raise: ValueError if a move is invalid or the store is closed
+        :raise: sqlite3.Error if the writer thread failed to insert games
+        """
+
+        if self._closed:
+            raise ValueError("the game store is closed")
+        self._check_writer()
+        moves = bytes(moves)
+        if moves and max(moves) >= 81:
+            raise ValueError("invalid move in the game")
+        self._queue.put((player, result, len(moves), moves[:OPENING_PLIES],
+                         seed, moves))
+
+    def _write(self) -> None:
+        """
+        Body of the writer thread: inserts the queued games, all the games
+        waiting in the queue (up to batch_size) in the same transaction.
+        After an error, the queued games are discarded (the thread keeps
+        running so that flush and close don't wait forever)
+
+        :return: None
+        """
+
+        connection = None
+        try:
+            connection = _connect(self.path)
+        except sqlite3.Error as e:
+            self._error = e
+        done = False
+        while not done:
+            batch = [self._queue.get()]  # wait for the next game
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _CLOSE in batch:
+                done = True
+            games = [game for game in batch if game is not _CLOSE]
+            try:
+                if self._error is None:
+                    with connection:  # one transaction
+                        connection.executemany(_INSERT, games)
+                    self.written += len(games)
+            except sqlite3.Error as e:
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        if connection is not None:
+            connection.close()
+
+    def _check_writer(self) -> None:
+        """
+        Raises the error of the writer thread, if it failed
+
+        :return: None
+        :raise: sqlite3.Error if the writer thread failed to insert games
+        """
+
+        if self._error is not None:
+            raise self._error
+
+    def flush(self) -> None:
+        """
+        Waits until every queued game has been inserted
+
+        :return: None
+        :raise: sqlite3.Error if the writer thread failed to insert games
+        """
+
+        self._queue.join()
+        self._check_writer()
+
+    def close(self) -> None:
+        """
+        Inserts the queued games, stops the writer thread and closes the store
+
+        :return: None
+        :raise: sqlite3.Error if the writer thread failed to insert games
+            (the store is closed anyway)
+        """
+
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._reader.close()
+        self._check_writer()
+
+    @staticmethod
+    def _where(opening: Sequence[int] = (), player: Optional[int] = None,
+               min_length: Optional[int] = None,
+               max_length: Optional[int] = None) -> Tuple[str, list]:
+        """
+        Builds the WHERE clause of a query. An opening is a range of the
+        opening index: the games whose first moves are the given ones
+
+        :param opening: first moves of the games (local_board * 9 + cell)
+        :param player: player who started the games
+        :param min_length: minimum number of moves of the games
+        :param max_length: maximum number of moves of the games
+        :return: (clause, parameters)
+        """
+
+        conditions, parameters = [], []
+        opening = bytes(opening)
+        # with an opening, the unary + keeps the planner from using the other
+        # indexes: the opening range is the most selective one
+        column = '+' if opening else ''
+        if opening:
+            prefix = opening[:OPENING_PLIES]
+            # the blobs are compared byte by byte: the games starting with the
+            # prefix are between the prefix and its successor
+            conditions.append("opening >= ? AND opening < ?")
+            parameters += [prefix, prefix[:-1] + bytes((prefix[-1] + 1,))]
+            if len(opening) > OPENING_PLIES:
+                conditions.append("substr(moves, 1, ?) = ?")
+                parameters += [len(opening), opening]
+        if player is not None:
+            conditions.append(f"{column}player = ?")
+            parameters.append(player)
+        if min_length is not None:
+            conditions.append(f"{column}length >= ?")
+            parameters.append(min_length)
+        if max_length is not None:
+            conditions.append(f"{column}length <= ?")
+            parameters.append(max_length)
+        if not conditions:
+            return "", parameters
+        return " WHERE " + " AND ".join(conditions), parameters
+
+    def count(self, **filters) -> int:
+        """
+        Returns the number of games matching the filters (see results)
+
+        :param filters: opening, player, min_length, max_length
+        :return: number of games
+        """
+
+        return sum(self.results(**filters).values())
+
+    def results(self, opening: Sequence[int] = (),
+                player: Optional[int] = None,
+                min_length: Optional[int] = None,
+                max_length: Optional[int] = None) -> Dict[int, int]:
+        """
+        Counts the games of every result matching the filters. The games
+        still queued are not counted (see flush)
+
+        :param opening: first moves of the games (local_board * 9 + cell)
+        :param player: player who started the games
+        :param min_length: minimum number of moves of the games
+        :param max_length: maximum number of moves of the games
+        :return: {result: number of games}, results as in GameState.winner
+        """
+
+        where, parameters = self._where(opening, player, min_length,
+                                        max_length)
+        rows = self._reader.execute(
+            f"SELECT result, COUNT(*) FROM games{where} GROUP BY result",
+            parameters)
+        return dict(rows.fetchall())
+
+    def win_rate(self, winner: int, **filters) -> float:
+        """
+        Returns the share of the games matching the filters won by a player
+
+        :param winner: player, 1 or 2
+        :param filters: opening, player, min_length, max_length (see results)
+        :return: games won / games (0 if no game matches the filters)
+        """
+
+        results = self.results(**filters)
+        games = sum(results.values())
+        return results.get(winner, 0) / games if games else 0.0
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from classes.game_state import (GameState, legal_moves, iter_moves,
+                                    apply_move)
+    import random
+
+    # 1) store random games without waiting for the inserts
+    path = os.path.join(tempfile.mkdtemp(), "games.db")
+    rng = random.Random(0)
+    store = GameStore(path)
+    start = time.perf_counter()
+    blocked = 0.0
+    for i in range(20000):
+        state = GameState(player=1 + i % 2)
+        moves = []
+        while not state.winner():
+            moves.append(rng.choice(list(iter_moves(legal_moves(state)))))
+            apply_move(state, moves[-1])
+        add_start = time.perf_counter()
+        store.add_game(1 + i % 2, moves, state.winner(), seed=i)
+        blocked += time.perf_counter() - add_start
+    store.flush()
+    print(f"{store.written} games stored in "
+          f"{time.perf_counter() - start:.2f}s, add_game took "
+          f"{blocked / 20000 * 1e6:.1f} us per game")
+
+    # 2) win rate of player 1 after the opening 4/4 (the center cell)
+    start = time.perf_counter()
+    rate = store.win_rate(1, opening=[4 * 9 + 4], player=1)
+    elapsed = time.perf_counter() - start
+    print(f"{store.count(opening=[40], player=1)} games started with 4/4, "
+          f"player 1 won {rate:.1%} (query in {elapsed * 1e3:.2f} ms)")
+    print(f"results of the games longer than 60 moves: "
+          f"{store.results(min_length=61)}")
+    store.close()
@@ -0,0 +1,63 @@
+import random
+from typing import Optional
+from classes.alpha_beta_player import AlphaBetaPlayer, WIN_SCORE
+from classes.game_state import (GameState, legal_moves, iter_moves, apply_move,
+                                undo_move)
+
+
+class GreedyPlayer:
+    """
+    GreedyPlayer implements a computer player that looks one move ahead: it
+        plays the move leading to the position with the best static score
+        (AlphaBetaPlayer.evaluate). Ties are broken at random.
+
+    GreedyPlayer Methods
+        choose_move  - returns the move to play (local_board * 9 + cell)
+        stop         - nothing to abort, the move is chosen instantly
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        """
+        Inits a GreedyPlayer instance
+
+        :param seed: seed of the random generator (None: not reproducible)
+        """
+
+        self._rng = random.Random(seed)
+
+    def stop(self) -> None:
+        """
+        Nothing to abort (the move is chosen instantly)
+
+        :return: None
+        """
+
+    def choose_move(self, state: GameState) -> int:
+        """
+        Returns the move with the best score after one ply
+
+        :param state: position where the player takes turn (not modified)
+        :return: move to play, local_board * 9 + cell
+        :raise: ValueError if the game is over
+        """
+
+        moves = list(iter_moves(legal_moves(state)))
+        if not moves:
+            raise ValueError("there are no legal moves in this position")
+        state = state.copy()
+        best_score, best_moves = None, []
+        for move in moves:
+            token = apply_move(state, move)
+            winner = state.winner()
+            if winner > 0:  # the player taking turn wins the game
+                score = WIN_SCORE
+            elif winner == -1:
+                score = 0
+            else:  # the score is given for the opponent, who takes turn now
+                score = -AlphaBetaPlayer.evaluate(state)
+            undo_move(state, token)
+            if best_score is None or score > best_score:
+                best_score, best_moves = score, [move]
+            elif score == best_score:
+                best_moves.append(move)
+        return self._rng.choice(best_moves)
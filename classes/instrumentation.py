@@ -0,0 +1,233 @@
+import csv
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+# Timed series of the main loop, in seconds
+FRAME_SECTIONS = ('process_events', 'run_logic', 'draw')
+SERIES = FRAME_SECTIONS + ('frame', 'turn_latency', 'ai_think')
+
+
+class Instrumentation:
+    """
+    Instrumentation keeps rolling statistics about where the time of the main
+        loop goes: the duration of every frame split into its sections
+        (process_events, run_logic and draw), the latency of the human turns
+        (from the processing of the click to the end of the frame where the
+        move is displayed), the think time of the computer players and
+        any gauge set by the game (e.g. cache hit rates). Only the last
+        samples of every series are kept.
+
+    Instrumentation Attributes
+        window   - number of samples kept per series
+        visible  - whether the overlay is displayed
+        gauges   - {name: value} last values set with set_gauge
+        frames   - total number of frames recorded
+
+    Instrumentation Methods
+        add_frame      - records the duration of the sections of a frame
+        add_sample     - records a sample of any series
+        mark_click     - starts measuring the latency of a turn
+        mark_turn      - the clicked turn has been played
+        mark_rendered  - the frame has been displayed (ends a turn latency)
+        set_gauge      - sets the value of a gauge
+        summary        - statistics of every series
+        fps            - frames per second over the window
+        overlay_lines  - summary as short lines of text
+        dump_csv       - writes every sample kept to a csv file
+    """
+
+    def __init__(self, window: int = 600) -> None:
+        """
+        Inits an Instrumentation instance without samples (overlay hidden)
+
+        :param window: number of samples kept per series
+        :raise: ValueError if window < 1
+        """
+
+        if window < 1:
+            raise ValueError("the window needs at least 1 sample")
+        self.window = window
+        self.visible = False
+        self.gauges: Dict[str, float] = {}
+        self.frames = 0
+        self._samples: Dict[str, Deque[float]] = {
+            name: deque(maxlen=window) for name in SERIES
+        }
+        self._frame_ends: Deque[float] = deque(maxlen=window)
+        self._click_time: Optional[float] = None
+        self._turn_time: Optional[float] = None  # click of a played turn
+
+    def add_frame(self, *durations: float) -> None:
+        """
+        Records the duration of the sections of a frame
+
+        :param durations: seconds spent in process_events, run_logic, draw
+        :return: None
+        """
+
+        for name, duration in zip(FRAME_SECTIONS, durations):
+            self._samples[name].append(duration)
+        self._samples['frame'].append(sum(durations))
+        self._frame_ends.append(time.perf_counter())
+        self.frames += 1
+
+    def add_sample(self, series: str, value: float) -> None:
+        """
+        Records a sample of a series
+
+        :param series: one of SERIES
+        :param value: duration in seconds
+        :return: None
+        """
+
+        self._samples[series].append(value)
+
+    def mark_click(self) -> None:
+        """
+        A mouse click is being processed: if it plays a turn, its latency is
+        measured from now
+
+        :return: None
+        """
+
+        self._click_time = time.perf_counter()
+
+    def mark_turn(self) -> None:
+        """
+        A turn has been played. If it was played by a click, its latency is
+        recorded when the frame is displayed (mark_rendered)
+
+        :return: None
+        """
+
+        self._turn_time, self._click_time = self._click_time, None
+
+    def mark_rendered(self) -> None:
+        """
+        The frame has been displayed: ends the latency of the turn played in
+        the frame (if any)
+
+        :return: None
+        """
+
+        if self._turn_time is not None:
+            self.add_sample('turn_latency',
+                            time.perf_counter() - self._turn_time)
+            self._turn_time = None
+        self._click_time = None  # the click did not play a turn
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """
+        Sets the value of a gauge (e.g. a hit rate)
+
+        :param name: name of the gauge
+        :param value: current value
+        :return: None
+        """
+
+        self.gauges[name] = value
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the statistics of the samples kept of every series
+
+        :return: {series: {'count', 'mean', 'p95', 'max'}}, in seconds.
+            The statistics of a series without samples are 0
+        """
+
+        stats = {}
+        for name, samples in self._samples.items():
+            values = sorted(samples)
+            if not values:
+                stats[name] = {'count': 0, 'mean': 0.0, 'p95': 0.0,
+                               'max': 0.0}
+                continue
+            stats[name] = {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'p95': values[math.ceil(0.95 * len(values)) - 1],
+                'max': values[-1]
+            }
+        return stats
+
+    def fps(self) -> float:
+        """
+        Returns the number of frames per second over the window (it includes
+        the time spent waiting for the next frame)
+
+        :return: frames per second (0 if less than 2 frames were recorded)
+        """
+
+        if len(self._frame_ends) < 2:
+            return 0.0
+        elapsed = self._frame_ends[-1] - self._frame_ends[0]
+        return (len(self._frame_ends) - 1) / elapsed if elapsed else 0.0
+
+    def overlay_lines(self) -> List[str]:
+        """
+        Returns the summary as short lines of text, in milliseconds
+
+        :return: list of lines
+        """
+
+        stats = self.summary()
+        ms = {name: {key: value * 1e3 for key, value in values.items()}
+              for name, values in stats.items()}
+        frame = ms['frame']
+        lines = [f"fps {self.fps():.1f}  frame {frame['mean']:.2f} ms "
+                 f"(p95 {frame['p95']:.2f}, max {frame['max']:.1f})"]
+        lines.append("p95 " + "  ".join(
+            f"{name} {ms[name]['p95']:.2f}" for name in FRAME_SECTIONS))
+        for name in ('turn_latency', 'ai_think'):
+            if stats[name]['count']:
+                lines.append(f"{name} {ms[name]['mean']:.1f} ms "
+                             f"(p95 {ms[name]['p95']:.1f}, "
+                             f"n={stats[name]['count']})")
+        if self.gauges:
+            lines.append("  ".join(f"{name} {value:.0%}"
+                                   for name, value in self.gauges.items()))
+        return lines
+
+    def dump_csv(self, path: str) -> None:
+        """
+        Writes every sample kept to a csv file, one row per sample:
+        series, index of the sample (0 is the oldest one), milliseconds
+
+        :param path: path of the csv file
+        :return: None
+        """
+
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(('series', 'index', 'milliseconds'))
+            for name, samples in self._samples.items():
+                for i, value in enumerate(samples):
+                    writer.writerow((name, i, f"{value * 1e3:.4f}"))
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+
+    # 1) record some frames and a turn played by a click
+    stats = Instrumentation(window=100)
+    rng = random.Random(0)
+    for frame in range(150):
+        if frame == 10:
+            stats.mark_click()
+            stats.mark_turn()
+        stats.add_frame(*(rng.random() * 1e-3 for _ in FRAME_SECTIONS))
+        stats.mark_rendered()
+    stats.add_sample('ai_think', 0.8)
+    stats.set_gauge('position cache', 0.25)
+
+    # 2) print the overlay and dump the samples
+    print("\n".join(stats.overlay_lines()))
+    path = os.path.join(tempfile.mkdtemp(), "samples.csv")
+    stats.dump_csv(path)
+    with open(path) as csv_file:
+        print(f"{sum(1 for _ in csv_file) - 1} samples written to {path}")
@@ -0,0 +1,221 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from classes.endgame_solver import EndgameSolver, empty_cells
+from classes.game_state import GameState, legal_moves, iter_moves
+from classes.mcts_tree import MCTSTree
+
+
+def _root_search(state: GameState,
+                 time_budget: float,
+                 max_playouts: Optional[int],
+                 max_nodes: int,
+                 exploration: float,
+                 seed: int) -> Tuple[Dict[int, Tuple[int, float]], int]:
+    """
+    Runs an independent search in a worker process (root parallelisation)
+
+    :param state: position at the root of the search
+    :param time_budget: seconds available for the search
+    :param max_playouts: maximum number of playouts (None: no limit)
+    :param max_nodes: maximum number of nodes of the tree
+    :param exploration: exploration constant of the UCT formula
+    :param seed: seed of the random generator of the playouts
+    :return: statistics of the moves of the root and number of playouts
+    """
+
+    tree = MCTSTree(state, max_nodes=max_nodes, exploration=exploration,
+                    seed=seed)
+    playouts = tree.search(time.perf_counter() + time_budget, max_playouts)
+    return tree.root_stats(), playouts
+
+
+class MCTSPlayer:
+    """
+    MCTSPlayer implements a computer player that chooses its moves with a
+        Monte Carlo Tree Search (UCT). The player keeps its tree between
+        consecutive moves (tree reuse). If workers > 0, independent searches
+        are run in a pool of processes at the same time and their statistics
+        of the root moves are merged (root parallelisation). Once few cells
+        are left to play, the position is first given to an EndgameSolver,
+        which plays perfectly if it proves the value of the position within
+        half the time budget and endgame_max_nodes positions.
+
+    MCTSPlayer Attributes
+        time_budget          - seconds available to choose a move
+        max_playouts         - maximum playouts per move and process (or None)
+        workers              - number of extra processes running searches
+        max_nodes            - maximum number of nodes of the tree
+        exploration          - exploration constant of the UCT formula
+        endgame_threshold    - the solver is used when at most this number of
+                               cells are empty (0: never)
+        endgame_max_nodes    - maximum positions visited by the solver per move
+        playouts             - playouts run (all processes) for the last move
+        playouts_per_second  - playout rate (all processes) for the last move
+        tree_size            - number of nodes of the tree of this process
+
+    MCTSPlayer Methods
+        choose_move  - returns the move to play (local_board * 9 + cell)
+        stop         - aborts the running search as soon as possible
+        close        - shuts down the pool of processes
+    """
+
+    def __init__(self,
+                 time_budget: float = 1.0,
+                 max_playouts: Optional[int] = None,
+                 workers: int = 0,
+                 max_nodes: int = 1 << 18,
+                 exploration: float = 1.4,
+                 seed: Optional[int] = None,
+                 endgame_threshold: int = 0,
+                 endgame_max_nodes: int = 1 << 19) -> None:
+        """
+        Inits an MCTSPlayer instance. The pool of processes is created the
+        first time a move is chosen.
+
+        :param time_budget: seconds available to choose a move
+        :param max_playouts: maximum playouts per move and process
+        :param workers: number of extra processes (0: single process)
+        :param max_nodes: maximum number of nodes of the tree
+        :param exploration: exploration constant of the UCT formula
+        :param seed: seed of the random generators (None: not reproducible)
+        :param endgame_threshold: maximum number of empty cells of the
+            positions given to the endgame solver (0: the solver is not used)
+        :param endgame_max_nodes: maximum number of positions visited by the
+            solver per move
+        """
+
+        self.time_budget = time_budget
+        self.max_playouts = max_playouts
+        self.workers = workers
+        self.max_nodes = max_nodes
+        self.exploration = exploration
+        self.endgame_threshold = endgame_threshold
+        self.endgame_max_nodes = endgame_max_nodes
+        self.solver = EndgameSolver() if endgame_threshold > 0 else None
+        self.playouts = 0
+        self.playouts_per_second = 0.0
+        self.tree_size = 0
+        self._rng = random.Random(seed)
+        self._tree: Optional[MCTSTree] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._stop = False
+
+    def stop(self) -> None:
+        """
+        Aborts the running search. choose_move returns the best move of the
+        tree of this process (the results of the other processes are ignored)
+
+        :return: None
+        """
+
+        self._stop = True
+        if self.solver is not None:
+            self.solver.stop()
+
+    def close(self) -> None:
+        """
+        Shuts down the pool of processes (if any)
+
+        :return: None
+        """
+
+        self._stop = True
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def choose_move(self, state: GameState) -> int:
+        """
+        Searches the given position and returns the most visited root move
+
+        :param state: position where the player takes turn (not modified)
+        :return: move to play, local_board * 9 + cell
+        :raise: ValueError if the game is over
+        """
+
+        moves = list(iter_moves(legal_moves(state)))
+        if not moves:
+            raise ValueError("there are no legal moves in this position")
+        self._stop = False
+        start = time.perf_counter()
+
+        if (self.solver is not None
+                and empty_cells(state) <= self.endgame_threshold):
+            result = self.solver.solve(state, self.time_budget / 2,
+                                       self.endgame_max_nodes)
+            if result is not None or self._stop:
+                self.playouts, self.playouts_per_second = 0, 0.0
+                return moves[0] if result is None else result[1]
+
+        # reuse the subtree of the position (if it was explored last turn)
+        if self._tree is None:
+            self._tree = MCTSTree(state, max_nodes=self.max_nodes,
+                                  exploration=self.exploration,
+                                  seed=self._rng.getrandbits(32))
+        else:
+            self._tree.advance(state)
+
+        futures = []
+        if self.workers > 0:
+            if self._pool is None:
+                # spawn: the game may be running threads (pygame, AIWorker)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            try:
+                futures = [
+                    self._pool.submit(_root_search, state, self.time_budget,
+                                      self.max_playouts, self.max_nodes,
+                                      self.exploration,
+                                      self._rng.getrandbits(32))
+                    for _ in range(self.workers)
+                ]
+            except RuntimeError:  # the pool was shut down by close()
+                futures = []
+
+        playouts = self._tree.search(start + self.time_budget,
+                                     self.max_playouts, lambda: self._stop)
+        stats = dict(self._tree.root_stats())
+        for future in futures:
+            if self._stop:
+                future.cancel()
+                continue
+            worker_stats, worker_playouts = future.result()
+            playouts += worker_playouts
+            for move, (visits, wins) in worker_stats.items():
+                v, w = stats.get(move, (0, 0.0))
+                stats[move] = (v + visits, w + wins)
+
+        elapsed = time.perf_counter() - start
+        self.playouts = playouts
+        self.playouts_per_second = playouts / elapsed if elapsed else 0.0
+        self.tree_size = len(self._tree)
+        if not stats:
+            return moves[0]
+        return max(stats, key=lambda m: stats[m][0])
+
+
+if __name__ == "__main__":
+    # 1) create a position and let the computer player choose a move
+    state = GameState(player=1)
+    state.play(4, 4)
+    state.play(4, 0)
+    player = MCTSPlayer(time_budget=1.0, workers=2)
+    move = player.choose_move(state)
+    print(f"best move: local board {move // 9}, cell {move % 9} "
+          f"({player.playouts} playouts, "
+          f"{player.playouts_per_second:.0f} playouts/s, "
+          f"tree size {player.tree_size})")
+    player.close()
+
+    # 2) let two computer players play a whole game (single process)
+    state = GameState(player=1)
+    players = {1: MCTSPlayer(time_budget=0.1, seed=1),
+               2: MCTSPlayer(time_budget=0.1, seed=2)}
+    while not state.winner():
+        state.play(*divmod(players[state.player].choose_move(state), 9))
+    print("result:", state.winner())
@@ -0,0 +1,262 @@
+import math
+import random
+import time
+from array import array
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+from classes.game_state import GameState, legal_moves, iter_moves, apply_move
+
+
+class MCTSTree:
+    """
+    MCTSTree implements a Monte Carlo search tree (UCT) over a GameState. To
+        keep memory bounded, nodes are not Python objects: the tree is stored
+        in flat arrays (node arena) indexed by the node id. The children of a
+        node are allocated contiguously when it is expanded, so a node only
+        needs the id of its first child and the number of children.
+
+    MCTSTree Attributes
+        root_state  - position at the root of the tree
+        max_nodes   - maximum number of nodes of the tree (no expansion beyond)
+        exploration - exploration constant of the UCT formula
+        playouts    - number of playouts run since the tree was created
+
+    MCTSTree Methods
+        search      - runs playouts until a deadline or a number of playouts
+        root_stats  - visits and wins of the moves of the root
+        best_move   - most visited move of the root
+        advance     - moves the root to a descendant position (tree reuse)
+    """
+
+    def __init__(self,
+                 state: GameState,
+                 max_nodes: int = 1 << 18,
+                 exploration: float = 1.4,
+                 seed: Optional[int] = None) -> None:
+        """
+        Inits an MCTSTree with a single (root) node
+
+        :param state: position at the root of the tree (it is copied)
+        :param max_nodes: maximum number of nodes of the tree
+        :param exploration: exploration constant of the UCT formula
+        :param seed: seed of the random generator of the playouts
+        """
+
+        self.max_nodes = max_nodes
+        self.exploration = exploration
+        self.playouts = 0
+        self._rng = random.Random(seed)
+        self._reset(state)
+
+    def _reset(self, state: GameState) -> None:
+        """
+        Empties the tree and sets a new root position
+
+        :param state: position at the root of the tree (it is copied)
+        :return: None
+        """
+
+        self.root_state = state.copy()
+        self._parent = array('l', [-1])
+        self._first_child = array('l', [0])
+        self._num_children = array('b', [0])
+        self._move = array('b', [-1])
+        # player who played the move leading to the node
+        self._mover = array('b', [3 - state.player])
+        self._visits = array('l', [0])
+        # wins of the mover of the node (a draw counts as half a win)
+        self._wins = array('d', [0.0])
+
+    def __len__(self) -> int:
+        return len(self._parent)
+
+    def search(self,
+               deadline: float,
+               max_playouts: Optional[int] = None,
+               stop: Optional[Callable[[], bool]] = None) -> int:
+        """
+        Runs playouts until the deadline, the number of playouts or the stop
+        callback is reached
+
+        :param deadline: time.perf_counter() value when the search ends
+        :param max_playouts: maximum number of playouts (None: no limit)
+        :param stop: function returning True when the search has to be aborted
+        :return: number of playouts run
+        """
+
+        n = 0
+        while max_playouts is None or n < max_playouts:
+            if time.perf_counter() >= deadline or (stop and stop()):
+                break
+            self._playout()
+            n += 1
+        self.playouts += n
+        return n
+
+    def _playout(self) -> None:
+        """
+        Runs one iteration of the search: selection, expansion, random
+        playout (rollout) and backpropagation of the result
+
+        :return: None
+        """
+
+        state = self.root_state.copy()
+        num_children, first_child = self._num_children, self._first_child
+        move, visits = self._move, self._visits
+
+        # 1) selection: follow the UCT policy until a leaf is reached
+        node = 0
+        while num_children[node]:
+            node = self._select(node)
+            apply_move(state, move[node])
+
+        # 2) expansion: a leaf is expanded the second time it is visited
+        if not state.winner() and (visits[node] or node == 0):
+            moves = list(iter_moves(legal_moves(state)))
+            if len(self._parent) + len(moves) <= self.max_nodes:
+                self._rng.shuffle(moves)  # visit the children in random order
+                first_child[node] = len(self._parent)
+                num_children[node] = len(moves)
+                for m in moves:
+                    self._parent.append(node)
+                    self._first_child.append(0)
+                    self._num_children.append(0)
+                    self._move.append(m)
+                    self._mover.append(state.player)
+                    self._visits.append(0)
+                    self._wins.append(0.0)
+                node = first_child[node]
+                apply_move(state, move[node])
+
+        # 3) rollout: play random moves until the game ends
+        rng = self._rng
+        while not state.winner():
+            apply_move(state, rng.choice(list(iter_moves(legal_moves(state)))))
+        winner = state.winner()
+
+        # 4) backpropagation: update the statistics of the visited nodes
+        parent, mover, wins = self._parent, self._mover, self._wins
+        draw = winner == -1
+        while node != -1:
+            visits[node] += 1
+            if draw:
+                wins[node] += 0.5
+            elif mover[node] == winner:
+                wins[node] += 1.0
+            node = parent[node]
+
+    def _select(self, node: int) -> int:
+        """
+        Chooses the child of the given node with the highest UCT value. Not
+        visited children are chosen first.
+
+        :param node: id of an expanded node
+        :return: id of the selected child
+        """
+
+        visits, wins = self._visits, self._wins
+        first = self._first_child[node]
+        c_log_n = self.exploration * self.exploration * \
+            math.log(visits[node] or 1)
+        best, best_value = first, -1.0
+        for child in range(first, first + self._num_children[node]):
+            v = visits[child]
+            if not v:
+                return child
+            value = wins[child] / v + math.sqrt(c_log_n / v)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def root_stats(self) -> Dict[int, Tuple[int, float]]:
+        """
+        Returns the statistics of the moves of the root
+
+        :return: {move: (visits, wins of the player taking turn at the root)}
+        """
+
+        first = self._first_child[0]
+        return {
+            self._move[child]: (self._visits[child], self._wins[child])
+            for child in range(first, first + self._num_children[0])
+        }
+
+    def best_move(self) -> int:
+        """
+        Returns the most visited move of the root
+
+        :return: move (local_board * 9 + cell), -1 if the root is not expanded
+        """
+
+        stats = self.root_stats()
+        if not stats:
+            return -1
+        return max(stats, key=lambda m: stats[m][0])
+
+    def advance(self, state: GameState) -> bool:
+        """
+        Reuses the tree for a new position: if the position is one of the
+        first two levels of the tree (the move chosen at the root and the
+        reply of the opponent), that subtree becomes the new tree. Otherwise
+        the tree is emptied.
+
+        :param state: new position at the root of the tree
+        :return: True if a subtree was reused
+        """
+
+        if state == self.root_state:
+            return True
+        candidates = deque([(0, self.root_state, 0)])
+        while candidates:
+            node, node_state, depth = candidates.popleft()
+            first = self._first_child[node]
+            for child in range(first, first + self._num_children[node]):
+                child_state = node_state.copy()
+                apply_move(child_state, self._move[child])
+                if child_state == state:
+                    self._compact(child, state)
+                    return True
+                if depth == 0:
+                    candidates.append((child, child_state, 1))
+        self._reset(state)
+        return False
+
+    def _compact(self, node: int, state: GameState) -> None:
+        """
+        Copies the subtree of the given node into new arrays, so that the
+        nodes that are no longer reachable are released
+
+        :param node: id of the new root
+        :param state: position of the new root
+        :return: None
+        """
+
+        old_first, old_num = self._first_child, self._num_children
+        old_move, old_mover = self._move, self._mover
+        old_visits, old_wins = self._visits, self._wins
+        self._parent = array('l', [-1])
+        self._first_child = array('l', [0])
+        self._num_children = array('b', [old_num[node]])
+        self._move = array('b', [old_move[node]])
+        self._mover = array('b', [old_mover[node]])
+        self._visits = array('l', [old_visits[node]])
+        self._wins = array('d', [old_wins[node]])
+        self.root_state = state.copy()
+
+        queue = deque([(node, 0)])  # (old id, new id)
+        while queue:
+            old, new = queue.popleft()
+            first = old_first[old]
+            if not old_num[old]:
+                continue
+            self._first_child[new] = len(self._parent)
+            for child in range(first, first + old_num[old]):
+                queue.append((child, len(self._parent)))
+                self._parent.append(new)
+                self._first_child.append(0)
+                self._num_children.append(old_num[child])
+                self._move.append(old_move[child])
+                self._mover.append(old_mover[child])
+                self._visits.append(old_visits[child])
+                self._wins.append(old_wins[child])
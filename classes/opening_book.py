@@ -0,0 +1,120 @@
+import mmap
+import struct
+from typing import Iterable, Optional, Tuple
+from classes.game_state import GameState
+from classes.zobrist import canonical_hash, transform_move, INVERSE
+
+
+# Record of a book entry: canonical hash, best move (for the canonical image
+# of the position), score (for the player taking turn), visit count
+RECORD = struct.Struct('<QbiI')
+
+
+def write_book(path: str,
+               entries: Iterable[Tuple[int, int, int, int]]) -> int:
+    """
+    Writes an opening book: fixed-size records sorted by hash, so that the
+    reader can binary-search the file without parsing it
+
+    :param path: path of the book file
+    :param entries: (canonical hash, canonical move, score, visits). If a
+        hash is repeated, the entry with more visits is kept
+    :return: number of records written
+    """
+
+    book = {}
+    for key, move, score, visits in entries:
+        if key not in book or book[key][2] < visits:
+            book[key] = (move, score, visits)
+    with open(path, 'wb') as file:
+        for key in sorted(book):
+            file.write(RECORD.pack(key, *book[key]))
+    return len(book)
+
+
+class OpeningBook:
+    """
+    OpeningBook reads an opening book written by write_book (see the
+        build_opening_book.py script). The file is memory-mapped and
+        binary-searched: opening it costs no parsing and a lookup only reads
+        the records it compares. Positions are identified by their canonical
+        hash, so a position and its 7 symmetric images share one record.
+
+    OpeningBook Attributes
+        path     - path of the book file
+
+    OpeningBook Methods
+        lookup   - returns the book move of a position (if any)
+        close    - releases the memory map
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens an opening book
+
+        :param path: path of the book file
+        :raise: ValueError if the size of the file is not a whole number of
+            records
+        """
+
+        self.path = path
+        with open(path, 'rb') as file:
+            # an empty file can't be memory-mapped: it is an empty book
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) \
+                if file.seek(0, 2) else b''
+        if len(self._map) % RECORD.size:
+            raise ValueError(f"{path} is not an opening book")
+        self._size = len(self._map) // RECORD.size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _find(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Binary-searches the record of a hash
+
+        :param key: canonical hash of the position
+        :return: the record (hash, move, score, visits) or None
+        """
+
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            record = RECORD.unpack_from(self._map, middle * RECORD.size)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                return record
+        return None
+
+    def lookup(self, state: GameState) -> Optional[Tuple[int, int, int]]:
+        """
+        Returns the book move of the given position
+
+        :param state: position where the player takes turn
+        :return: (move, score, visits), the move given for the position
+            (local_board * 9 + cell), or None if the position is not in the
+            book
+        """
+
+        if not self._size:
+            return None
+        key, symmetry = canonical_hash(state)
+        record = self._find(key)
+        if record is None:
+            return None
+        _, move, score, visits = record
+        return transform_move(move, INVERSE[symmetry]), score, visits
+
+    def close(self) -> None:
+        """
+        Releases the memory map of the file
+
+        :return: None
+        """
+
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._size = 0
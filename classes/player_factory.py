@@ -0,0 +1,56 @@
+from typing import Optional
+from classes.alpha_beta_player import AlphaBetaPlayer
+from classes.greedy_player import GreedyPlayer
+from classes.mcts_player import MCTSPlayer
+from classes.position_cache import PositionCache
+from classes.random_player import RandomPlayer
+
+
+# Values of the "player1_type" and "player2_type" keys of the config file
+PLAYER_TYPES = ('human', 'random', 'greedy', 'alpha_beta', 'mcts')
+
+
+def create_player(player_type: str,
+                  config: dict,
+                  seed: Optional[int] = None,
+                  cache: Optional[PositionCache] = None) -> Optional[object]:
+    """
+    Creates the computer player of the given type, configured from the
+    parameters of the configuration file
+
+    :param player_type: one of PLAYER_TYPES
+    :param config: content of the configuration file
+    :param seed: seed of the random generators of the player (if it has any)
+    :param cache: cache of evaluated positions shared by the players that
+        search (alpha_beta)
+    :return: a computer player, or None if the player is a human
+    :raise: ValueError if the player type is unknown
+    """
+
+    if player_type == 'human':
+        return None
+    if player_type == 'random':
+        return RandomPlayer(seed=seed)
+    if player_type == 'greedy':
+        return GreedyPlayer(seed=seed)
+    if player_type == 'alpha_beta':
+        return AlphaBetaPlayer(
+            time_budget=config['ai_time_budget'],
+            max_depth=config['ai_max_depth'],
+            table_size=config['ai_transposition_table_size'],
+            cache=cache,
+            cache_depth=config['ai_cache_depth'],
+            endgame_threshold=config['ai_endgame_threshold'],
+            endgame_max_nodes=config['ai_endgame_max_nodes']
+        )
+    if player_type == 'mcts':
+        return MCTSPlayer(
+            time_budget=config['ai_time_budget'],
+            max_playouts=config['mcts_max_playouts'],
+            workers=config['mcts_workers'],
+            max_nodes=config['mcts_max_nodes'],
+            seed=seed,
+            endgame_threshold=config['ai_endgame_threshold'],
+            endgame_max_nodes=config['ai_endgame_max_nodes']
+        )
+    raise ValueError(f"unknown player type: {player_type}")
@@ -0,0 +1,172 @@
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
+
+
+class PositionCache:
+    """
+    PositionCache stores the results of evaluated positions, indexed by their
+        canonical Zobrist hash (see zobrist.canonical_hash), so that a
+        position and its symmetric images share the same entry. Unlike the
+        TranspositionTable, which belongs to one player and is aged every
+        move, the cache is meant to be shared by several players and kept
+        across games: it can be saved to a file and loaded in later runs.
+        The cache has a bounded size: the least recently used entries are
+        evicted first. It is safe to use from several threads.
+
+    PositionCache Attributes
+        capacity  - maximum number of entries
+        hits      - number of lookups that found the position
+        misses    - number of lookups that did not find the position
+
+    PositionCache Methods
+        get       - returns the stored result of a position (if any)
+        put       - stores the result of a position
+        drain     - returns the entries stored since the last drain
+        merge     - stores a list of entries (e.g. drained in other processes)
+        save      - writes the entries to a file
+        load      - reads the entries of a file
+        hit_rate  - fraction of lookups that found the position
+    """
+
+    # Binary record of a file entry: hash, move, depth, score
+    record = struct.Struct('<QbBi')
+
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        """
+        Inits an empty PositionCache
+
+        :param capacity: maximum number of entries
+        :raise: ValueError if capacity < 1
+        """
+
+        if capacity < 1:
+            raise ValueError("the position cache needs at least 1 entry")
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        # hash -> (move, depth, score). The move is given for the canonical
+        # image of the position and the score for the player taking turn
+        self._entries: 'OrderedDict[int, Tuple[int, int, int]]' = OrderedDict()
+        self._stored: List[int] = []  # hashes stored since the last drain
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Tuple[int, Tuple[int, int, int]]]:
+        with self._lock:
+            return iter(list(self._entries.items()))
+
+    def get(self, key: int) -> Optional[Tuple[int, int, int]]:
+        """
+        Returns the stored result of a position, which becomes the most
+        recently used entry
+
+        :param key: canonical hash of the position
+        :return: (move, depth, score) or None if the position is not stored
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: int, move: int, depth: int, score: int) -> None:
+        """
+        Stores the result of a position. A stored result is only replaced by
+        a deeper one. The least recently used entry is evicted if the cache
+        is full.
+
+        :param key: canonical hash of the position
+        :param move: best move, for the canonical image of the position
+        :param depth: depth of the search that found the move
+        :param score: score of the move for the player taking turn
+        :return: None
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > depth:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (move, depth, score)
+            self._entries.move_to_end(key)
+            self._stored.append(key)
+            if len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def drain(self) -> List[Tuple[int, int, int, int]]:
+        """
+        Returns the entries stored since the last call (still in the cache),
+        so that they can be merged into the cache of another process
+
+        :return: list of (hash, move, depth, score)
+        """
+
+        with self._lock:
+            stored, self._stored = self._stored, []
+            return [(key,) + self._entries[key]
+                    for key in dict.fromkeys(stored) if key in self._entries]
+
+    def merge(self, entries: List[Tuple[int, int, int, int]]) -> None:
+        """
+        Stores a list of entries
+
+        :param entries: list of (hash, move, depth, score)
+        :return: None
+        """
+
+        for key, move, depth, score in entries:
+            self.put(key, move, depth, score)
+
+    def save(self, path: str) -> None:
+        """
+        Writes the entries to a binary file, from the least to the most
+        recently used. The file is replaced atomically.
+
+        :param path: path of the file
+        :return: None
+        """
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            for key, (move, depth, score) in self:
+                file.write(self.record.pack(key, move, depth, score))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> int:
+        """
+        Reads the entries of a file written by save. Missing files are
+        ignored (there is nothing cached yet).
+
+        :param path: path of the file
+        :return: number of entries read
+        """
+
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as file:
+            data = file.read()
+        size = len(data) - len(data) % self.record.size  # ignore a torn tail
+        entries = list(self.record.iter_unpack(data[:size]))
+        self.merge(entries)
+        with self._lock:
+            self._stored.clear()  # loaded entries are not new
+        return len(entries)
+
+    def hit_rate(self) -> float:
+        """
+        Returns the fraction of lookups that found the position
+
+        :return: hits / lookups (0 if there were no lookups)
+        """
+
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,239 @@
+import mmap
+import struct
+import numpy as np
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from classes.game_state import GameState, apply_move
+from classes.zobrist import (canonical_hash, zobrist_hash,
+                             update_symmetric_hashes)
+
+
+# Record of a position: canonical hash, games won by player1, games won by
+# player2, draws (the visits are their sum). The same layout as a NumPy
+# structured array, used to aggregate the records in bulk
+RECORD = struct.Struct('<QIII')
+RECORD_DTYPE = np.dtype([('key', '<u8'), ('wins1', '<u4'), ('wins2', '<u4'),
+                         ('draws', '<u4')])
+# column of the counts of every result, as in GameState.winner
+_RESULT_COLUMN = {1: 0, 2: 1, -1: 2}
+
+
+class PositionRecord(NamedTuple):
+    """Statistics of a position, for the player taking turn"""
+    visits: int  # number of games where the position was played
+    wins: int
+    draws: int
+    losses: int
+
+
+def aggregate_games(games: Iterable[Tuple[int, int, bytes]],
+                    max_plies: int = 24) -> np.ndarray:
+    """
+    Counts the results of the games that went through every position (map
+    step). Positions are identified by their canonical hash, so a position
+    and its 7 symmetric images share one record.
+
+    :param games: (player who started the game, result as in
+        GameState.winner, moves) of finished games
+    :param max_plies: number of moves of every game whose positions are
+        counted (the position before each move, from the initial one)
+    :return: records sorted by key, as a RECORD_DTYPE array
+    """
+
+    keys: List[int] = []
+    columns: List[int] = []
+    for player, result, moves in games:
+        column = _RESULT_COLUMN[result]
+        state = GameState(player=player)
+        hashes = [zobrist_hash(state, t) for t in range(8)]
+        for move in moves[:max_plies]:
+            keys.append(min(hashes))
+            columns.append(column)
+            update_symmetric_hashes(hashes, apply_move(state, move), state)
+    keys = np.array(keys, dtype=np.uint64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse * 3 + np.array(columns, dtype=np.intp),
+                         minlength=3 * len(unique)).reshape(-1, 3)
+    return _records(unique, counts)
+
+
+def merge_records(parts: Iterable[np.ndarray],
+                  min_visits: int = 1) -> np.ndarray:
+    """
+    Merges records aggregated separately (reduce step): the counts of the
+    records of the same position are added
+
+    :param parts: RECORD_DTYPE arrays
+    :param min_visits: records of positions visited fewer times are dropped
+    :return: records sorted by key, as a RECORD_DTYPE array
+    """
+
+    records = np.concatenate(list(parts) or [np.empty(0, RECORD_DTYPE)])
+    if not len(records):
+        return records
+    records = records[np.argsort(records['key'], kind='stable')]
+    keys = records['key']
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    counts = np.stack([records['wins1'], records['wins2'], records['draws']],
+                      axis=1).astype(np.uint64)
+    counts = np.add.reduceat(counts, starts)
+    merged = _records(keys[starts], counts)
+    if min_visits > 1:
+        visits = merged['wins1'].astype(np.uint64) + merged['wins2'] \
+            + merged['draws']
+        merged = merged[visits >= min_visits]
+    return merged
+
+
+def _records(keys: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Builds a RECORD_DTYPE array
+
+    :param keys: (N,) canonical hashes
+    :param counts: (N, 3) player1 wins, player2 wins and draws
+    :return: records
+    """
+
+    records = np.empty(len(keys), dtype=RECORD_DTYPE)
+    records['key'] = keys
+    records['wins1'], records['wins2'], records['draws'] = \
+        np.minimum(counts, 0xFFFFFFFF).T
+    return records
+
+
+class PositionStats:
+    """
+    PositionStats reads a table of position statistics (see the
+        aggregate_position_stats.py script): fixed-size records sorted by
+        canonical hash. Like the OpeningBook, the file is memory-mapped and
+        binary-searched, so a table of millions of positions costs nothing to
+        open. It can be used as a prior by the computer players: how often
+        the games that went through a position were won.
+
+    PositionStats Attributes
+        path     - path of the table file
+
+    PositionStats Methods
+        lookup   - returns the statistics of a position (if any)
+        score    - expected score of a position for the player taking turn
+        close    - releases the memory map
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Opens a table of position statistics
+
+        :param path: path of the table file
+        :raise: ValueError if the size of the file is not a whole number of
+            records
+        """
+
+        self.path = path
+        with open(path, 'rb') as file:
+            # an empty file can't be memory-mapped: it is an empty table
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) \
+                if file.seek(0, 2) else b''
+        if len(self._map) % RECORD.size:
+            raise ValueError(f"{path} is not a position statistics table")
+        self._size = len(self._map) // RECORD.size
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _find(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Binary-searches the record of a hash
+
+        :param key: canonical hash of the position
+        :return: the record (hash, player1 wins, player2 wins, draws) or None
+        """
+
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            record = RECORD.unpack_from(self._map, middle * RECORD.size)
+            if record[0] < key:
+                low = middle + 1
+            elif record[0] > key:
+                high = middle
+            else:
+                return record
+        return None
+
+    def lookup(self, state: GameState) -> Optional[PositionRecord]:
+        """
+        Returns the statistics of the given position
+
+        :param state: position to look up
+        :return: PositionRecord for the player taking turn, or None if the
+            position is not in the table
+        """
+
+        if not self._size:
+            return None
+        record = self._find(canonical_hash(state)[0])
+        if record is None:
+            return None
+        _, wins1, wins2, draws = record
+        wins, losses = (wins1, wins2) if state.player == 1 else (wins2, wins1)
+        return PositionRecord(wins1 + wins2 + draws, wins, draws, losses)
+
+    def score(self, state: GameState) -> Optional[float]:
+        """
+        Returns the expected score of the given position for the player
+        taking turn (win = 1, draw = 0.5, loss = 0)
+
+        :param state: position to look up
+        :return: score from 0 to 1, or None if the position is not in the
+            table
+        """
+
+        record = self.lookup(state)
+        if record is None:
+            return None
+        return (record.wins + 0.5 * record.draws) / record.visits
+
+    def close(self) -> None:
+        """
+        Releases the memory map of the file
+
+        :return: None
+        """
+
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._size = 0
+
+
+if __name__ == "__main__":
+    import os
+    import random
+    import tempfile
+    import time
+    from classes.game_state import legal_moves, iter_moves
+
+    # 1) random games, aggregated in two halves and merged
+    rng = random.Random(0)
+    games = []
+    for i in range(4000):
+        state = GameState(player=1 + i % 2)
+        moves = bytearray()
+        while not state.winner():
+            moves.append(rng.choice(list(iter_moves(legal_moves(state)))))
+            apply_move(state, moves[-1])
+        games.append((1 + i % 2, state.winner(), bytes(moves)))
+    start = time.perf_counter()
+    records = merge_records([aggregate_games(games[:2000]),
+                             aggregate_games(games[2000:])])
+    elapsed = time.perf_counter() - start
+    assert np.array_equal(records, aggregate_games(games))
+    print(f"{len(records)} positions from {len(games)} games "
+          f"({elapsed:.2f}s)")
+
+    # 2) write the table and look up the initial position
+    path = os.path.join(tempfile.mkdtemp(), "position_stats.bin")
+    records.tofile(path)
+    stats = PositionStats(path)
+    initial = stats.lookup(GameState(player=1))
+    print(f"initial position (player1 to move): {initial}, "
+          f"score {stats.score(GameState(player=1)):.3f}")
+    stats.close()
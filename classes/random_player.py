@@ -0,0 +1,44 @@
+import random
+from typing import Optional
+from classes.game_state import GameState, legal_moves, iter_moves
+
+
+class RandomPlayer:
+    """
+    RandomPlayer implements a computer player that plays a random legal move.
+        It is the baseline to measure the strength of the other players.
+
+    RandomPlayer Methods
+        choose_move  - returns the move to play (local_board * 9 + cell)
+        stop         - nothing to abort, the move is chosen instantly
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        """
+        Inits a RandomPlayer instance
+
+        :param seed: seed of the random generator (None: not reproducible)
+        """
+
+        self._rng = random.Random(seed)
+
+    def stop(self) -> None:
+        """
+        Nothing to abort (the move is chosen instantly)
+
+        :return: None
+        """
+
+    def choose_move(self, state: GameState) -> int:
+        """
+        Returns a random legal move
+
+        :param state: position where the player takes turn (not modified)
+        :return: move to play, local_board * 9 + cell
+        :raise: ValueError if the game is over
+        """
+
+        moves = list(iter_moves(legal_moves(state)))
+        if not moves:
+            raise ValueError("there are no legal moves in this position")
+        return self._rng.choice(moves)
@@ -0,0 +1,325 @@
+import selectors
+import socket
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from classes.game_state import GameState
+from classes.sync_protocol import SyncEncoder
+
+
+class _Spectator:
+    """Send queue of a connected spectator"""
+    __slots__ = ('queue', 'offset')
+
+    def __init__(self) -> None:
+        self.queue: Deque[memoryview] = deque()  # messages not fully sent
+        self.offset = 0  # bytes of the first message already sent
+
+
+class SpectatorBroadcaster:
+    """
+    SpectatorBroadcaster sends the moves of a match to every connected
+        spectator (TCP) using the sync protocol (see sync_protocol). Every
+        move is encoded exactly once into an immutable bytes object, and a
+        memoryview of it is queued for every spectator: the sends never copy
+        the message. A network thread writes the queues to the non-blocking
+        sockets. Every spectator has a bounded queue: the spectators that
+        can't keep up (slow consumers) are disconnected instead of slowing
+        down the match or using unbounded memory. New spectators first get
+        a snapshot of the position.
+
+    SpectatorBroadcaster Attributes
+        address     - (host, port) where spectators connect
+        queue_size  - maximum number of messages queued per spectator
+        spectators  - number of connected spectators
+        dropped     - number of spectators disconnected for being slow
+        bytes_sent  - total bytes sent to the spectators
+
+    SpectatorBroadcaster Methods
+        play        - broadcasts a move of the match
+        new_game    - broadcasts the start of a new match
+        close       - disconnects every spectator and stops the thread
+    """
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 queue_size: int = 256,
+                 state: Optional[GameState] = None,
+                 snapshot_every: int = 32) -> None:
+        """
+        Inits a SpectatorBroadcaster instance and starts listening
+
+        :param host: interface where spectators connect
+        :param port: TCP port (0 picks a free one, see address)
+        :param queue_size: maximum number of messages queued per spectator
+        :param state: position of the match (by default, a new game)
+        :param snapshot_every: moves between two periodic snapshots, which
+            bring back in sync the spectators that missed a message
+        """
+
+        self.queue_size = queue_size
+        self.spectators = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self._snapshot_every = snapshot_every
+        self._encoder = SyncEncoder(state, snapshot_every)
+        # messages published but not queued to the spectators yet. The lock
+        # keeps the encoder and the outbox consistent: a new spectator gets
+        # the snapshot after the messages of the outbox have been queued
+        self._outbox: Deque[memoryview] = deque()
+        self._lock = threading.Lock()
+
+        self._listener = socket.create_server((host, port))
+        self._listener.setblocking(False)
+        self.address: Tuple[str, int] = self._listener.getsockname()[:2]
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        self._spectators: Dict[socket.socket, _Spectator] = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _publish(self, message: bytes) -> None:
+        """
+        Queues an encoded message for every spectator (called with the lock)
+
+        :param message: encoded message, shared by all the spectators
+        :return: None
+        """
+
+        self._outbox.append(memoryview(message))
+        self._wake()
+
+    def _wake(self) -> None:
+        """
+        Wakes the network thread up (it may be waiting for the sockets)
+
+        :return: None
+        """
+
+        try:
+            self._wake_writer.send(b'\0')
+        except BlockingIOError:
+            pass  # the network thread has wake-ups pending already
+
+    def play(self, move: int) -> None:
+        """
+        Broadcasts a move of the player taking turn
+
+        :param move: local_board * 9 + cell
+        :return: None
+        :raise: ValueError if the move is not legal
+        """
+
+        with self._lock:
+            self._publish(self._encoder.play(move))
+
+    def new_game(self, state: Optional[GameState] = None) -> None:
+        """
+        Broadcasts the start of a new match (a snapshot of its position)
+
+        :param state: position of the new match (by default, a new game)
+        :return: None
+        """
+
+        with self._lock:
+            self._encoder = SyncEncoder(state, self._snapshot_every)
+            self._publish(self._encoder.snapshot())
+
+    def close(self) -> None:
+        """
+        Disconnects every spectator and stops the network thread
+
+        :return: None
+        """
+
+        if self._closed:
+            return
+        self._closed = True
+        self._wake()
+        self._thread.join()
+        for sock in list(self._spectators):
+            self._disconnect(sock)
+        self._selector.close()
+        for sock in (self._listener, self._wake_reader, self._wake_writer):
+            sock.close()
+
+    def _serve(self) -> None:
+        """
+        Body of the network thread: accepts spectators, queues the published
+        messages and writes the queues to the sockets
+
+        :return: None
+        """
+
+        while not self._closed:
+            for key, events in self._selector.select():
+                sock = key.fileobj
+                if sock is self._listener:
+                    self._accept()
+                elif sock is self._wake_reader:
+                    try:
+                        self._wake_reader.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    self._distribute()
+                elif sock in self._spectators:
+                    if events & selectors.EVENT_READ:
+                        self._receive(sock)
+                    if events & selectors.EVENT_WRITE \
+                            and sock in self._spectators:
+                        self._flush(sock)
+
+    def _accept(self) -> None:
+        """
+        Accepts a new spectator and queues a snapshot of the position
+
+        :return: None
+        """
+
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            self._distribute_locked()
+            spectator = _Spectator()
+            spectator.queue.append(memoryview(self._encoder.snapshot()))
+        self._spectators[sock] = spectator
+        self._selector.register(sock, selectors.EVENT_READ)
+        self.spectators = len(self._spectators)
+        self._flush(sock)
+
+    def _distribute(self) -> None:
+        """
+        Queues the published messages for every spectator and sends them
+
+        :return: None
+        """
+
+        with self._lock:
+            self._distribute_locked()
+        for sock in list(self._spectators):
+            if self._spectators[sock].queue:
+                self._flush(sock)
+
+    def _distribute_locked(self) -> None:
+        """
+        Moves the messages of the outbox to the queues of the spectators
+        (called with the lock). Slow spectators are disconnected.
+
+        :return: None
+        """
+
+        while self._outbox:
+            message = self._outbox.popleft()
+            for sock, spectator in list(self._spectators.items()):
+                if len(spectator.queue) >= self.queue_size:
+                    self.dropped += 1
+                    self._disconnect(sock)
+                else:
+                    spectator.queue.append(message)
+
+    def _flush(self, sock: socket.socket) -> None:
+        """
+        Sends the queued messages of a spectator until its socket is full.
+        The sends are slices of memoryviews: the messages are never copied.
+
+        :param sock: socket of the spectator
+        :return: None
+        """
+
+        spectator = self._spectators[sock]
+        queue = spectator.queue
+        try:
+            while queue:
+                sent = sock.send(queue[0][spectator.offset:])
+                self.bytes_sent += sent
+                spectator.offset += sent
+                if spectator.offset < len(queue[0]):
+                    break  # the socket is full
+                queue.popleft()
+                spectator.offset = 0
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._disconnect(sock)
+            return
+        # only wait for the socket to be writable while there is data to send
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if queue else 0)
+        if self._selector.get_key(sock).events != events:
+            self._selector.modify(sock, events)
+
+    def _receive(self, sock: socket.socket) -> None:
+        """
+        Reads from a spectator socket: spectators don't send anything, so
+        this detects the closed connections
+
+        :param sock: socket of the spectator
+        :return: None
+        """
+
+        try:
+            data = sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._disconnect(sock)
+
+    def _disconnect(self, sock: socket.socket) -> None:
+        """
+        Closes the connection of a spectator and discards its queue
+
+        :param sock: socket of the spectator
+        :return: None
+        """
+
+        if self._spectators.pop(sock, None) is None:
+            return
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+        self.spectators = len(self._spectators)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+    from classes.game_state import legal_moves, iter_moves, apply_move
+    from classes.spectator_client import SpectatorClient
+    from classes.sync_protocol import SyncDecoder
+
+    # 1) many spectators watch a random game
+    broadcaster = SpectatorBroadcaster(queue_size=1024)
+    decoders = [SyncDecoder() for _ in range(200)]
+    clients = [SpectatorClient(broadcaster.address, on_data=decoder.feed)
+               for decoder in decoders]
+    time.sleep(0.5)  # let the spectators connect
+    print(f"{broadcaster.spectators} spectators")
+    rng = random.Random(0)
+    state = GameState()
+    start = time.perf_counter()
+    while not state.winner():
+        move = rng.choice(list(iter_moves(legal_moves(state))))
+        apply_move(state, move)
+        broadcaster.play(move)
+    time.sleep(0.5)  # let the last messages arrive
+
+    # 2) every spectator has the final position
+    synced = sum(decoder.state == state for decoder in decoders)
+    print(f"{synced} spectators in sync, {broadcaster.bytes_sent} bytes sent, "
+          f"{broadcaster.dropped} dropped")
+    for client in clients:
+        client.close()
+    broadcaster.close()
@@ -0,0 +1,76 @@
+import socket
+import threading
+from typing import Callable, Tuple
+from classes.sync_protocol import complete_size
+
+
+class SpectatorClient:
+    """
+    SpectatorClient connects to a SpectatorBroadcaster and receives the
+        messages of the watched match in a background thread. The stream is
+        split at message boundaries: the callback always gets complete
+        messages, ready to be fed to a SyncDecoder.
+
+    SpectatorClient Attributes
+        address    - (host, port) of the broadcaster
+        connected  - whether the connection is open
+
+    SpectatorClient Methods
+        close      - closes the connection
+    """
+
+    def __init__(self,
+                 address: Tuple[str, int],
+                 on_data: Callable[[bytes], object]) -> None:
+        """
+        Inits a SpectatorClient instance and connects to the broadcaster
+
+        :param address: (host, port) of the broadcaster
+        :param on_data: function called (from the background thread) with
+            every chunk of complete messages received
+        :raise: OSError if the broadcaster can't be reached
+        """
+
+        self.address = address
+        self._on_data = on_data
+        self._socket = socket.create_connection(address)
+        self.connected = True
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def _receive(self) -> None:
+        """
+        Body of the background thread: receives the stream until the
+        connection is closed
+
+        :return: None
+        """
+
+        buffer = b''
+        while True:
+            try:
+                chunk = self._socket.recv(1 << 16)
+            except OSError:
+                break
+            if not chunk:
+                break  # the broadcaster closed the connection
+            buffer += chunk
+            size = complete_size(buffer)
+            if size:
+                self._on_data(buffer[:size])
+                buffer = buffer[size:]
+        self.connected = False
+
+    def close(self) -> None:
+        """
+        Closes the connection (the background thread stops)
+
+        :return: None
+        """
+
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # already closed by the broadcaster
+        self._socket.close()
+        self._thread.join()
@@ -1,8 +1,12 @@
 import pygame
-import json
-from typing import Tuple, Optional
+from array import array
+from typing import List, Tuple, Optional
+from classes.asset_cache import load_config
+from classes.game_state import GameState
 from classes.tic_tac_toe_board import TicTacToeBoard
 from classes.tic_tac_toe_basic_board import TicTacToeBasicBoard
+from classes.tic_tac_toe_cell import HIGHLIGHTED_BIT, DIRTY_BIT
+from classes.zobrist import zobrist_hash, diff_hash, canonical_hash
 
 
 class SuperTicTacToeBoard(TicTacToeBasicBoard):
@@ -10,22 +14,41 @@ class SuperTicTacToeBoard(TicTacToeBasicBoard):
     SuperTicTacToeBoard Implements the functionalities of a Super TicTacToe
         board. Inherits functionalities from TicTacToeBasicBoard class.
         Fills the board attribute with 9 TicTacToeBoards, each one containing a
-        local board with 9 TicTacToeCells.
+        local board with 9 TicTacToeCells. The rules of the game are applied
+        by a GameState instance; the local boards and cells are a view of it.
+        The state of every cell (and big cell) is one byte of a single buffer
+        owned by this board: local board i uses the bytes i*10 to i*10+9.
 
     SuperTicTacToeBoard Attributes
         (refer to TicTacToeBasicBoard class documentation)
         board     - list of TicTacToeBoard that simulate a 3x3 global board
+        state     - GameState holding the position displayed by the board
+        cells     - bytearray with the state of every cell of the local boards
+        hash      - 64-bit Zobrist hash of the position, updated incrementally
 
     SuperTicTacToeBoard Methods
         (refer to TicTacToeBasicBoard class documentation)
+        winner    - winner of the game, read from the state
+        cell_at   - (local board, cell) at a given point of the screen
         update    - updates the board state or the state of a given cell
+        play      - plays a move of the active player (turns are applied)
+        snapshot  - copies the whole position (cells buffer and game state)
+        restore   - goes back to a position returned by snapshot
+        set_state - displays another position (e.g. to replay a game)
+        canonical_hash - hash shared by the position and its symmetric images
         draw      - displays the board depending on its state
+        draw_dirty - displays only the parts of the board that have changed
     """
 
+    __slots__ = ('cells', 'state', 'hash', 'global_grid', '_drawn',
+                 'edge_color', '_column_at', '_row_at')
+
     def __init__(self,
                  topleft: Tuple[float, float],
                  width: int,
-                 config_path: str = "../config/config.json") -> None:
+                 config_path: str = "../config/config.json",
+                 state: Optional[GameState] = None,
+                 config: Optional[dict] = None) -> None:
         """
         Inits a SuperTicTacToeBoard instance at a given location with a given
         width
@@ -33,29 +56,123 @@ class SuperTicTacToeBoard(TicTacToeBasicBoard):
         :param topleft: coordinates of the top-left corner of the board
         :param width: length of the square defining the board's shape
         :param config_path: path from where to read the configuration file
+        :param state: position to display. By default, a new game is created
+        :param config: configuration parameters. If provided, config_path is
+            not used. The config is passed down to the local boards
         """
 
         # Inits parent class
         TicTacToeBasicBoard.__init__(self, topleft=topleft, width=width)
+        # The config file is read once and passed down to the local boards
+        if config is None:
+            config = load_config(config_path)
 
+        # one contiguous buffer with the state of all the cells: the local
+        # boards and their cells are lightweight views indexing into it
+        self.cells = bytearray(9 * TicTacToeBoard.buffer_size)
         # define a list of 9 local boards to simulate a 3x3 grid
         self.board = [
             TicTacToeBoard(
                 topleft=(topleft[0] + (i % 3)*width/3,
                          topleft[1] + (i//3)*width/3),
-                width=width//3
+                width=width//3,
+                config=config,
+                buffer=self.cells,
+                offset=i * TicTacToeBoard.buffer_size
             )
             for i in range(9)
         ]
 
+        # the game state is the source of truth, the local boards display it
+        self.state = GameState() if state is None else state
+        self.hash = zobrist_hash(self.state)
+        for local_board in range(9):
+            self._sync_local_board(local_board)
+
         # Define a rect to draw the edges of the global grid
         self.global_grid = pygame.Rect(self.topleft, (self.width, self.width))
+        self._drawn = False  # whether the grid has been drawn
 
         # From the config file, retrieve the color of the edges
-        with open(config_path, 'r') as config_file:
-            config = json.load(config_file)
         self.edge_color = config['edge_color']
 
+        # Pixel-to-cell lookup tables (one per axis), computed once from the
+        # cell rects: a click is resolved with two lookups instead of a scan
+        self._column_at = self._axis_lookup(
+            [self.board[i][j].rect for i in range(3) for j in range(3)],
+            axis=0)
+        self._row_at = self._axis_lookup(
+            [self.board[3*i][3*j].rect for i in range(3) for j in range(3)],
+            axis=1)
+
+    def _axis_lookup(self, rects: List[pygame.Rect], axis: int) -> array:
+        """
+        Builds the lookup table of one axis of the global grid: for every
+        pixel from the top-left corner of the grid, the column (or row) of
+        cells from 0 to 8 it belongs to, or -1 if it is in a gap
+
+        :param rects: the rects of the 9 columns (or rows) of cells, in order
+        :param axis: 0 for the x axis (columns), 1 for the y axis (rows)
+        :return: array with one entry per pixel of the grid
+        """
+
+        origin = self.global_grid.topleft[axis]
+        size = max(rect.bottomright[axis] for rect in rects) - origin
+        lookup = array('b', [-1]) * max(size, 0)
+        for index, rect in enumerate(rects):
+            for pixel in range(rect.topleft[axis], rect.bottomright[axis]):
+                lookup[pixel - origin] = index
+        return lookup
+
+    def cell_at(self, point: Tuple[float, float]) -> Tuple[int, int]:
+        """
+        Returns the cell at the given point of the screen in constant time.
+        Points in the gaps between cells or outside the grid return (-1, -1)
+
+        :param point: (x,y) coordinates of a point in the screen
+        :return: (local board, cell), two integers from 0 to 8
+        """
+
+        x = int(point[0]) - self.global_grid.left
+        y = int(point[1]) - self.global_grid.top
+        if not (0 <= x < len(self._column_at) and 0 <= y < len(self._row_at)):
+            return -1, -1
+        column, row = self._column_at[x], self._row_at[y]
+        if column == -1 or row == -1:
+            return -1, -1
+        return row // 3 * 3 + column // 3, row % 3 * 3 + column % 3
+
+    def winner(self) -> int:
+        """
+        Returns the winner of the game, which is tracked by the game state
+
+        :return: -1 if the game is a draw, 0 if the game is running,
+            1 if player1 has won, 2 if player2 has won
+        """
+
+        return self.state.winner()
+
+    def _sync_local_board(self, local_board: int) -> None:
+        """
+        Copies the state of the given local board (winners of its cells and of
+        the board itself) from the game state to the local board view
+
+        :param local_board: index of the local board to synchronize
+        :return: None
+        """
+
+        _local_board = self.board[local_board]
+        owners = [self.state.owner(local_board, cell) for cell in range(9)]
+        if any(cell.winner() != owner
+               for cell, owner in zip(_local_board, owners) if cell.winner()):
+            _local_board.reset()  # a filled cell has been emptied (draw)
+        for cell_id, owner in enumerate(owners):
+            if owner and _local_board[cell_id].winner() != owner:
+                _local_board.update(state=owner, cell=cell_id)
+        local_winner = self.state.local_winner(local_board)
+        if local_winner:
+            _local_board.big_cell.update(state=local_winner)
+
     def update(self,
                state: int,
                local_board: Optional[int] = None,
@@ -86,16 +203,98 @@ class SuperTicTacToeBoard(TicTacToeBasicBoard):
         elif local_board is None and cell is not None:
             # a cell is given but its local board is missing
             raise ValueError("Provide a local board for the given cell")
-        else:  # local board is not None, mark the cell
-            self.board[local_board].update(state=state, cell=cell)
-            if self.board[local_board].winner() > 0:
-                # update the local board
-                self.board[local_board].big_cell.update(
-                    state=self.board[local_board].winner())
-            elif self.board[local_board].winner() == -1:  # local game is draw
-                # reset the local board
-                for _cell in self.board[local_board]:
-                    _cell.reset()
+        elif cell is None:  # update the availability of the local board
+            self.board[local_board].update(state=state)
+        elif state in (1, 2):  # local board is not None, mark the cell
+            # the game state applies the local win and local draw rules
+            before = self._hash_key()
+            self.state.mark(player=state, local_board=local_board, cell=cell)
+            self.hash = diff_hash(self.hash, before, self.state)
+            self._sync_local_board(local_board)
+        else:  # availability can't be set to a specific cell but the board
+            raise ValueError("wrong value for the cell state in the board")
+
+    def play(self, local_board: int, cell: int) -> None:
+        """
+        The active player (state.player) marks the given cell. Unlike update,
+        the turn is passed and the next forced local board is set.
+
+        :param local_board: local board where the cell belongs to
+        :param cell: cell marked by the active player
+        :return: None
+        :raise: ValueError if the move is not legal in the current turn
+        """
+
+        before = self._hash_key()
+        self.state.play(local_board=local_board, cell=cell)
+        self.hash = diff_hash(self.hash, before, self.state)
+        self._sync_local_board(local_board)
+
+    def _hash_key(self) -> Tuple[int, int, int, int]:
+        """
+        Returns the parts of the state covered by the hash, to update the
+        hash incrementally after a change (see zobrist.diff_hash)
+
+        :return: (player1 cells, player2 cells, forced_board, player)
+        """
+
+        return (self.state.cells[0], self.state.cells[1],
+                self.state.forced_board, self.state.player)
+
+    def canonical_hash(self) -> int:
+        """
+        Returns the hash that identifies the position and its 7 symmetric
+        images (rotations and mirrors of the whole grid)
+
+        :return: 64-bit canonical hash of the position
+        """
+
+        return canonical_hash(self.state)[0]
+
+    def snapshot(self) -> Tuple[bytes, GameState]:
+        """
+        Copies the current position: the cells are copied with a single
+        buffer copy
+
+        :return: (copy of the cells buffer, copy of the game state)
+        """
+
+        return bytes(self.cells), self.state.copy()
+
+    def restore(self, snapshot: Tuple[bytes, GameState]) -> None:
+        """
+        Goes back to the given position. The whole board is drawn again in
+        the next frame.
+
+        :param snapshot: position returned by the snapshot method
+        :return: None
+        """
+
+        cells, state = snapshot
+        self.cells[:] = cells
+        self.state = state.copy()
+        self.hash = zobrist_hash(self.state)
+        for i in range(len(self.cells)):  # the mouse may be somewhere else
+            self.cells[i] = self.cells[i] & ~HIGHLIGHTED_BIT | DIRTY_BIT
+        for local_board in self.board:
+            local_board.sync_winner()
+            local_board.dirty = True
+        self._drawn = False
+
+    def set_state(self, state: GameState) -> None:
+        """
+        Displays the given position. Only the cells that differ from the
+        current position are updated (and drawn again in the next frame).
+        Availability is not updated.
+
+        :param state: position to display (it is copied)
+        :return: None
+        """
+
+        self.state = state.copy()
+        self.hash = zobrist_hash(self.state)
+        for local_board in range(9):
+            self._sync_local_board(local_board)
 
     def draw(self, screen: pygame.Surface) -> None:
         """
@@ -110,6 +309,25 @@ class SuperTicTacToeBoard(TicTacToeBasicBoard):
         # Draw the global board on top of the grid
         for local_board in self.board:
             local_board.draw(screen)
+        self._drawn = True
+
+    def draw_dirty(self, screen: pygame.Surface) -> List[pygame.Rect]:
+        """
+        Displays on the given surface only the local boards and cells that
+        have changed since they were last drawn (everything the first time)
+
+        :param screen: pygame Surface where the global board is placed
+        :return: list of the areas of the screen that were updated
+        """
+
+        if not self._drawn:
+            self.draw(screen)
+            return [self.global_grid]
+        rects = []
+        for local_board in self.board:
+            if local_board.dirty:
+                rects.extend(local_board.draw_dirty(screen))
+        return rects
 
 
 if __name__ == "__main__":
@@ -0,0 +1,391 @@
+import struct
+from typing import TYPE_CHECKING, Iterator, Optional
+from classes.game_state import (GameState, FULL_BOARD, BOARD_MASKS, IS_WIN,
+                                apply_move)
+from classes.zobrist import zobrist_hash, update_hash
+
+if TYPE_CHECKING:  # servers and headless clients don't need pygame
+    from classes.super_tic_tac_toe_board import SuperTicTacToeBoard
+
+
+# Wire format: a stream of fixed-size messages. The 2 high bits of the first
+# byte give the kind of message:
+#   delta:    flags (1 byte), move (1 byte), sequence number (2 bytes),
+#             checksum of the position after the move (4 bytes)
+#   snapshot: kind (1 byte), sequence number of the last move (2 bytes),
+#             checksum (4 bytes), packed position (PACKED_SIZE bytes)
+# The flags of a delta are the result of the move: winner of the game (2
+# bits, 3 for a draw), LOCAL_WIN and LOCAL_DRAW. The checksum is the low half
+# of the Zobrist hash of the position, which the boards update incrementally.
+DELTA, SNAPSHOT = 0x00, 0x40
+KIND_BITS = 0xC0
+WINNER_BITS = 0x03
+LOCAL_WIN = 0x04
+LOCAL_DRAW = 0x08
+DELTA_MESSAGE = struct.Struct('<BBHI')
+SNAPSHOT_HEADER = struct.Struct('<BHI')
+# 81 cells in base 3 (17 bytes) + forced board and player taking turn (1 byte)
+PACKED_SIZE = 18
+SNAPSHOT_SIZE = SNAPSHOT_HEADER.size + PACKED_SIZE
+_CELLS_LIMIT = 3 ** 81
+
+
+class SyncError(Exception):
+    """Raised when a client can't follow the server: a message was lost or
+    malformed, or the position of the client diverged"""
+
+
+def checksum(h: int) -> int:
+    """
+    Returns the checksum of a position sent on the wire
+
+    :param h: 64-bit Zobrist hash of the position
+    :return: 32-bit checksum
+    """
+
+    return h & 0xFFFFFFFF
+
+
+def pack_state(state: GameState) -> bytes:
+    """
+    Packs a position in PACKED_SIZE bytes: the owner of every cell as a base-3
+    number, then the forced local board and the player taking turn. The
+    winners of the local boards and of the game are implied by the cells.
+
+    :param state: position to pack
+    :return: packed position
+    """
+
+    c0, c1 = state.cells
+    number = 0
+    for bit in range(80, -1, -1):
+        number = number * 3 + (c0 >> bit & 1) + 2 * (c1 >> bit & 1)
+    extra = (state.forced_board + 1) | (state.player - 1) << 4
+    return number.to_bytes(PACKED_SIZE - 1, 'little') + bytes((extra,))
+
+
+def unpack_state(data: bytes) -> GameState:
+    """
+    Rebuilds a position packed with pack_state
+
+    :param data: PACKED_SIZE bytes
+    :return: the position
+    :raise: SyncError if the data is not a valid packed position
+    """
+
+    if len(data) != PACKED_SIZE:
+        raise SyncError("wrong size of a packed position")
+    number = int.from_bytes(data[:-1], 'little')
+    forced_board, player = (data[-1] & 0x0F) - 1, (data[-1] >> 4) + 1
+    if number >= _CELLS_LIMIT or forced_board > 8 or player > 2:
+        raise SyncError("invalid packed position")
+
+    state = GameState(player=player)
+    state.forced_board = forced_board
+    cells = [0, 0]
+    for bit in range(81):
+        number, owner = divmod(number, 3)
+        if owner:
+            cells[owner - 1] |= 1 << bit
+    state.cells = cells
+    for local_board in range(9):
+        shift = 9 * local_board
+        for p in (0, 1):
+            if IS_WIN[cells[p] >> shift & FULL_BOARD]:
+                state.boards[p] |= 1 << local_board
+    if IS_WIN[state.boards[0]]:
+        state._winner = 1
+    elif IS_WIN[state.boards[1]]:
+        state._winner = 2
+    elif state.boards[0] | state.boards[1] == FULL_BOARD:
+        state._winner = -1
+    return state
+
+
+def result_flags(state: GameState, move: int, decided_before: int) -> int:
+    """
+    Returns the flags of a delta: the result of a move that has just been
+    played
+
+    :param state: position after the move
+    :param move: move played, local_board * 9 + cell
+    :param decided_before: 9-bit mask of the local boards with a winner
+        before the move
+    :return: winner code (3 for a draw) | LOCAL_WIN | LOCAL_DRAW
+    """
+
+    flags = state.winner() & WINNER_BITS  # -1 (draw) becomes 3
+    if state.boards[0] | state.boards[1] != decided_before:
+        flags |= LOCAL_WIN
+    elif not (state.cells[0] | state.cells[1]) & BOARD_MASKS[move // 9]:
+        flags |= LOCAL_DRAW  # the marked board has been emptied
+    return flags
+
+
+def iter_messages(data: bytes) -> Iterator[bytes]:
+    """
+    Splits a chunk of the stream into messages (their sizes are fixed)
+
+    :param data: concatenated messages
+    :return: iterator of messages
+    :raise: SyncError if the chunk ends in the middle of a message
+    """
+
+    position = 0
+    while position < len(data):
+        size = SNAPSHOT_SIZE if data[position] & KIND_BITS == SNAPSHOT \
+            else DELTA_MESSAGE.size
+        if position + size > len(data):
+            raise SyncError("truncated message")
+        yield data[position:position + size]
+        position += size
+
+
+def complete_size(data: bytes) -> int:
+    """
+    Returns the size of the complete messages at the start of a stream
+    buffer (the rest of the buffer is the start of a message not fully
+    received yet)
+
+    :param data: bytes received from the stream
+    :return: number of bytes that can be passed to iter_messages
+    """
+
+    position = 0
+    while position < len(data):
+        size = SNAPSHOT_SIZE if data[position] & KIND_BITS == SNAPSHOT \
+            else DELTA_MESSAGE.size
+        if position + size > len(data):
+            break
+        position += size
+    return position
+
+
+class SyncEncoder:
+    """
+    SyncEncoder is the server side of the protocol: it plays the moves of a
+        game and encodes every move as a delta of DELTA_MESSAGE.size bytes.
+        A snapshot of the whole position is added every snapshot_every moves,
+        so that clients that lost a message get back in sync, and can be
+        requested at any time for clients joining a running game.
+
+    SyncEncoder Attributes
+        state           - position of the game (do not modify it)
+        hash            - Zobrist hash of the position
+        seq             - sequence number of the last move (16 bits)
+        snapshot_every  - moves between two periodic snapshots (0: never)
+
+    SyncEncoder Methods
+        play      - plays a move and returns the messages to send
+        snapshot  - returns a snapshot message of the current position
+    """
+
+    def __init__(self, state: Optional[GameState] = None,
+                 snapshot_every: int = 32) -> None:
+        """
+        Inits a SyncEncoder instance
+
+        :param state: position of the game (copied). By default, a new game
+        :param snapshot_every: moves between two periodic snapshots
+        """
+
+        self.state = GameState() if state is None else state.copy()
+        self.hash = zobrist_hash(self.state)
+        self.seq = 0
+        self.snapshot_every = snapshot_every
+
+    def play(self, move: int) -> bytes:
+        """
+        Plays a move of the player taking turn
+
+        :param move: local_board * 9 + cell
+        :return: the delta of the move, followed by a snapshot if it is time
+            for a periodic one
+        :raise: ValueError if the move is not legal
+        """
+
+        if not 0 <= move < 81 or not self.state.is_legal(*divmod(move, 9)):
+            raise ValueError(f"illegal move: {move}")
+        decided = self.state.boards[0] | self.state.boards[1]
+        token = apply_move(self.state, move)
+        self.hash = update_hash(self.hash, token, self.state)
+        self.seq = (self.seq + 1) & 0xFFFF
+        message = DELTA_MESSAGE.pack(
+            DELTA | result_flags(self.state, move, decided), move, self.seq,
+            checksum(self.hash))
+        if self.snapshot_every and self.seq % self.snapshot_every == 0:
+            message += self.snapshot()
+        return message
+
+    def snapshot(self) -> bytes:
+        """
+        Returns a snapshot message of the current position
+
+        :return: SNAPSHOT_SIZE bytes
+        """
+
+        return SNAPSHOT_HEADER.pack(SNAPSHOT, self.seq, checksum(self.hash)) \
+            + pack_state(self.state)
+
+
+class SyncDecoder:
+    """
+    SyncDecoder is the client side of the protocol: it rebuilds the position
+        of the server from its messages. Every delta is checked (sequence
+        number, legality, result flags and checksum): on any mismatch, a
+        SyncError is raised and the deltas are ignored until the next
+        snapshot. The checksum is computed from the cells of the client's
+        position (not updated incrementally), so that any difference with
+        the server is detected at once. If a SuperTicTacToeBoard is given,
+        the moves are played on it, so it can be displayed.
+
+    SyncDecoder Attributes
+        board   - SuperTicTacToeBoard that displays the position (or None)
+        synced  - whether the position is known (a snapshot was received and
+                  no message was lost since)
+        seq     - sequence number of the last move applied
+
+    SyncDecoder Methods
+        state   - position rebuilt from the messages
+        feed    - applies a message (or several) received from the server
+    """
+
+    def __init__(self,
+                 board: Optional['SuperTicTacToeBoard'] = None) -> None:
+        """
+        Inits a SyncDecoder instance, waiting for a snapshot
+
+        :param board: board where the moves are played (None for headless
+            clients)
+        """
+
+        self.board = board
+        self.synced = False
+        self.seq = 0
+        self._state = GameState()
+
+    @property
+    def state(self) -> GameState:
+        return self.board.state if self.board is not None else self._state
+
+    def feed(self, data: bytes) -> Optional[int]:
+        """
+        Applies the messages received from the server, in order
+
+        :param data: one or several messages
+        :return: the last move applied (None if no move was applied)
+        :raise: SyncError if a message was lost or is malformed, or the
+            position diverged from the server's one. The rest of the data
+            is applied first, so a snapshot that follows the bad message
+            (e.g. the periodic one sent with a delta) resynchronizes the
+            client; otherwise, the client should request a snapshot
+        """
+
+        move = None
+        error = None
+        for message in iter_messages(data):
+            try:
+                if message[0] & KIND_BITS == SNAPSHOT:
+                    self._apply_snapshot(message)
+                elif self.synced:
+                    move = self._apply_delta(message)
+            except SyncError as e:
+                error = error or e  # synced is False until a snapshot
+        if error is not None:
+            raise error
+        return move
+
+    def _apply_snapshot(self, message: bytes) -> None:
+        """
+        Replaces the position with the one of a snapshot message
+
+        :param message: snapshot message
+        :return: None
+        :raise: SyncError if the snapshot is malformed
+        """
+
+        _, seq, check = SNAPSHOT_HEADER.unpack_from(message)
+        state = unpack_state(message[SNAPSHOT_HEADER.size:])
+        if checksum(zobrist_hash(state)) != check:
+            self.synced = False
+            raise SyncError("corrupted snapshot")
+        if self.board is not None:
+            self.board.set_state(state)
+        else:
+            self._state = state
+        self.seq = seq
+        self.synced = True
+
+    def _apply_delta(self, message: bytes) -> int:
+        """
+        Plays the move of a delta message and checks the resulting position
+
+        :param message: delta message
+        :return: the move applied
+        :raise: SyncError if a message was lost or the positions diverged
+        """
+
+        flags, move, seq, check = DELTA_MESSAGE.unpack(message)
+        if seq != (self.seq + 1) & 0xFFFF:
+            self.synced = False
+            raise SyncError(f"lost messages: expected {self.seq + 1}, "
+                            f"got {seq}")
+        state = self.state
+        if not 0 <= move < 81 or not state.is_legal(*divmod(move, 9)):
+            self.synced = False
+            raise SyncError(f"illegal move {move} in message {seq}")
+        decided = state.boards[0] | state.boards[1]
+        if self.board is not None:
+            self.board.play(*divmod(move, 9))
+        else:
+            apply_move(state, move)
+        self.seq = seq
+        if (result_flags(self.state, move, decided) != flags & ~KIND_BITS
+                or checksum(zobrist_hash(self.state)) != check):
+            self.synced = False
+            raise SyncError(f"the position diverged at message {seq}")
+        return move
+
+
+if __name__ == "__main__":
+    import random
+    from classes.game_state import legal_moves, iter_moves
+
+    # 1) the server plays random games; clients lose 5% of the messages and
+    # join late, and get back in sync with the periodic snapshots
+    rng = random.Random(0)
+    sent = errors = 0
+    for game in range(200):
+        server = SyncEncoder(snapshot_every=16)
+        client, late_client = SyncDecoder(), SyncDecoder()
+        client.feed(server.snapshot())
+        while not server.state.winner():
+            move = rng.choice(list(iter_moves(legal_moves(server.state))))
+            data = server.play(move)
+            sent += len(data)
+            for decoder in (client, late_client):
+                for message in iter_messages(data):
+                    if rng.random() < 0.05:
+                        continue  # lost
+                    try:
+                        decoder.feed(message)
+                    except SyncError:
+                        errors += 1
+        for decoder in (client, late_client):
+            decoder.feed(server.snapshot())
+            assert decoder.state == server.state and decoder.synced
+    print(f"{sent} bytes sent, {errors} losses detected")
+
+    # 2) a corrupted delta followed by a snapshot in the same chunk: the error
+    # is reported, but the snapshot is applied and resynchronizes the client
+    server = SyncEncoder(snapshot_every=1)
+    client = SyncDecoder()
+    client.feed(server.snapshot())
+    data = bytearray(server.play(40))
+    data[DELTA_MESSAGE.size - 1] ^= 0xFF  # checksum of the delta
+    try:
+        client.feed(bytes(data))
+        raise AssertionError("the corrupted delta was not detected")
+    except SyncError as e:
+        print(f"corrupted delta detected: {e}")
+    assert client.state == server.state and client.synced
@@ -1,4 +1,5 @@
 from typing import Tuple
+from classes.game_state import FULL_BOARD, IS_WIN, LINES_THROUGH_CELL
 
 
 class TicTacToeBasicBoard:
@@ -13,9 +14,12 @@ class TicTacToeBasicBoard:
         topleft    - coordinates of the top-left corner of the board
 
     TicTacToeBasicBoard Methods
-        winner     - check if there is a winner on the current board
+        winner     - check if there is a winner on the current board (cached,
+                     updated incrementally when a child is won or reset)
     """
 
+    __slots__ = ('board', 'topleft', 'width', '_marks', '_winner_cache')
+
     def __init__(self, topleft: Tuple[float, float], width: int) -> None:
         """
         Inits a TicTacToeBasicBoard instance at a given location with a given
@@ -29,42 +33,73 @@ class TicTacToeBasicBoard:
         self.topleft = topleft
         self.width = width
 
-    def winner(self):
+        # 9-bit masks of the children (cells or local boards) won by player1
+        # and player2, and the cached result of the winner method
+        self._marks = [0, 0]
+        self._winner_cache = 0
+
+    def winner(self) -> int:
         """
-        Check if there is a winner or game is draw based on the current board
+        Check if there is a winner or game is draw based on the current board.
+        The result is tracked incrementally by _set_child_winner and
+        _reset_winner, so this is a lookup instead of a scan of the board.
 
         :return: -1 if the game is a draw, 0 if the game is running,
             1 if player1 has won, 2 if player2 has won
         """
 
-        board = [e.winner() for e in self.board]
-        for player in (1, 2):
-            winner_comb = [player] * 3
-            # check winner by rows
-            for i in range(0, 9, 3):
-                row = [board[i], board[i+1], board[i+2]]
-                if row == winner_comb:
-                    return player
-            # check winner by columns
-            for j in range(3):
-                col = [board[j], board[j+3], board[j+6]]
-                if col == winner_comb:
-                    return player
-            # check winner by diagonals
-            asc_diag = [board[0], board[4], board[8]]
-            if asc_diag == winner_comb:
-                return player
-            desc_diag = [board[6], board[4], board[2]]
-            if desc_diag == winner_comb:
-                return player
-
-        # if there is no winner, check if the game is a draw
-        num_filled_cells = 0
-        for cell_state in board:
-            num_filled_cells += int(cell_state > 0)
-
-        # if num_filled_cells is 9, there aren't legal moves to play: game draw
-        return -1 if num_filled_cells == 9 else 0
+        return self._winner_cache
+
+    def _set_child_winner(self, idx: int, player: int) -> None:
+        """
+        Records that the given child (cell or local board) has been won by the
+        given player and updates the cached winner of the board. Only the
+        winning lines that go through the child are checked.
+
+        :param idx: index of the child in the board (0 to 8)
+        :param player: winner of the child, 1 or 2
+        :return: None
+        """
+
+        bit = 1 << idx
+        self._marks[player - 1] |= bit
+        self._marks[2 - player] &= ~bit  # the child can't have two winners
+
+        if self._winner_cache == 0:  # the board had no winner: check the move
+            marks = self._marks[player - 1]
+            for line in LINES_THROUGH_CELL[idx]:
+                if marks & line == line:
+                    self._winner_cache = player
+                    return
+            if self._marks[0] | self._marks[1] == FULL_BOARD:
+                # there aren't legal moves to play: game draw
+                self._winner_cache = -1
+        else:  # a decided board has been overwritten, recompute from masks
+            self._winner_cache = self._compute_winner()
+
+    def _reset_winner(self) -> None:
+        """
+        Forgets the winners of every child: the board has no winner
+
+        :return: None
+        """
+
+        self._marks = [0, 0]
+        self._winner_cache = 0
+
+    def _compute_winner(self) -> int:
+        """
+        Computes the winner of the board from the masks of the children won
+        by each player
+
+        :return: same values as the winner method
+        """
+
+        if IS_WIN[self._marks[0]]:
+            return 1
+        if IS_WIN[self._marks[1]]:
+            return 2
+        return -1 if self._marks[0] | self._marks[1] == FULL_BOARD else 0
 
     def __getitem__(self, idx):
         """
@@ -1,6 +1,7 @@
 import pygame
-from typing import Optional, Tuple
-from classes.tic_tac_toe_cell import TicTacToeCell
+from typing import List, Optional, Tuple
+from classes.asset_cache import load_config
+from classes.tic_tac_toe_cell import TicTacToeCell, WINNER_BITS
 from classes.tic_tac_toe_basic_board import TicTacToeBasicBoard
 
 
@@ -8,32 +9,71 @@ class TicTacToeBoard(TicTacToeBasicBoard):
     """
     TicTacToeBoard Implements the functionalities of a TicTacToe board.
         Inherits functionalities from TicTacToeBasicBoard class.
-        Fills the board attribute with 9 TicTacToeCells (3x3 grid)
+        Fills the board attribute with 9 TicTacToeCells (3x3 grid). The state
+        of the cells is stored in 10 consecutive bytes of a buffer (the 9 cells
+        and the big cell), that can be shared by many boards. The board is
+        rendered on its own surface (a composite of its cells), where only the
+        cells that have changed are drawn again: displaying the board is a
+        single blit.
 
     TicTacToeBoard Attributes
         (refer to TicTacToeBasicBoard class documentation)
         board     - list of TicTacToeCells that simulate a 3x3 local board
         big_cell  - defines the behaviour of the board when it acts as a cell
+        dirty     - whether the board has changed since it was last drawn
 
     TicTacToeBoard Methods
         (refer to TicTacToeBasicBoard class documentation)
         update    - updates the board state or the state of a given cell
+        reset     - empties the board (all its cells become unfilled)
+        highlight - highlights (or not) one of the cells
+        sync_winner - recomputes the winner of the board from its cells
         draw      - displays the board depending on its state
+        draw_dirty - displays only the parts of the board that have changed
     """
 
+    __slots__ = ('_edge_color', '_rect', 'dirty', '_drawn_as_big_cell',
+                 'big_cell', '_buffer', '_offset', '_surface')
+
     # Percentage of the width that used to create a separation between cells
     cell_dist_pct = 0.10
+    # Number of bytes of the buffer used by a board: 9 cells and the big cell
+    buffer_size = 10
 
-    def __init__(self, topleft: Tuple[float, float], width: int) -> None:
+    def __init__(self,
+                 topleft: Tuple[float, float],
+                 width: int,
+                 config_path: str = "../config/config.json",
+                 config: Optional[dict] = None,
+                 buffer: Optional[bytearray] = None,
+                 offset: int = 0) -> None:
         """
         Inits a TicTacToeBoard instance at a given location with a given width
 
         :param topleft: coordinates of the top-left corner of the board
         :param width: length of the square defining the board's shape
+        :param config_path: path from where to read the configuration file
+        :param config: configuration parameters. If provided, config_path is
+            not used. The config is passed down to the cells
+        :param buffer: bytearray holding the state of the cells, from offset
+            (buffer_size bytes). By default, the board allocates its own buffer
+        :param offset: position of the state of the first cell in the buffer
         """
 
         # Inits parent class
         TicTacToeBasicBoard.__init__(self, topleft=topleft, width=width)
+        if config is None:
+            config = load_config(config_path)
+        # the gaps between cells are filled with the color of the edges
+        self._edge_color = config['edge_color']
+        self._rect = pygame.Rect(topleft, (width, width))
+        self.dirty = True  # the board has never been drawn
+        self._drawn_as_big_cell = False  # how the board was last rendered
+        self._surface: Optional[pygame.Surface] = None  # rendered when drawn
+        if buffer is None:
+            buffer, offset = bytearray(TicTacToeBoard.buffer_size), 0
+        self._buffer = buffer
+        self._offset = offset
 
         # computes the real cell width taking into account a margin (distance)
         cell_width = (width * (1-TicTacToeBoard.cell_dist_pct)) // 3
@@ -44,7 +84,10 @@ class TicTacToeBoard(TicTacToeBasicBoard):
         # board has winner, it will act as a filled cell in the global board
         self.big_cell = TicTacToeCell(
             topleft=(cell_dist + topleft[0], cell_dist + topleft[1]),
-            width=(3 * cell_width + 2 * cell_dist)
+            width=(3 * cell_width + 2 * cell_dist),
+            config=config,
+            buffer=buffer,
+            index=offset + 9
         )
         # define a list of 9 cells to simulate a 3x3 grid
         self.board = [
@@ -53,7 +96,10 @@ class TicTacToeBoard(TicTacToeBasicBoard):
                     cell_dist + topleft[0] + (i % 3)*(cell_width+cell_dist),
                     cell_dist + topleft[1] + (i//3)*(cell_width+cell_dist)
                 ),
-                width=cell_width
+                width=cell_width,
+                config=config,
+                buffer=buffer,
+                index=offset + i
             )
             for i in range(9)
         ]
@@ -71,6 +117,7 @@ class TicTacToeBoard(TicTacToeBasicBoard):
             or (state in (1,2) and cell is None)
         """
 
+        self.dirty = True  # the board has to be checked in the next frame
         if cell is None:
             # update the overall state of the board (available or unavailable)
             # NOTE: can't set the board state to 1|2, it depends on the cells
@@ -85,9 +132,77 @@ class TicTacToeBoard(TicTacToeBasicBoard):
             # attribute of the board. Its cells are either all available or not
             if state in (1, 2):
                 self.board[cell].update(state=state)
+                self._set_child_winner(idx=cell, player=state)
             else:  # availability can't be set to a specific cell but the board
                 raise ValueError("wrong value for the cell state in the board")
 
+    def highlight(self, cell: int, highlighted: bool) -> None:
+        """
+        Sets whether the mouse is over the given cell
+
+        :param cell: index of the cell
+        :param highlighted: whether to highlight the cell
+        :return: None
+        """
+
+        self.board[cell].highlight(highlighted)
+        self.dirty = True
+
+    def reset(self) -> None:
+        """
+        Resets the board to the default state (all the cells unfilled, no
+        winner). Don't update availability.
+
+        :return: None
+        """
+
+        for cell in self.board:
+            cell.reset()
+        self.big_cell.reset()
+        self._reset_winner()
+        self.dirty = True
+
+    def sync_winner(self) -> None:
+        """
+        Recomputes the winner of the board from the state of its cells (e.g.
+        after the buffer has been overwritten)
+
+        :return: None
+        """
+
+        self._reset_winner()
+        cells = self._buffer[self._offset:self._offset + 9]
+        for idx, byte in enumerate(cells):
+            if byte & WINNER_BITS:
+                self._marks[(byte & WINNER_BITS) - 1] |= 1 << idx
+        self._winner_cache = self._compute_winner()
+
+    def _render(self) -> None:
+        """
+        Draws the cells that have changed on the surface of the board. The
+        whole board is drawn the first time and when the board starts or
+        stops acting as a (big) cell.
+
+        :return: None
+        """
+
+        # NOTE: in the Super Tic-Tac-Toe game, if there is a winner the board
+        # acts as a (big) cell and displays the winner's image
+        as_big_cell = bool(self.big_cell.winner())
+        redraw = (self._surface is None
+                  or as_big_cell != self._drawn_as_big_cell)
+        if self._surface is None:
+            self._surface = pygame.Surface(self._rect.size).convert()
+        if redraw:
+            self._surface.fill(self._edge_color)  # gaps between cells
+        x, y = self._rect.topleft
+        for cell in [self.big_cell] if as_big_cell else self.board:
+            if redraw or cell.dirty:
+                self._surface.blit(cell.image(), cell.rect.move(-x, -y))
+                cell.dirty = False
+        self._drawn_as_big_cell = as_big_cell
+        self.dirty = False
+
     def draw(self, screen: pygame.Surface) -> None:
         """
         Displays the board on the given surface -> displays its cells
@@ -95,13 +210,23 @@ class TicTacToeBoard(TicTacToeBasicBoard):
         :return: None
         """
 
-        # NOTE: in the Super Tic-Tac-Toe game, if there is a winner the board
-        # acts as a (big) cell and displays the winner's image
-        if self.big_cell.winner():
-            self.big_cell.draw(screen)
-        else:
-            for cell in self.board:
-                cell.draw(screen)
+        if self.dirty or self._surface is None:
+            self._render()
+        screen.blit(self._surface, self._rect)
+
+    def draw_dirty(self, screen: pygame.Surface) -> List[pygame.Rect]:
+        """
+        Displays the board on the given surface only if it has changed since
+        it was last drawn (only its changed cells are rendered again)
+
+        :param screen: pygame Surface where the board is placed
+        :return: list of the areas of the screen that were updated
+        """
+
+        if not self.dirty:
+            return []
+        self.draw(screen)
+        return [self._rect]
 
 
 if __name__ == "__main__":
@@ -1,6 +1,15 @@
-import json
 import pygame
-from typing import Tuple
+from typing import Optional, Tuple
+from classes.asset_cache import load_config, cell_surfaces
+
+
+# Layout of the byte that stores the state of a cell
+WINNER_BITS = 0b00011  # {0: not filled, 1: player1, 2: player2}
+AVAILABLE_BIT = 0b00100
+DIRTY_BIT = 0b01000
+HIGHLIGHTED_BIT = 0b10000
+# a new cell is not filled, available and has never been drawn
+NEW_CELL = AVAILABLE_BIT | DIRTY_BIT
 
 
 class TicTacToeCell:
@@ -12,23 +21,36 @@ class TicTacToeCell:
         has a winner and it's no longer available and can't be filled again.
         This class is intended to be used inside the TicTacToeBoard
         class to define the cells' behaviour and the game's logic.
+        The state of the cell is one byte of a buffer (bytearray) that can be
+        shared by many cells: the cell is a lightweight view of its byte.
 
     TicTacToeCell Attributes:
         width     - cell's shape is a {width}x{width} square
-        _winner   - {0: not filled, 1: filled by player1, 2: filled by player2}
         available - whether the cell can be filled in the current turn
+        dirty     - whether the cell has changed since it was last drawn
+        highlighted - whether the mouse is over the (available) cell
+        rect      - area of the screen covered by the cell
 
     TicTacToeCell Methods:
-        winner        - return value of _winner
-        update        - updates the cell state: _winner, available attributes
-        draw          - displays the cell depending on its _winner value
+        winner        - {0: not filled, 1: filled by player1, 2: by player2}
+        update        - updates the cell state: winner, available attributes
+        image         - pre-rendered surface that displays the cell state
+        draw          - displays the cell depending on its winner value
+        draw_dirty    - displays the cell only if it has changed
         collidepoint  - checks whether a given point collides with the cell
     """
 
+    __slots__ = ('width', '_buffer', '_index', '_rect', '_available_bg',
+                 '_unavailable_bg', '_hover_bg', '_player1_img',
+                 '_player2_img')
+
     def __init__(self,
                  topleft: Tuple[float, float],
                  width: int,
-                 config_path: str = "../config/config.json"
+                 config_path: str = "../config/config.json",
+                 config: Optional[dict] = None,
+                 buffer: Optional[bytearray] = None,
+                 index: int = 0
                  ) -> None:
         """
         Inits a TicTacToeCell instance at a given location with a given width
@@ -36,57 +58,119 @@ class TicTacToeCell:
         :param topleft: coordinates of the top-left corner of the cell
         :param width: length of the square defining the cell's shape
         :param config_path: path from where to read the configuration file
+        :param config: configuration parameters. If provided, config_path is
+            not used (boards load the config once and pass it to their cells)
+        :param buffer: bytearray holding the state of the cell (at index). By
+            default, the cell allocates its own 1-byte buffer
+        :param index: position of the state of the cell in the buffer
         """
 
         self.width = width  # a cell is represented by a {width}x{width} square
-        self._winner = 0  # initially, the cell is not filled
-        self.available = True  # initially, all the cells are available
+        if buffer is None:
+            buffer, index = bytearray(1), 0
+        self._buffer = buffer
+        self._index = index
+        # initially, the cell is not filled and it is available
+        self._buffer[index] = NEW_CELL
 
         # Set up the customized attributes from the configuration file
-        with open(config_path, 'r') as config_file:
-            config = json.load(config_file)
-        # color of the cell when it is available or unavailable
-        self._available_bg_color = config['available_cell_bg_color']
-        self._unavailable_bg_color = config['unavailable_cell_bg_color']
-        player1_img = pygame.image.load(config['player1_img']).convert()
-        self._player1_img = pygame.transform.scale(player1_img, (width, width))
-        player2_img = pygame.image.load(config['player2_img']).convert()
-        self._player2_img = pygame.transform.scale(player2_img, (width, width))
-
-        # create the {width}x{width} square representing the cell
-        self._image = pygame.Surface([self.width, self.width])
-        self._rect = self._image.get_rect(topleft=topleft)
+        if config is None:
+            config = load_config(config_path)
+        # background of the cell when it is available, unavailable or under
+        # the mouse, and images of the players. They are rendered once and
+        # shared by all the cells of the same width
+        (self._available_bg, self._unavailable_bg, self._hover_bg,
+         self._player1_img, self._player2_img) = cell_surfaces(config, width)
+
+        # the {width}x{width} square representing the cell
+        self._rect = pygame.Rect(topleft, (self.width, self.width))
+
+    def _set_flag(self, bit: int, value: bool) -> None:
+        """
+        Sets or clears one bit of the state of the cell. If the bit changes,
+        the cell becomes dirty.
+
+        :param bit: one of AVAILABLE_BIT, DIRTY_BIT, HIGHLIGHTED_BIT
+        :param value: whether to set the bit
+        :return: None
+        """
+
+        byte = self._buffer[self._index]
+        new = byte | bit if value else byte & ~bit
+        if new != byte:
+            self._buffer[self._index] = new | DIRTY_BIT if bit != DIRTY_BIT \
+                else new
+
+    @property
+    def available(self) -> bool:
+        return bool(self._buffer[self._index] & AVAILABLE_BIT)
+
+    @available.setter
+    def available(self, value: bool) -> None:
+        self._set_flag(AVAILABLE_BIT, value)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._buffer[self._index] & DIRTY_BIT)
+
+    @dirty.setter
+    def dirty(self, value: bool) -> None:
+        self._set_flag(DIRTY_BIT, value)
+
+    @property
+    def highlighted(self) -> bool:
+        return bool(self._buffer[self._index] & HIGHLIGHTED_BIT)
 
     def winner(self) -> int:
         """
-        Returns the value of _winner. This method follows the structure of the
-        TicTacToeBasicBoard class, so it can be called recursively.
+        Returns the player who has filled the cell. This method follows the
+        structure of the TicTacToeBasicBoard class, so it can be called
+        recursively.
 
-        :return: int: _winner value
+        :return: int: 0 if not filled, 1|2 if filled by player1|player2
         """
 
-        return self._winner
+        return self._buffer[self._index] & WINNER_BITS
 
     def update(self, state: int) -> None:
         """
-        Updates the state of the cell, defined by attributes available, _winner
+        Updates the state of the cell, defined by attributes available, winner
 
         :param state: -1 if unavailable, 0 if available, 1|2 if filled
         :return: None
         :raise: ValueError if state not in (-1,0,1,2)
         """
 
-        # NOTE: if the cell has a winner (_winner != 0), availability does not
+        # NOTE: if the cell has a winner (winner != 0), availability does not
         # matter, since the cell can't be chosen again
-        if state == -1:  # set to unavailable
-            self.available = False
-        elif state == 0:  # set to available
-            self.available = True
+        if state in (-1, 0):  # set to unavailable (-1) or available (0)
+            self.available = state == 0
         elif state in (1, 2):  # a player has filled the cell
-            self._winner = state
+            byte = self._buffer[self._index]
+            if byte & WINNER_BITS != state:
+                self._buffer[self._index] = \
+                    byte & ~WINNER_BITS | state | DIRTY_BIT
         else:
             raise ValueError("wrong value for cell state")
 
+    def image(self) -> pygame.Surface:
+        """
+        Returns the pre-rendered surface that displays the state of the cell
+
+        :return: pygame Surface of {width}x{width} (shared, not to be drawn on)
+        """
+
+        # NOTE: cell availability only matters when it has not been filled yet
+        byte = self._buffer[self._index]
+        winner = byte & WINNER_BITS
+        if winner:  # if there is a winner, display its image
+            return self._player1_img if winner == 1 else self._player2_img
+        if not byte & AVAILABLE_BIT:  # unavailable and not filled yet
+            return self._unavailable_bg
+        if byte & HIGHLIGHTED_BIT:  # available and under the mouse
+            return self._hover_bg
+        return self._available_bg  # available and not filled yet
+
     def draw(self, screen: pygame.Surface) -> None:
         """
         Displays the cell on the given surface
@@ -95,18 +179,43 @@ class TicTacToeCell:
         :return: None
         """
 
-        # NOTE: cell availability only matters when it has not been filled yet
-        if self._winner:
-            # if there is a winner, display its image
-            img = self._player1_img if self._winner == 1 else self._player2_img
-            self._image = img
-        else:  # no cell winner, fill the cell with a plain color
-            if self.available:  # available and not filled yet
-                bg_color = self._available_bg_color
-            else:  # unavailable and not filled yet
-                bg_color = self._unavailable_bg_color
-            self._image.fill(bg_color)
-        screen.blit(self._image, self._rect)
+        screen.blit(self.image(), self._rect)
+        self.dirty = False
+
+    def draw_dirty(self, screen: pygame.Surface) -> Optional[pygame.Rect]:
+        """
+        Displays the cell on the given surface if it has changed since it was
+        last drawn
+
+        :param screen: pygame Surface where the cell is placed
+        :return: the area of the screen that was updated, None if not drawn
+        """
+
+        if not self.dirty:
+            return None
+        self.draw(screen)
+        return self._rect
+
+    @property
+    def rect(self) -> pygame.Rect:
+        """
+        Area of the screen covered by the cell
+
+        :return: pygame Rect of the cell
+        """
+
+        return self._rect
+
+    def highlight(self, highlighted: bool) -> None:
+        """
+        Sets whether the mouse is over the cell. A highlighted cell is drawn
+        with a different color while it is available and not filled.
+
+        :param highlighted: whether to highlight the cell
+        :return: None
+        """
+
+        self._set_flag(HIGHLIGHTED_BIT, highlighted)
 
     def collidepoint(self, point: Tuple[float, float]) -> bool:
         """
@@ -123,7 +232,9 @@ class TicTacToeCell:
         Don't update availability.
         :return: None
         """
-        self._winner = 0
+        byte = self._buffer[self._index]
+        if byte & WINNER_BITS:
+            self._buffer[self._index] = byte & ~WINNER_BITS | DIRTY_BIT
 
 
 if __name__ == "__main__":
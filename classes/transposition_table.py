@@ -0,0 +1,114 @@
+from typing import Optional, Tuple
+
+
+class TranspositionTable:
+    """
+    TranspositionTable stores the results of searched positions, indexed by
+        their Zobrist hash. The table has a bounded size: it is made of
+        2-slot buckets where the first slot keeps the deepest search of the
+        current move (depth-preferred) and the second slot is always replaced.
+        Entries from older searches are replaced first.
+
+    TranspositionTable Attributes
+        size      - maximum number of entries (a power of two)
+        age       - search counter, entries of older searches are replaceable
+        probes    - number of lookups
+        hits      - number of lookups that found the position
+
+    TranspositionTable Methods
+        probe       - returns the stored entry of a position (if any)
+        store       - stores the result of a search
+        new_search  - starts a new search (ages the current entries)
+        clear       - removes every entry
+        hit_rate    - fraction of lookups that found the position
+    """
+
+    # Kind of score stored in an entry
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size: int = 1 << 18) -> None:
+        """
+        Inits an empty TranspositionTable
+
+        :param size: maximum number of entries, rounded down to a power of two
+        :raise: ValueError if size < 2
+        """
+
+        if size < 2:
+            raise ValueError("the transposition table needs at least 2 slots")
+        self.size = 1 << (size.bit_length() - 1)
+        self._mask = (self.size >> 1) - 1  # number of buckets - 1
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.clear()
+
+    def clear(self) -> None:
+        """
+        Removes every entry of the table
+
+        :return: None
+        """
+
+        self._keys = [0] * self.size
+        # entry: (depth, flag, score, move, age)
+        self._entries = [None] * self.size
+
+    def new_search(self) -> None:
+        """
+        Starts a new search: the current entries become replaceable
+
+        :return: None
+        """
+
+        self.age += 1
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, int, int, int]]:
+        """
+        Returns the entry stored for the given position
+
+        :param key: Zobrist hash of the position
+        :return: (depth, flag, score, move, age) or None if not found
+        """
+
+        self.probes += 1
+        i = (key & self._mask) << 1
+        if self._keys[i] == key and self._entries[i] is not None:
+            self.hits += 1
+            return self._entries[i]
+        if self._keys[i + 1] == key and self._entries[i + 1] is not None:
+            self.hits += 1
+            return self._entries[i + 1]
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: int,
+              move: int) -> None:
+        """
+        Stores the result of searching a position
+
+        :param key: Zobrist hash of the position
+        :param depth: remaining depth of the search
+        :param flag: EXACT, LOWER (fail-high) or UPPER (fail-low) score
+        :param score: score of the position for the player taking turn
+        :param move: best move found (-1 if none)
+        :return: None
+        """
+
+        i = (key & self._mask) << 1
+        old = self._entries[i]
+        if (old is None or self._keys[i] == key or old[4] != self.age
+                or depth >= old[0]):
+            self._keys[i] = key  # depth-preferred slot
+            self._entries[i] = (depth, flag, score, move, self.age)
+        else:
+            self._keys[i + 1] = key  # always-replace slot
+            self._entries[i + 1] = (depth, flag, score, move, self.age)
+
+    def hit_rate(self) -> float:
+        """
+        Returns the fraction of lookups that found the position
+
+        :return: hits / probes (0 if there were no lookups)
+        """
+
+        return self.hits / self.probes if self.probes else 0.0
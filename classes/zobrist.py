@@ -0,0 +1,200 @@
+import random
+from operator import xor
+from typing import List, Tuple
+from classes.game_state import GameState
+
+
+# Random 64-bit keys. A fixed seed is used so that the hash of a position is
+# the same in every run (hashes can be stored and compared between runs)
+_rng = random.Random(0x5EED)
+# CELL_KEYS[player - 1][local_board * 9 + cell]
+CELL_KEYS = tuple(tuple(_rng.getrandbits(64) for _ in range(81))
+                  for _ in range(2))
+# FORCED_KEYS[forced_board + 1], so that -1 (any local board) has its own key
+FORCED_KEYS = tuple(_rng.getrandbits(64) for _ in range(10))
+# xored into the hash when player2 takes turn
+PLAYER_KEY = _rng.getrandbits(64)
+
+# The 8 symmetries of the square (dihedral group) as permutations of the 9
+# cells of a 3x3 board: SYMMETRIES[t][cell] is where the cell is moved to
+SYMMETRIES = tuple(
+    tuple(3 * row(r, c) + col(r, c) for r in range(3) for c in range(3))
+    for row, col in (
+        (lambda r, c: r, lambda r, c: c),          # identity
+        (lambda r, c: c, lambda r, c: 2 - r),      # rotation 90
+        (lambda r, c: 2 - r, lambda r, c: 2 - c),  # rotation 180
+        (lambda r, c: 2 - c, lambda r, c: r),      # rotation 270
+        (lambda r, c: r, lambda r, c: 2 - c),      # horizontal mirror
+        (lambda r, c: 2 - r, lambda r, c: c),      # vertical mirror
+        (lambda r, c: c, lambda r, c: r),          # main diagonal
+        (lambda r, c: 2 - c, lambda r, c: 2 - r)   # anti-diagonal
+    )
+)
+# INVERSE[t] is the symmetry that undoes the symmetry t
+INVERSE = tuple(
+    next(u for u in range(8)
+         if all(SYMMETRIES[u][SYMMETRIES[t][i]] == i for i in range(9)))
+    for t in range(8)
+)
+# A symmetry of the Super Tic-Tac-Toe grid moves the local boards and the
+# cells inside them in the same way (the forced local board rule is kept):
+# MOVE_SYMMETRIES[t][move] is the image of the move local_board * 9 + cell
+MOVE_SYMMETRIES = tuple(
+    tuple(SYMMETRIES[t][move // 9] * 9 + SYMMETRIES[t][move % 9]
+          for move in range(81))
+    for t in range(8)
+)
+# Keys to hash the image of a position by each symmetry without building it:
+# a cell of the position is hashed with the key of the cell it is moved to
+_SYMMETRY_CELL_KEYS = tuple(
+    tuple(tuple(CELL_KEYS[p][MOVE_SYMMETRIES[t][i]] for i in range(81))
+          for p in range(2))
+    for t in range(8)
+)
+_SYMMETRY_FORCED_KEYS = tuple(
+    (FORCED_KEYS[0],) + tuple(FORCED_KEYS[SYMMETRIES[t][b] + 1]
+                              for b in range(9))
+    for t in range(8)
+)
+# The same keys grouped by cell, to update the hashes of the 8 images at once:
+# _IMAGE_CELL_KEYS[player - 1][move][t], and the keys xored by the change of
+# turn: _IMAGE_TURN_KEYS[forced_board before + 1][forced_board after + 1][t]
+_IMAGE_CELL_KEYS = tuple(
+    tuple(tuple(_SYMMETRY_CELL_KEYS[t][p][i] for t in range(8))
+          for i in range(81))
+    for p in range(2)
+)
+_IMAGE_TURN_KEYS = tuple(
+    tuple(tuple(_SYMMETRY_FORCED_KEYS[t][before]
+                ^ _SYMMETRY_FORCED_KEYS[t][after] ^ PLAYER_KEY
+                for t in range(8))
+          for after in range(10))
+    for before in range(10)
+)
+
+
+def zobrist_hash(state: GameState, symmetry: int = 0) -> int:
+    """
+    Computes the 64-bit Zobrist hash of a position from scratch. It covers the
+    owner of every cell, the forced local board and the player taking turn
+    (the winners of the local boards are implied by the cells).
+
+    :param state: position to hash
+    :param symmetry: if given, the hash of the image of the position by that
+        symmetry (index in SYMMETRIES) is returned
+    :return: 64-bit hash of the position
+    """
+
+    cell_keys = _SYMMETRY_CELL_KEYS[symmetry]
+    h = _SYMMETRY_FORCED_KEYS[symmetry][state.forced_board + 1]
+    if state.player == 2:
+        h ^= PLAYER_KEY
+    for p in (0, 1):
+        cells = state.cells[p]
+        keys = cell_keys[p]
+        while cells:
+            low = cells & -cells
+            h ^= keys[low.bit_length() - 1]
+            cells ^= low
+    return h
+
+
+def canonical_hash(state: GameState) -> Tuple[int, int]:
+    """
+    Computes the hash that identifies a position and its 7 symmetric images:
+    the smallest of the hashes of the 8 images
+
+    :param state: position to hash
+    :return: (canonical hash, symmetry that maps the position to the image
+        with that hash). Moves of the position are mapped to the canonical
+        image with transform_move(move, symmetry)
+    """
+
+    return min((zobrist_hash(state, t), t) for t in range(8))
+
+
+def transform_move(move: int, symmetry: int) -> int:
+    """
+    Returns the image of a move by a symmetry
+
+    :param move: local_board * 9 + cell
+    :param symmetry: index in SYMMETRIES (INVERSE[symmetry] undoes it)
+    :return: the image of the move, local_board * 9 + cell
+    """
+
+    return MOVE_SYMMETRIES[symmetry][move]
+
+
+def update_hash(h: int, token: Tuple[int, ...], state: GameState) -> int:
+    """
+    Updates the hash of a position after a move played with apply_move. Only
+    the cells that changed are xored (one cell, or the cells of a local board
+    that has been emptied because of a local draw).
+
+    :param h: hash of the position before the move
+    :param token: undo token returned by apply_move for that move
+    :param state: position after the move
+    :return: 64-bit hash of the position after the move
+    """
+
+    h ^= FORCED_KEYS[token[4] + 1] ^ FORCED_KEYS[state.forced_board + 1]
+    h ^= PLAYER_KEY
+    for p in (0, 1):
+        changed = token[p] ^ state.cells[p]
+        keys = CELL_KEYS[p]
+        while changed:
+            low = changed & -changed
+            h ^= keys[low.bit_length() - 1]
+            changed ^= low
+    return h
+
+
+def update_symmetric_hashes(hashes: List[int], token: Tuple[int, ...],
+                            state: GameState) -> None:
+    """
+    Updates the hashes of the 8 symmetric images of a position after a move
+    played with apply_move (see update_hash). The canonical hash of the new
+    position is min(hashes), without hashing the images from scratch.
+
+    :param hashes: hashes of the images, hashes[t] = zobrist_hash(state, t)
+        before the move. Updated in place
+    :param token: undo token returned by apply_move for that move
+    :param state: position after the move
+    :return: None
+    """
+
+    keys = _IMAGE_TURN_KEYS[token[4] + 1][state.forced_board + 1]
+    for p in (0, 1):
+        changed = token[p] ^ state.cells[p]
+        cell_keys = _IMAGE_CELL_KEYS[p]
+        while changed:
+            low = changed & -changed
+            keys = map(xor, keys, cell_keys[low.bit_length() - 1])
+            changed ^= low
+    hashes[:] = map(xor, hashes, keys)
+
+
+def diff_hash(h: int, before: Tuple[int, int, int, int],
+              state: GameState) -> int:
+    """
+    Updates the hash of a position after any change of the state (marks,
+    local draws, turns), given what the state looked like before the change
+
+    :param h: hash of the position before the change
+    :param before: (player1 cells, player2 cells, forced_board, player)
+        before the change
+    :param state: position after the change
+    :return: 64-bit hash of the position after the change
+    """
+
+    h ^= FORCED_KEYS[before[2] + 1] ^ FORCED_KEYS[state.forced_board + 1]
+    if before[3] != state.player:
+        h ^= PLAYER_KEY
+    for p in (0, 1):
+        changed = before[p] ^ state.cells[p]
+        keys = CELL_KEYS[p]
+        while changed:
+            low = changed & -changed
+            h ^= keys[low.bit_length() - 1]
+            changed ^= low
+    return h
@@ -0,0 +1,175 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import (FIRST_COMPLETED, Executor,
+                                ProcessPoolExecutor, wait)
+from typing import Callable, Iterable, Iterator, List, Tuple
+import numpy as np
+from classes.game_record import read_games
+from classes.position_stats import (RECORD_DTYPE, aggregate_games,
+                                    merge_records)
+
+
+def read_chunks(paths: List[str], chunk_size: int
+                ) -> Iterator[List[Tuple[int, int, bytes]]]:
+    """
+    Streams the finished games of record files in chunks
+
+    :param paths: paths of the game record files
+    :param chunk_size: number of games per chunk
+    :return: generator of lists of (starting player, result, moves)
+    """
+
+    chunk = []
+    for path in paths:
+        for game in read_games(path):
+            if game.result:  # unfinished games have no result to count
+                chunk.append((game.player, game.result, game.moves))
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def bounded_map(executor: Executor, function: Callable, tasks: Iterable,
+                window: int) -> Iterator:
+    """
+    Like executor.map, but only window tasks are submitted at a time, so that
+    the tasks are read lazily (the results are yielded as they complete)
+
+    :param executor: pool running the tasks
+    :param function: function applied to every task
+    :param tasks: arguments of the function
+    :param window: maximum number of tasks submitted and not completed
+    :return: generator of results
+    """
+
+    pending = set()
+    for task in tasks:
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(executor.submit(function, task))
+    for future in wait(pending).done:
+        yield future.result()
+
+
+def map_chunk(task: Tuple[List[Tuple[int, int, bytes]], int, str]
+              ) -> Tuple[str, int]:
+    """
+    Map step: aggregates the positions of a chunk of games and writes them
+    to a run file, sorted by key
+
+    :param task: (games, max plies, path of the run file)
+    :return: (path of the run file, number of games)
+    """
+
+    games, max_plies, path = task
+    aggregate_games(games, max_plies).tofile(path)
+    return path, len(games)
+
+
+def reduce_partition(task: Tuple[List[str], int, int, int, str]
+                     ) -> Tuple[str, int]:
+    """
+    Reduce step: merges the records of a range of keys of every run. The
+    runs are sorted, so the range is found by binary search in the
+    memory-mapped runs and only its records are read
+
+    :param task: (paths of the run files, first key, end key (exclusive,
+        0 for the end of the key space), min visits, path of the partition)
+    :return: (path of the partition file, number of records)
+    """
+
+    runs, low, high, min_visits, path = task
+    parts = []
+    for run in runs:
+        if not os.path.getsize(run):
+            continue
+        keys = np.memmap(run, dtype=RECORD_DTYPE, mode='r')['key']
+        start = np.searchsorted(keys, np.uint64(low))
+        end = np.searchsorted(keys, np.uint64(high)) if high else len(keys)
+        parts.append(np.fromfile(run, dtype=RECORD_DTYPE, count=end - start,
+                                 offset=int(start) * RECORD_DTYPE.itemsize))
+    records = merge_records(parts, min_visits)
+    records.tofile(path)
+    return path, len(records)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Aggregates the statistics of every position of a "
+                    "large archive of games (visits, wins and draws, keyed "
+                    "by canonical hash) using all the CPU cores, and writes "
+                    "them to a sorted binary table (see PositionStats)."
+    )
+    parser.add_argument('records', nargs='+',
+                        help="game record files (game_record_file, "
+                             "tournament.py --record)")
+    parser.add_argument('-o', '--output', default="../data/position_stats.bin")
+    parser.add_argument('-p', '--max-plies', type=int, default=24,
+                        help="moves of every game whose positions are counted")
+    parser.add_argument('-m', '--min-visits', type=int, default=2,
+                        help="positions visited fewer times are not written")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-c', '--chunk-size', type=int, default=20000,
+                        help="games aggregated by every map task")
+    parser.add_argument('--partitions', type=int, default=None,
+                        help="key ranges merged by the reduce tasks "
+                             "(default: 4 per worker)")
+    args = parser.parse_args()
+    partitions = args.partitions or 4 * args.workers
+
+    work_dir = tempfile.mkdtemp(prefix='position_stats_')
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            # map: every chunk of games becomes a sorted run file. The chunks
+            # are read while the workers aggregate the previous ones
+            tasks = ((chunk, args.max_plies,
+                      os.path.join(work_dir, f"run{i}.bin"))
+                     for i, chunk in enumerate(read_chunks(args.records,
+                                                           args.chunk_size)))
+            runs, games = [], 0
+            for path, num_games in bounded_map(executor, map_chunk, tasks,
+                                               window=2 * args.workers):
+                runs.append(path)
+                games += num_games
+            print(f"map: {games} games, {len(runs)} runs "
+                  f"({time.perf_counter() - start:.1f}s)")
+
+            # reduce: every partition is a range of keys, merged from all the
+            # runs independently of the other ranges
+            bounds = [i * (1 << 64) // partitions
+                      for i in range(partitions + 1)]
+            tasks = [(runs, bounds[i], bounds[i + 1] % (1 << 64),
+                      args.min_visits,
+                      os.path.join(work_dir, f"partition{i}.bin"))
+                     for i in range(partitions)]
+            results = list(executor.map(reduce_partition, tasks))
+            print(f"reduce: {partitions} partitions "
+                  f"({time.perf_counter() - start:.1f}s)")
+
+        # the partitions are consecutive ranges of keys: the table is their
+        # concatenation
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)),
+                    exist_ok=True)
+        with open(args.output, 'wb') as output:
+            for path, _ in results:
+                with open(path, 'rb') as partition:
+                    shutil.copyfileobj(partition, output)
+    finally:
+        shutil.rmtree(work_dir)
+    positions = sum(count for _, count in results)
+    elapsed = time.perf_counter() - start
+    print(f"{positions} positions written to {args.output}")
+    print(f"  {games / elapsed:.0f} games/s ({elapsed:.1f}s, "
+          f"{args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
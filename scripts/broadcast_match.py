@@ -0,0 +1,62 @@
+import argparse
+import json
+import time
+from classes.game_state import GameState
+from classes.player_factory import PLAYER_TYPES, create_player
+from classes.spectator_broadcaster import SpectatorBroadcaster
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Plays games between two computer players and broadcasts"
+                    " them to spectators. Watch them with: python "
+                    "game_runner.py --spectate HOST:PORT"
+    )
+    parser.add_argument('player1', choices=PLAYER_TYPES[1:])
+    parser.add_argument('player2', choices=PLAYER_TYPES[1:])
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="interface where spectators connect")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('-n', '--games', type=int, default=1)
+    parser.add_argument('--delay', type=float, default=0.5,
+                        help="minimum seconds between two moves")
+    parser.add_argument('--queue-size', type=int, default=256,
+                        help="messages queued per spectator before it is "
+                             "disconnected for being too slow")
+    parser.add_argument('--config', default="../config/config.json")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as config_file:
+        config = json.load(config_file)
+    broadcaster = SpectatorBroadcaster(args.host, args.port,
+                                       queue_size=args.queue_size)
+    print(f"broadcasting on {broadcaster.address[0]}:"
+          f"{broadcaster.address[1]}")
+    players = {
+        1: create_player(args.player1, config),
+        2: create_player(args.player2, config)
+    }
+    try:
+        for game in range(args.games):
+            state = GameState(player=1 if game % 2 == 0 else 2)
+            broadcaster.new_game(state)
+            while not state.winner():
+                start = time.perf_counter()
+                move = players[state.player].choose_move(state)
+                state.play(*divmod(move, 9))  # validates the move
+                time.sleep(max(0.0, args.delay
+                               - (time.perf_counter() - start)))
+                broadcaster.play(move)
+            print(f"game {game + 1}: result {state.winner()}, "
+                  f"{broadcaster.spectators} spectators, "
+                  f"{broadcaster.dropped} dropped")
+            time.sleep(5 * args.delay)  # let the spectators see the result
+    finally:
+        for player in players.values():
+            if hasattr(player, 'close'):
+                player.close()
+        broadcaster.close()
+
+
+if __name__ == "__main__":
+    main()
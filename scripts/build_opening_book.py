@@ -0,0 +1,89 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+from classes.alpha_beta_player import AlphaBetaPlayer
+from classes.game_state import GameState, legal_moves, iter_moves, apply_move
+from classes.opening_book import write_book
+from classes.zobrist import canonical_hash, transform_move
+
+
+def search_position(task: Tuple[GameState, int]) -> Tuple[int, int]:
+    """
+    Searches one book position with a fixed depth
+
+    :param task: (position, depth of the search)
+    :return: (best move, score for the player taking turn)
+    """
+
+    state, depth = task
+    player = AlphaBetaPlayer(time_budget=math.inf, max_depth=depth)
+    move = player.choose_move(state)
+    return move, player.score
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Builds an opening book: every position reachable in the "
+                    "first plies (up to symmetry) is searched with a fixed "
+                    "depth using all the CPU cores, and the best moves are "
+                    "written to a sorted binary file."
+    )
+    parser.add_argument('-p', '--plies', type=int, default=3,
+                        help="number of plies covered by the book")
+    parser.add_argument('-d', '--depth', type=int, default=6,
+                        help="depth of the search of every book position")
+    parser.add_argument('-m', '--max-positions', type=int, default=2000,
+                        help="maximum number of positions searched per ply "
+                             "(the most visited ones)")
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('-o', '--output', default="../data/opening_book.bin")
+    args = parser.parse_args()
+
+    # both players may start the game (player_starting_the_game)
+    level: Dict[int, Tuple[GameState, int]] = {
+        canonical_hash(GameState(player=p))[0]: (GameState(player=p), 1)
+        for p in (1, 2)
+    }
+    entries = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for ply in range(args.plies):
+            # search the most visited positions of the ply
+            keys = sorted(level, key=lambda k: -level[k][1])
+            keys = keys[:args.max_positions]
+            tasks = [(level[key][0], args.depth) for key in keys]
+            results = executor.map(search_position, tasks, chunksize=4)
+            for key, (move, score) in zip(keys, results):
+                state, visits = level[key]
+                symmetry = canonical_hash(state)[1]
+                entries.append((key, transform_move(move, symmetry), score,
+                                visits))
+            print(f"ply {ply}: {len(keys)} positions searched "
+                  f"({time.perf_counter() - start:.1f}s)")
+
+            # every legal move of the searched positions leads to the next ply
+            next_level: Dict[int, Tuple[GameState, int]] = {}
+            for key in keys:
+                state, visits = level[key]
+                for move in iter_moves(legal_moves(state)):
+                    child = state.copy()
+                    apply_move(child, move)
+                    if child.winner():
+                        continue
+                    # transpositions and symmetric moves add their visits
+                    child_key = canonical_hash(child)[0]
+                    previous = next_level.get(child_key)
+                    child_visits = visits + (previous[1] if previous else 0)
+                    next_level[child_key] = (child, child_visits)
+            level = next_level
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    num_records = write_book(args.output, entries)
+    print(f"{num_records} positions written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,19 @@
+import argparse
 from classes.game_handler import GameHandler
 
 
 if __name__ == "__main__":
-    game = GameHandler()
+    parser = argparse.ArgumentParser(description="Plays Super Tic-Tac-Toe")
+    parser.add_argument('--spectate', default=None, metavar='HOST:PORT',
+                        help="watch the match broadcast by broadcast_match.py"
+                             " (read-only)")
+    args = parser.parse_args()
+
+    spectate = None
+    if args.spectate is not None:
+        host, _, port = args.spectate.rpartition(':')
+        if not host or not port.isdigit():
+            parser.error("--spectate expects HOST:PORT")
+        spectate = (host, int(port))
+    game = GameHandler(spectate=spectate)
     game.run()
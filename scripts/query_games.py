@@ -0,0 +1,70 @@
+import argparse
+import time
+from typing import List
+from classes.game_record import read_games
+from classes.game_store import GameStore
+
+
+def parse_opening(text: str) -> List[int]:
+    """
+    Parses an opening given as local_board/cell moves separated by commas
+
+    :param text: e.g. "4/4,4/0"
+    :return: moves (local_board * 9 + cell)
+    :raise: argparse.ArgumentTypeError if the opening is malformed
+    """
+
+    moves = []
+    for move in filter(None, text.split(',')):
+        local_board, _, cell = move.partition('/')
+        if not (local_board.isdigit() and cell.isdigit()
+                and int(local_board) < 9 and int(cell) < 9):
+            raise argparse.ArgumentTypeError(f"invalid move: {move}")
+        moves.append(int(local_board) * 9 + int(cell))
+    return moves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Queries the games of a game store: number of games and "
+                    "win rates, optionally filtered by opening, starting "
+                    "player and length. Record files (game_record_file, "
+                    "tournament.py --record) can be imported first."
+    )
+    parser.add_argument('store', help="SQLite game store (game_store_file)")
+    parser.add_argument('--import', dest='records', nargs='+', default=[],
+                        help="game record files to add to the store")
+    parser.add_argument('--opening', type=parse_opening, default=[],
+                        help="first moves of the games, as local_board/cell "
+                             "separated by commas (e.g. 4/4,4/0)")
+    parser.add_argument('--player', type=int, choices=(1, 2), default=None,
+                        help="player who started the games")
+    parser.add_argument('--min-length', type=int, default=None)
+    parser.add_argument('--max-length', type=int, default=None)
+    args = parser.parse_args()
+
+    with GameStore(args.store, batch_size=10000) as store:
+        for path in args.records:
+            start = time.perf_counter()
+            for game in read_games(path):
+                if game.result:  # unfinished games are not kept
+                    store.add_game(game.player, game.moves, game.result,
+                                   seed=None if game.seed == -1 else game.seed)
+            store.flush()
+            print(f"{path} imported in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        results = store.results(opening=args.opening, player=args.player,
+                                min_length=args.min_length,
+                                max_length=args.max_length)
+        elapsed = time.perf_counter() - start
+    games = sum(results.values())
+    print(f"{games} games ({elapsed * 1e3:.1f} ms)")
+    for result, name in ((1, "player1 wins"), (2, "player2 wins"),
+                         (-1, "draws")):
+        share = results.get(result, 0) / games if games else 0.0
+        print(f"  {name}: {results.get(result, 0)} ({share:.1%})")
+
+
+if __name__ == "__main__":
+    main()
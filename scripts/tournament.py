@@ -0,0 +1,206 @@
+import argparse
+import json
+import math
+import os
+import random
+import signal
+import time
+from contextlib import ExitStack
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
+from classes.game_record import GameRecordWriter
+from classes.game_state import GameState, legal_moves, iter_moves, apply_move
+from classes.game_store import GameStore
+from classes.player_factory import PLAYER_TYPES, create_player
+from classes.position_cache import PositionCache
+
+
+# Cache of evaluated positions of the worker process, shared by the players
+# of all the games played by the process (see init_worker)
+_cache: Optional[PositionCache] = None
+
+
+def init_worker(cache_size: int, cache_path: Optional[str]) -> None:
+    """
+    Creates the position cache of a worker process, filled with the entries
+    saved by previous runs. Ctrl-C is ignored by the workers: the main
+    process terminates them
+
+    :param cache_size: maximum number of entries of the cache
+    :param cache_path: file with the entries of previous runs (or None)
+    :return: None
+    """
+
+    global _cache
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the main process stops
+    _cache = PositionCache(cache_size)
+    if cache_path is not None:
+        _cache.load(cache_path)
+
+
+def play_game(task: Tuple[int, str, str, dict, int, int]
+              ) -> Tuple[int, bytes, int, list]:
+    """
+    Plays one headless game between two computer players. Even games are
+    started by player1 and odd games by player2 (player_starting_the_game
+    alternates); consecutive pairs of games share the same random opening.
+
+    :param task: (game index, player1 type, player2 type, config, seed,
+        number of random opening moves)
+    :return: (result of the game as in GameState.winner, moves of the game
+        (local_board * 9 + cell), seed of the game (it determines the opening
+        and the seeds of the players), entries stored in the position cache
+        of the process during the game)
+    """
+
+    index, player1_type, player2_type, config, seed, opening_moves = task
+    state = GameState(player=1 if index % 2 == 0 else 2)
+
+    # random opening, the same for both games of a pair
+    game_seed = random.Random(f"{seed}-opening-{index // 2}").getrandbits(63)
+    rng = random.Random(game_seed)
+    moves = bytearray()
+    for _ in range(opening_moves):
+        if state.winner():
+            break
+        moves.append(rng.choice(list(iter_moves(legal_moves(state)))))
+        apply_move(state, moves[-1])
+
+    players = {
+        1: create_player(player1_type, config, seed=rng.getrandbits(32),
+                         cache=_cache),
+        2: create_player(player2_type, config, seed=rng.getrandbits(32),
+                         cache=_cache)
+    }
+    while not state.winner():
+        move = players[state.player].choose_move(state)
+        state.play(*divmod(move, 9))  # validates the move of the player
+        moves.append(move)
+    for player in players.values():
+        if hasattr(player, 'close'):
+            player.close()
+    return (state.winner(), bytes(moves), game_seed,
+            _cache.drain() if _cache else [])
+
+
+def score_summary(results: List[int]) -> Tuple[float, float, float, float]:
+    """
+    Computes the score of player1 (win = 1, draw = 0.5, loss = 0) and the Elo
+    difference with player2, with 95% confidence intervals
+
+    :param results: results of the games, as returned by GameState.winner
+    :return: (score, score margin of error, elo, elo margin of error)
+    """
+
+    n = len(results)
+    points = [1.0 if r == 1 else 0.5 if r == -1 else 0.0 for r in results]
+    score = sum(points) / n
+    variance = sum(p * p for p in points) / n - score * score
+    margin = 1.96 * math.sqrt(max(variance, 0.0) / n)
+
+    def elo(s: float) -> float:
+        s = min(max(s, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / s - 1)
+
+    elo_low, elo_high = elo(score - margin), elo(score + margin)
+    return score, margin, elo(score), (elo_high - elo_low) / 2
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Plays N headless games between two computer players "
+                    "using all the CPU cores. For reproducible results, limit"
+                    " the players with --depth / --playouts and use "
+                    "--time-budget inf."
+    )
+    parser.add_argument('player1', choices=PLAYER_TYPES[1:])
+    parser.add_argument('player2', choices=PLAYER_TYPES[1:])
+    parser.add_argument('-n', '--games', type=int, default=100)
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help="number of processes playing games")
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--opening-moves', type=int, default=2,
+                        help="random moves played before the players")
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help="seconds per move (default: config file)")
+    parser.add_argument('--depth', type=int, default=None,
+                        help="maximum depth of the alpha_beta players")
+    parser.add_argument('--playouts', type=int, default=None,
+                        help="maximum playouts per move of the mcts players")
+    parser.add_argument('--cache', default=None,
+                        help="file where the evaluated positions are kept "
+                             "between runs (repeated openings are not "
+                             "searched again)")
+    parser.add_argument('--record', default=None,
+                        help="file where the games are appended (compact "
+                             "binary game records)")
+    parser.add_argument('--store', default=None,
+                        help="SQLite game store where the games are added "
+                             "(indexed for analytics)")
+    parser.add_argument('--config', default="../config/config.json")
+    args = parser.parse_args()
+    if args.games < 1:
+        parser.error("--games must be at least 1")
+
+    with open(args.config, 'r') as config_file:
+        config = json.load(config_file)
+    config['mcts_workers'] = 0  # the games are already run in parallel
+    if args.time_budget is not None:
+        config['ai_time_budget'] = args.time_budget
+    if args.depth is not None:
+        config['ai_max_depth'] = args.depth
+        config['ai_cache_depth'] = args.depth  # reuse the searched results
+    if args.playouts is not None:
+        config['mcts_max_playouts'] = args.playouts
+
+    tasks = [(i, args.player1, args.player2, config, args.seed,
+              args.opening_moves) for i in range(args.games)]
+    cache = None
+    if args.cache is not None:  # merges the results of every process
+        cache = PositionCache(config['position_cache_size'])
+        cache.load(args.cache)
+    results, total_moves = [], 0
+    start = time.perf_counter()
+    # every game is written as soon as it is finished, so that an
+    # interrupted run keeps the games played so far
+    with ExitStack() as stack:
+        writer = None if args.record is None \
+            else stack.enter_context(GameRecordWriter(args.record))
+        store = None if args.store is None \
+            else stack.enter_context(GameStore(args.store))
+        if cache is not None:
+            stack.callback(cache.save, args.cache)
+        # the pool is terminated first when leaving (even if interrupted)
+        pool = stack.enter_context(Pool(
+            args.workers, initializer=init_worker,
+            initargs=(config['position_cache_size'], args.cache)))
+        # the games of a chunk are returned together: small chunks lose
+        # little work if the run is interrupted
+        chunksize = max(1, min(args.games // (8 * args.workers), 4))
+        games = pool.imap(play_game, tasks, chunksize=chunksize)
+        for i, (result, moves, seed, entries) in enumerate(games):
+            player = 1 if i % 2 == 0 else 2
+            if writer is not None:
+                writer.write_game(player, moves, result, seed=seed)
+            if store is not None:
+                store.add_game(player, moves, result, seed=seed)
+            if cache is not None:
+                cache.merge(entries)
+            results.append(result)
+            total_moves += len(moves)
+    elapsed = time.perf_counter() - start
+
+    score, margin, elo, elo_margin = score_summary(results)
+    print(f"{args.player1} (player1) vs {args.player2} (player2), "
+          f"{args.games} games")
+    print(f"  player1 wins: {results.count(1)}, player2 wins: "
+          f"{results.count(2)}, draws: {results.count(-1)}")
+    print(f"  player1 score: {score:.3f} +/- {margin:.3f} (95%)")
+    print(f"  elo difference: {elo:+.0f} +/- {elo_margin:.0f} (95%)")
+    print(f"  average length: {total_moves / len(results):.1f} moves")
+    print(f"  {args.games / elapsed:.1f} games/s "
+          f"({elapsed:.1f}s, {args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()